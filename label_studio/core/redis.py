@@ -46,6 +46,13 @@ def redis_connected():
     return redis_healthcheck()
 
 
+def get_redis_client():
+    """Returns the shared redis client or None if redis is not connected"""
+    if not redis_healthcheck():
+        return
+    return _redis
+
+
 def redis_get(key):
     if not redis_healthcheck():
         return
@@ -474,6 +474,7 @@ SUPPORTED_EXTENSIONS = set(
         '.jpg',
         '.jpeg',
         '.json',
+        '.jsonl',
         '.m4a',
         '.mp3',
         '.ogg',
@@ -508,12 +509,39 @@ DATA_UPLOAD_MAX_MEMORY_SIZE = int(get_env('DATA_UPLOAD_MAX_MEMORY_SIZE', 250 * 1
 DATA_UPLOAD_MAX_NUMBER_FILES = int(get_env('DATA_UPLOAD_MAX_NUMBER_FILES', 100))
 TASKS_MAX_NUMBER = 1000000
 TASKS_MAX_FILE_SIZE = DATA_UPLOAD_MAX_MEMORY_SIZE
+# async import parses files incrementally and creates tasks by batches
+IMPORT_STREAMING_CHUNK_SIZE = int(get_env('IMPORT_STREAMING_CHUNK_SIZE', 1024 * 1024))
+IMPORT_BATCH_SIZE = int(get_env('IMPORT_BATCH_SIZE', 1000))
+# uploaded files are parsed in a pool of processes when several files are imported at once, 0 - no pool.
+# Processes are started with forkserver (spawn if it's not available) and set up Django on start,
+# so the pool pays off for several large files only
+IMPORT_PARSE_PROCESSES = int(get_env('IMPORT_PARSE_PROCESSES', 0))
+# PostgreSQL only: imported tasks, annotations and predictions are inserted with COPY FROM STDIN
+BULK_CREATE_COPY_ENABLED = get_bool_env('BULK_CREATE_COPY_ENABLED', False)
 
 TASK_LOCK_TTL = int(get_env('TASK_LOCK_TTL', default=86400))
+# tasks.locks.DatabaseTaskLockBackend or tasks.locks.RedisTaskLockBackend
+TASK_LOCK_BACKEND = get_env('TASK_LOCK_BACKEND', default='tasks.locks.DatabaseTaskLockBackend')
 
 LABEL_STREAM_HISTORY_LIMIT = int(get_env('LABEL_STREAM_HISTORY_LIMIT', default=100))
 
 RANDOM_NEXT_TASK_SAMPLE_SIZE = int(get_env('RANDOM_NEXT_TASK_SAMPLE_SIZE', 50))
+# number of next task candidates locked and checked with one query
+NEXT_TASK_LOCK_BATCH_SIZE = int(get_env('NEXT_TASK_LOCK_BATCH_SIZE', 50))
+
+# Precomputed next task queue in redis, see projects/functions/next_task_queue.py
+NEXT_TASK_QUEUE_ENABLED = get_bool_env('NEXT_TASK_QUEUE_ENABLED', False)
+NEXT_TASK_QUEUE_SIZE = int(get_env('NEXT_TASK_QUEUE_SIZE', 10000))
+NEXT_TASK_QUEUE_WINDOW = int(get_env('NEXT_TASK_QUEUE_WINDOW', 100))
+NEXT_TASK_QUEUE_TTL = int(get_env('NEXT_TASK_QUEUE_TTL', 3600))
+NEXT_TASK_QUEUE_REBUILD_THROTTLE = int(get_env('NEXT_TASK_QUEUE_REBUILD_THROTTLE', 30))
+
+# Annotation counters changes are stored as ProjectSummaryDelta rows and folded into the summary
+# on read and in a background job started when a project has N unfolded deltas
+PROJECT_SUMMARY_DELTAS_FOLD_INTERVAL = int(get_env('PROJECT_SUMMARY_DELTAS_FOLD_INTERVAL', 100))
+
+# Read project list counters from ProjectCounters table instead of subqueries, see projects/functions/project_counters.py
+PROJECT_COUNTERS_CACHE_ENABLED = get_bool_env('PROJECT_COUNTERS_CACHE_ENABLED', False)
 
 TASK_API_PAGE_SIZE_MAX = int(get_env('TASK_API_PAGE_SIZE_MAX', 0)) or None
 
@@ -540,6 +568,7 @@ REACT_APP_ROOT = os.path.join(BASE_DIR, '../../web/dist/apps/labelstudio')
 
 # per project settings
 BATCH_SIZE = 1000
+ANNOTATIONS_BULK_CREATE_MAX_SIZE = int(get_env('ANNOTATIONS_BULK_CREATE_MAX_SIZE', 10000))
 PROJECT_TITLE_MIN_LEN = 3
 PROJECT_TITLE_MAX_LEN = 50
 LOGIN_REDIRECT_URL = '/'
@@ -667,6 +696,23 @@ FUTURE_SAVE_TASK_TO_STORAGE = get_bool_env('FUTURE_SAVE_TASK_TO_STORAGE', defaul
 FUTURE_SAVE_TASK_TO_STORAGE_JSON_EXT = get_bool_env('FUTURE_SAVE_TASK_TO_STORAGE_JSON_EXT', default=True)
 STORAGE_IN_PROGRESS_TIMER = float(get_env('STORAGE_IN_PROGRESS_TIMER', 5.0))
 STORAGE_EXPORT_CHUNK_SIZE = int(get_env('STORAGE_EXPORT_CHUNK_SIZE', 100))
+# number of storage keys checked and imported at once during import storage sync
+STORAGE_SYNC_BATCH_SIZE = int(get_env('STORAGE_SYNC_BATCH_SIZE', 1000))
+# objects read in parallel during import storage sync, and the limit of read, but not saved object bytes
+STORAGE_SYNC_CONCURRENCY = int(get_env('STORAGE_SYNC_CONCURRENCY', 8))
+STORAGE_SYNC_MAX_INFLIGHT_BYTES = int(get_env('STORAGE_SYNC_MAX_INFLIGHT_BYTES', 64 * 1024 * 1024))
+# import storage sync lists only objects added after the previous sync: S3 and GCS keys after the last synced key
+# in lexicographic order, local files in directories modified since the previous sync. Objects with keys sorted before
+# the last synced key (e.g. uuid names) are imported by full rescan sync only, so it's disabled by default
+STORAGE_SYNC_INCREMENTAL = get_bool_env('STORAGE_SYNC_INCREMENTAL', False)
+# source of object created events for event-driven storage ingestion, see io_storages.events
+STORAGE_EVENT_SOURCE = get_env('STORAGE_EVENT_SOURCE', 'io_storages.events.RedisStreamStorageEventSource')
+# seconds the events consumer job waits for new events before it stops
+STORAGE_EVENTS_IDLE_TIMEOUT = float(get_env('STORAGE_EVENTS_IDLE_TIMEOUT', 60))
+
+# presigned storage urls cached in process memory (0 disables the cache) and optionally in redis
+PRESIGN_CACHE_SIZE = int(get_env('PRESIGN_CACHE_SIZE', 10000))
+PRESIGN_CACHE_REDIS = get_bool_env('PRESIGN_CACHE_REDIS', False)
 
 USE_NGINX_FOR_EXPORT_DOWNLOADS = get_bool_env('USE_NGINX_FOR_EXPORT_DOWNLOADS', False)
 
@@ -0,0 +1,4 @@
+info = {"message": "[user-021] Sync import storages by pages of keys with bulk inserts", "commit": "60c013c0ae4bd25b08bd75be1707edd93f929fcc", "date": "2026/10/18 20:29:36", "branch": "", "version": "60c013c+dirty"}
+
+# This file is automatically generated by version.py
+# Do not include it to git!
@@ -41,13 +41,14 @@ from label_studio.core.utils.common import load_func
 from .functions import (
     async_import_background,
     async_reimport_background,
+    get_import_job_meta,
     reformat_predictions,
     set_import_background_failure,
     set_reimport_background_failure,
 )
 from .models import FileUpload
 from .serializers import FileUploadSerializer, ImportApiSerializer, PredictionSerializer
-from .uploader import create_file_uploads, load_tasks
+from .uploader import TasksMaxFileSizeUploadHandler, create_file_uploads, load_tasks
 
 logger = logging.getLogger(__name__)
 
@@ -105,6 +106,16 @@ task_create_response_scheme = {
 }
 
 
+class UploadSizeCheckMixin:
+    """Total size of uploaded files is checked while the request body is received"""
+
+    def initialize_request(self, request, *args, **kwargs):
+        # files can be parsed already by a middleware, then the size is checked after the upload only
+        if not hasattr(request, '_files'):
+            request.upload_handlers.insert(0, TasksMaxFileSizeUploadHandler(request))
+        return super().initialize_request(request, *args, **kwargs)
+
+
 @method_decorator(
     name='post',
     decorator=swagger_auto_schema(
@@ -148,6 +159,17 @@ task_create_response_scheme = {
                 default=None,
                 required=False,
             ),
+            openapi.Parameter(
+                name='duplicates',
+                type=openapi.TYPE_STRING,
+                in_=openapi.IN_QUERY,
+                enum=ProjectImport.Duplicates.values,
+                description='Tasks with the same data as existing project tasks are kept as new tasks ("keep"), '
+                'skipped ("skip") or their annotations, predictions and meta are added to the existing tasks '
+                '("update").',
+                default=ProjectImport.Duplicates.KEEP,
+                required=False,
+            ),
         ],
         operation_summary='Import tasks',
         operation_description="""
@@ -201,9 +223,7 @@ task_create_response_scheme = {
             ```
 
             <br>
-        """.format(
-            host=(settings.HOSTNAME or 'https://localhost:8080')
-        ),
+        """.format(host=(settings.HOSTNAME or 'https://localhost:8080')),
         request_body=openapi.Schema(
             title='tasks',
             description='List of tasks to import',
@@ -236,7 +256,7 @@ task_create_response_scheme = {
     ),
 )
 # Import
-class ImportAPI(generics.CreateAPIView):
+class ImportAPI(UploadSizeCheckMixin, generics.CreateAPIView):
     permission_required = all_permissions.projects_change
     permission_classes = api_settings.DEFAULT_PERMISSION_CLASSES + [ProjectImportPermission]
     parser_classes = (JSONParser, MultiPartParser, FormParser)
@@ -249,7 +269,13 @@ class ImportAPI(generics.CreateAPIView):
             project = generics.get_object_or_404(Project.objects.for_user(self.request.user), pk=project_id)
         else:
             project = None
-        return {'project': project, 'user': self.request.user}
+        return {'project': project, 'user': self.request.user, 'duplicates': self._get_duplicates_mode()}
+
+    def _get_duplicates_mode(self):
+        duplicates = self.request.query_params.get('duplicates') or ProjectImport.Duplicates.KEEP
+        if duplicates not in ProjectImport.Duplicates.values:
+            raise ValidationError(f'"duplicates" must be one of {ProjectImport.Duplicates.values}')
+        return duplicates
 
     def post(self, *args, **kwargs):
         return super(ImportAPI, self).post(*args, **kwargs)
@@ -332,6 +358,7 @@ class ImportAPI(generics.CreateAPIView):
             preannotated_from_fields=preannotated_from_fields,
             commit_to_project=commit_to_project,
             return_task_ids=return_task_ids,
+            duplicates=self._get_duplicates_mode(),
         )
 
         if len(request.FILES):
@@ -368,6 +395,7 @@ class ImportAPI(generics.CreateAPIView):
             request.user.id,
             queue_name='high',
             on_failure=set_import_background_failure,
+            meta=get_import_job_meta(project_import.id),
             project_id=project.id,
             organization_id=request.user.active_organization.id,
         )
@@ -379,6 +407,7 @@ class ImportAPI(generics.CreateAPIView):
         commit_to_project = bool_from_request(request.query_params, 'commit_to_project', True)
         return_task_ids = bool_from_request(request.query_params, 'return_task_ids', False)
         preannotated_from_fields = list_of_strings_from_request(request.query_params, 'preannotated_from_fields', None)
+        self._get_duplicates_mode()
 
         # check project permissions
         project = generics.get_object_or_404(Project.objects.for_user(self.request.user), pk=self.kwargs['pk'])
@@ -484,10 +513,16 @@ class ReImportAPI(ImportAPI):
             status=status.HTTP_201_CREATED,
         )
 
-    def async_reimport(self, project, file_upload_ids, files_as_tasks_list, organization_id):
+    def async_reimport(
+        self, project, file_upload_ids, files_as_tasks_list, organization_id, diff=False, diff_key=None
+    ):
 
         project_reimport = ProjectReimport.objects.create(
-            project=project, file_upload_ids=file_upload_ids, files_as_tasks_list=files_as_tasks_list
+            project=project,
+            file_upload_ids=file_upload_ids,
+            files_as_tasks_list=files_as_tasks_list,
+            diff=diff,
+            diff_key=diff_key,
         )
 
         start_job_async_or_sync(
@@ -508,6 +543,11 @@ class ReImportAPI(ImportAPI):
         files_as_tasks_list = bool_from_request(request.data, 'files_as_tasks_list', True)
         file_upload_ids = self.request.data.get('file_upload_ids')
 
+        diff = bool_from_request(request.data, 'diff', False)
+        diff_key = request.data.get('diff_key') or None
+        if diff_key is not None and not isinstance(diff_key, str):
+            raise ValidationError('"diff_key" must be a task data key')
+
         # check project permissions
         project = generics.get_object_or_404(Project.objects.for_user(self.request.user), pk=self.kwargs['pk'])
 
@@ -525,6 +565,16 @@ class ReImportAPI(ImportAPI):
                 status=status.HTTP_200_OK,
             )
 
+        # diff is applied by batches in background, existing tasks are not recreated
+        if diff:
+            return self.async_reimport(
+                project,
+                file_upload_ids,
+                files_as_tasks_list,
+                request.user.active_organization_id,
+                diff=True,
+                diff_key=diff_key,
+            )
         if (
             flag_set('fflag_fix_all_lsdv_4971_async_reimport_09052023_short', request.user)
             and settings.VERSION_EDITION != 'Community'
@@ -587,11 +637,31 @@ class ReImportAPI(ImportAPI):
         """,
     ),
 )
-class FileUploadListAPI(generics.mixins.ListModelMixin, generics.mixins.DestroyModelMixin, generics.GenericAPIView):
+@method_decorator(
+    name='post',
+    decorator=swagger_auto_schema(
+        tags=['Import'],
+        x_fern_sdk_group_name=['files'],
+        x_fern_sdk_method_name='upload_many',
+        x_fern_audiences=['public'],
+        operation_summary='Upload files',
+        operation_description="""
+        Upload many files to a specific project without creating tasks from them.
+        File upload IDs can be used later to import tasks with the reimport API.
+        """,
+    ),
+)
+class FileUploadListAPI(
+    UploadSizeCheckMixin,
+    generics.mixins.ListModelMixin,
+    generics.mixins.DestroyModelMixin,
+    generics.GenericAPIView,
+):
     parser_classes = (JSONParser, MultiPartParser, FormParser)
     serializer_class = FileUploadSerializer
     permission_required = ViewClassPermission(
         GET=all_permissions.projects_view,
+        POST=all_permissions.projects_change,
         DELETE=all_permissions.projects_change,
     )
     queryset = FileUpload.objects.all()
@@ -611,6 +681,16 @@ class FileUploadListAPI(generics.mixins.ListModelMixin, generics.mixins.DestroyM
     def get(self, request, *args, **kwargs):
         return self.list(request, *args, **kwargs)
 
+    def post(self, request, *args, **kwargs):
+        project = generics.get_object_or_404(Project.objects.for_user(self.request.user), pk=self.kwargs['pk'])
+        if not request.FILES:
+            raise ValidationError('No files found in request')
+        file_upload_ids, could_be_tasks_list = create_file_uploads(request.user, project, request.FILES)
+        return Response(
+            {'file_upload_ids': file_upload_ids, 'could_be_tasks_list': could_be_tasks_list},
+            status=status.HTTP_201_CREATED,
+        )
+
     def delete(self, request, *args, **kwargs):
         project = generics.get_object_or_404(Project.objects.for_user(self.request.user), pk=self.kwargs['pk'])
         ids = self.request.data.get('file_upload_ids')
@@ -780,13 +860,17 @@ class PresignAPIMixin:
             return Response(status=status.HTTP_404_NOT_FOUND)
 
         url = resolved['url']
-        max_age = 0
-        if resolved.get('presign_ttl'):
-            max_age = resolved.get('presign_ttl') * 60
 
         # Proxy to presigned url
         response = HttpResponseRedirect(redirect_to=url, status=status.HTTP_303_SEE_OTHER)
-        response.headers['Cache-Control'] = f'no-store, max-age={max_age}'
+        if resolved.get('max_age'):
+            # the url is cached by the server for max_age seconds and stays valid for at least as long
+            response.headers['Cache-Control'] = f'private, max-age={resolved["max_age"]}'
+        else:
+            max_age = 0
+            if resolved.get('presign_ttl'):
+                max_age = resolved.get('presign_ttl') * 60
+            response.headers['Cache-Control'] = f'no-store, max-age={max_age}'
 
         return response
 
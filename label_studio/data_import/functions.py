@@ -1,107 +1,346 @@
+import json
 import logging
 import time
 import traceback
+from itertools import islice
 from typing import Callable, Optional
 
+import django_rq
+from core.label_config import replace_task_data_undefined_with_config_field
+from core.redis import is_job_in_queue, redis_connected
 from core.utils.common import load_func
 from django.conf import settings
 from django.db import transaction
+from django.utils.timezone import now
 from projects.models import ProjectImport, ProjectReimport, ProjectSummary
+from rest_framework.exceptions import ValidationError
+from tasks.functions import update_tasks_counters
+from tasks.models import Annotation, Task, fill_tasks_data_hash, get_task_data_hash
+from tasks.validation import get_task_data_validator
 from users.models import User
 from webhooks.models import WebhookAction
 from webhooks.utils import emit_webhooks_for_instance
 
 from .models import FileUpload
 from .serializers import ImportApiSerializer
+from .streaming import iter_batches
 from .uploader import load_tasks_for_async_import
 
 logger = logging.getLogger(__name__)
 
 
+def _create_tasks_batch(project, batch, user, duplicates=None):
+    """Validate and create tasks with their counters, must be called inside a transaction"""
+    serializer = ImportApiSerializer(
+        data=batch, many=True, context={'project': project, 'user': user, 'duplicates': duplicates}
+    )
+    serializer.is_valid(raise_exception=True)
+    db_tasks = serializer.save(project_id=project.id)
+    update_tasks_counters(Task.objects.filter(id__in=[task.id for task in db_tasks]))
+
+    # Lock summary for update to avoid race conditions
+    summary = ProjectSummary.objects.select_for_update().get(project=project)
+    summary.update_data_columns(db_tasks)
+    return db_tasks, serializer
+
+
+def import_tasks_in_batches(
+    project, tasks, user, preannotated_from_fields=None, batch_size=None, skip=0, on_batch=None, duplicates=None
+):
+    """Validate, create tasks and update their counters batch by batch,
+    so memory is bounded by the batch size rather than by the number of tasks.
+    Each batch is committed separately, project summary is locked only while the batch is written.
+    TASKS_MAX_NUMBER must be checked by the caller before, e.g. by check_max_task_number_of_file_uploads()
+    :param tasks: Iterable of task dicts, e.g. FileUpload.iter_tasks_from_uploaded_files() generator
+    :param skip: Number of tasks to skip, they were imported before
+    :param on_batch: Callback on_batch(source_count, db_tasks, serializer) called inside the batch transaction
+    :param duplicates: ProjectImport.Duplicates mode for tasks with the same data as existing tasks
+    :return: Dict with task_count, annotation_count, prediction_count of the created tasks
+    """
+    batch_size = batch_size or settings.IMPORT_BATCH_SIZE
+    result = {'task_count': 0, 'annotation_count': 0, 'prediction_count': 0}
+    processed_count = skip
+
+    for batch in iter_batches(islice(tasks, skip, None), batch_size):
+        processed_count += len(batch)
+        if preannotated_from_fields:
+            batch = reformat_predictions(batch, preannotated_from_fields)
+
+        with transaction.atomic():
+            db_tasks, serializer = _create_tasks_batch(project, batch, user, duplicates)
+            if on_batch:
+                on_batch(len(batch), db_tasks, serializer)
+
+        emit_webhooks_for_instance(user.active_organization, project, WebhookAction.TASKS_CREATED, db_tasks)
+        result['task_count'] += len(db_tasks)
+        result['annotation_count'] += len(serializer.db_annotations)
+        result['prediction_count'] += len(serializer.db_predictions)
+        logger.info(f'Import batch of {len(db_tasks)} tasks to project {project.id} finished, {processed_count} total')
+
+    return result
+
+
+def _reimport_match_key(data, data_hash, diff_key):
+    """Reimported rows are matched with existing tasks by the diff_key value or by the whole data,
+    None means the row can't be matched
+    """
+    if diff_key is None:
+        return data_hash
+    if diff_key not in data:
+        return None
+    return json.dumps(data[diff_key], sort_keys=True)
+
+
+def _index_tasks_for_reimport(tasks, diff_key, batch_size):
+    """Map match key to [(task id, data hash), ...], the oldest task is the last one, so it's matched first"""
+    index = {}
+    if diff_key is None:
+        fill_tasks_data_hash(tasks, batch_size)
+        rows = tasks.order_by('-id').values_list('id', 'data_hash')
+        for task_id, data_hash in rows.iterator(chunk_size=batch_size):
+            index.setdefault(data_hash, []).append((task_id, data_hash))
+    else:
+        rows = tasks.order_by('-id').values_list('id', 'data', 'data_hash')
+        for task_id, data, data_hash in rows.iterator(chunk_size=batch_size):
+            data_hash = data_hash or get_task_data_hash(data)
+            # tasks without diff_key can't be matched, they are deleted as tasks without matching rows
+            index.setdefault(_reimport_match_key(data, data_hash, diff_key), []).append((task_id, data_hash))
+    return index
+
+
+def _update_reimported_tasks(project, data_by_task_id):
+    """Replace data of matched tasks, summary data columns are moved from the old data to the new one"""
+    db_tasks = list(Task.objects.filter(id__in=list(data_by_task_id)).only('id', 'data'))
+    summary = ProjectSummary.objects.select_for_update().get(project=project)
+    summary.remove_data_columns(db_tasks)
+    updated_at = now()
+    for task in db_tasks:
+        task.data = data_by_task_id[task.id]
+        task.data_hash = get_task_data_hash(task.data)
+        task.updated_at = updated_at
+    Task.objects.bulk_update(db_tasks, ['data', 'data_hash', 'updated_at'])
+    summary.update_data_columns(db_tasks)
+
+
+def _delete_reimported_tasks(project, task_ids):
+    """Delete tasks without a matching row, summary is updated the same way as by the delete tasks action"""
+    queryset = Task.objects.filter(id__in=task_ids)
+    summary = ProjectSummary.objects.select_for_update().get(project=project)
+    summary.remove_created_annotations_and_labels(Annotation.objects.filter(task__in=queryset))
+    summary.remove_data_columns(queryset)
+    Task.delete_tasks_without_signals(queryset)
+
+
+def _iter_reimport_batches(project, tasks, index, diff_key, validator, batch_size):
+    """Split rows by batches into new tasks and changed data of matched tasks {task id: data},
+    matched tasks are popped from the index, so tasks left in the index have no matching row
+    """
+    processed_count = 0
+    for batch in iter_batches(tasks, batch_size):
+        processed_count += len(batch)
+        if processed_count > settings.TASKS_MAX_NUMBER:
+            raise ValidationError(f'Maximum task number is {settings.TASKS_MAX_NUMBER}')
+
+        new_tasks, data_by_task_id = [], {}
+        for task in batch:
+            # stored tasks have $undefined$ key renamed already (e.g. for txt files), so rows must have it too
+            replace_task_data_undefined_with_config_field(task['data'], project, validator.first_key)
+            data_hash = get_task_data_hash(task['data'])
+            match_key = _reimport_match_key(task['data'], data_hash, diff_key)
+            matches = index.get(match_key) if match_key is not None else None
+            if not matches:
+                new_tasks.append(task)
+                continue
+            task_id, old_data_hash = matches.pop()
+            if old_data_hash != data_hash:
+                data_by_task_id[task_id] = task['data']
+
+        errors = validator.check_batch(list(data_by_task_id.values()))
+        if errors:
+            raise ValidationError(next(iter(errors.values())).detail)
+        yield new_tasks, data_by_task_id
+
+
+def reimport_tasks_diff(project, iter_tasks, file_upload_ids, user, diff_key=None, batch_size=None):
+    """Apply reimported tasks as a difference to the existing tasks of the file uploads instead of recreating them.
+    Matched tasks get the new data and keep their annotations and predictions (annotations and predictions
+    of matched rows are ignored), rows without a match are created, tasks without a matching row are deleted.
+    Tasks are read twice: the first pass validates all rows, so an invalid row or too many rows fail the reimport
+    before any change, then each batch is applied and committed separately
+    :param iter_tasks: Callable returning a new iterable of task dicts on each call,
+                       e.g. FileUpload.iter_tasks_from_uploaded_files() generator
+    :param diff_key: Task data key to match rows with tasks, the whole data is compared if it's None
+    :return: Dict with task_count, annotation_count, prediction_count of the created tasks,
+             updated_count and deleted_count
+    """
+    batch_size = batch_size or settings.IMPORT_BATCH_SIZE
+    result = {'task_count': 0, 'annotation_count': 0, 'prediction_count': 0, 'updated_count': 0, 'deleted_count': 0}
+    existing_tasks = Task.objects.filter(project=project, file_upload_id__in=file_upload_ids)
+    index = _index_tasks_for_reimport(existing_tasks, diff_key, batch_size)
+    validator = get_task_data_validator(project)
+
+    # the first pass matches rows with a copy of the index, only ids and hashes of the tasks are kept in memory
+    index_copy = {match_key: list(matches) for match_key, matches in index.items()}
+    batches = _iter_reimport_batches(project, iter_tasks(), index_copy, diff_key, validator, batch_size)
+    for new_tasks, _ in batches:
+        if new_tasks:
+            serializer = ImportApiSerializer(data=new_tasks, many=True, context={'project': project, 'user': user})
+            serializer.is_valid(raise_exception=True)
+    del index_copy
+
+    batches = _iter_reimport_batches(project, iter_tasks(), index, diff_key, validator, batch_size)
+    for new_tasks, data_by_task_id in batches:
+        db_tasks = []
+        with transaction.atomic():
+            if data_by_task_id:
+                _update_reimported_tasks(project, data_by_task_id)
+            if new_tasks:
+                db_tasks, serializer = _create_tasks_batch(project, new_tasks, user)
+                result['annotation_count'] += len(serializer.db_annotations)
+                result['prediction_count'] += len(serializer.db_predictions)
+
+        if db_tasks:
+            emit_webhooks_for_instance(user.active_organization, project, WebhookAction.TASKS_CREATED, db_tasks)
+        result['task_count'] += len(db_tasks)
+        result['updated_count'] += len(data_by_task_id)
+        logger.info(f'Reimport batch to project {project.id}: {len(db_tasks)} created, {len(data_by_task_id)} updated')
+
+    # all rows are matched now, the rest of tasks are not in the reimported files anymore
+    deleted_ids = [task_id for matches in index.values() for task_id, _ in matches]
+    for batch in iter_batches(deleted_ids, batch_size):
+        with transaction.atomic():
+            _delete_reimported_tasks(project, batch)
+        Task.after_bulk_delete_actions(batch)
+        emit_webhooks_for_instance(
+            user.active_organization, project, WebhookAction.TASKS_DELETED, [{'id': task_id} for task_id in batch]
+        )
+        result['deleted_count'] += len(batch)
+    logger.info(f'Reimport to project {project.id} finished: {result}')
+
+    return result
+
+
 def async_import_background(
-    import_id, user_id, recalculate_stats_func: Optional[Callable[..., None]] = None, **kwargs
+    import_id,
+    user_id,
+    recalculate_stats_func: Optional[Callable[..., None]] = None,
+    resume: bool = False,
+    **kwargs,
 ):
+    """Import tasks by batches, each batch is committed with ProjectImport progress.
+    Failed or interrupted import is continued from ProjectImport.processed_count with resume=True
+    """
+    allowed_statuses = (
+        [ProjectImport.Status.FAILED, ProjectImport.Status.IN_PROGRESS] if resume else [ProjectImport.Status.CREATED]
+    )
     with transaction.atomic():
         try:
-            project_import = ProjectImport.objects.get(id=import_id)
+            project_import = ProjectImport.objects.select_for_update().get(id=import_id)
         except ProjectImport.DoesNotExist:
             logger.error(f'ProjectImport with id {import_id} not found, import processing failed')
             return
-        if project_import.status != ProjectImport.Status.CREATED:
+        if project_import.status not in allowed_statuses:
             logger.error(f'Processing import with id {import_id} already started')
             return
         project_import.status = ProjectImport.Status.IN_PROGRESS
-        project_import.save(update_fields=['status'])
+        project_import.traceback = None
+        project_import.error = None
+        project_import.updated_at = now()
+        project_import.save(update_fields=['status', 'traceback', 'error', 'updated_at'])
 
     user = User.objects.get(id=user_id)
 
     start = time.time()
     project = project_import.project
-    tasks = None
-    # upload files from request, and parse all tasks
+    # upload files from request, tasks are parsed lazily while they are imported
     # TODO: Stop passing request to load_tasks function, make all validation before
     tasks, file_upload_ids, found_formats, data_columns = load_tasks_for_async_import(project_import, user)
-
-    if project_import.preannotated_from_fields:
-        # turn flat task JSONs {"column1": value, "column2": value} into {"data": {"column1"..}, "predictions": [{..."column2"}]
-        tasks = reformat_predictions(tasks, project_import.preannotated_from_fields)
+    # downloaded files are saved, so resumed import reads the same tasks from them
+    project_import.file_upload_ids = file_upload_ids
+    project_import.found_formats = found_formats
+    project_import.data_columns = data_columns
+    project_import.save(update_fields=['file_upload_ids', 'found_formats', 'data_columns'])
 
     if project_import.commit_to_project:
-        with transaction.atomic():
-            # Lock summary for update to avoid race conditions
-            summary = ProjectSummary.objects.select_for_update().get(project=project)
+        # task ids are saved once after the batches: rewriting the growing JSON list on each batch is quadratic
+        created_task_ids = []
+
+        def save_progress(source_count, db_tasks, serializer):
+            project_import.processed_count += source_count
+            project_import.task_count += len(db_tasks)
+            project_import.annotation_count += len(serializer.db_annotations)
+            project_import.prediction_count += len(serializer.db_predictions)
+            if project_import.return_task_ids:
+                created_task_ids.extend(task.id for task in db_tasks)
+            project_import.updated_at = now()
+            project_import.save(
+                update_fields=['processed_count', 'task_count', 'annotation_count', 'prediction_count', 'updated_at']
+            )
 
-            # Immediately create project tasks and update project states and counters
-            serializer = ImportApiSerializer(data=tasks, many=True, context={'project': project})
-            serializer.is_valid(raise_exception=True)
-            tasks = serializer.save(project_id=project.id)
-            emit_webhooks_for_instance(user.active_organization, project, WebhookAction.TASKS_CREATED, tasks)
-
-            task_count = len(tasks)
-            annotation_count = len(serializer.db_annotations)
-            prediction_count = len(serializer.db_predictions)
-            # Update counters (like total_annotations) for new tasks and after bulk update tasks stats. It should be a
-            # single operation as counters affect bulk is_labeled update
-
-            recalculate_stats_counts = {
-                'task_count': task_count,
-                'annotation_count': annotation_count,
-                'prediction_count': prediction_count,
-            }
-
-            project.update_tasks_counters_and_task_states(
-                tasks_queryset=tasks,
-                maximum_annotations_changed=False,
-                overlap_cohort_percentage_changed=False,
-                tasks_number_changed=True,
-                recalculate_stats_counts=recalculate_stats_counts,
+        # Immediately create project tasks and update project states and counters
+        try:
+            import_tasks_in_batches(
+                project,
+                tasks,
+                user,
+                preannotated_from_fields=project_import.preannotated_from_fields,
+                skip=project_import.processed_count,
+                on_batch=save_progress,
+                duplicates=project_import.duplicates,
             )
-            logger.info('Tasks bulk_update finished (async import)')
+        finally:
+            # ids of the committed batches are kept for the resumed import too
+            if created_task_ids:
+                project_import.task_ids.extend(created_task_ids)
+                project_import.save(update_fields=['task_ids'])
 
-            summary.update_data_columns(tasks)
-            # TODO: summary.update_created_annotations_and_labels
+        # task counters are updated by batches, only task states and project stats are left
+        project.update_tasks_counters_and_task_states(
+            tasks_queryset=[],
+            maximum_annotations_changed=False,
+            overlap_cohort_percentage_changed=False,
+            tasks_number_changed=True,
+            recalculate_stats_counts={
+                'task_count': project_import.task_count,
+                'annotation_count': project_import.annotation_count,
+                'prediction_count': project_import.prediction_count,
+            },
+        )
+        logger.info('Tasks bulk_update finished (async import)')
+        # TODO: summary.update_created_annotations_and_labels
     else:
         # Do nothing - just output file upload ids for further use
-        task_count = len(tasks)
-        annotation_count = None
-        prediction_count = None
-
-    duration = time.time() - start
-
-    project_import.task_count = task_count or 0
-    project_import.annotation_count = annotation_count or 0
-    project_import.prediction_count = prediction_count or 0
-    project_import.duration = duration
-    project_import.file_upload_ids = file_upload_ids
-    project_import.found_formats = found_formats
-    project_import.data_columns = data_columns
-    if project_import.return_task_ids:
-        project_import.task_ids = [task.id for task in tasks]
+        project_import.task_count = sum(1 for _ in tasks)
+        project_import.annotation_count = 0
+        project_import.prediction_count = 0
 
+    project_import.duration += time.time() - start
     project_import.status = ProjectImport.Status.COMPLETED
+    project_import.finished_at = now()
     project_import.save()
 
 
+def get_import_job_meta(import_id):
+    return {'project_import': import_id}
+
+
+def is_import_job_alive(import_id, queue_name='high'):
+    """If async_import_background job of the import is queued or running on a worker,
+    only jobs enqueued with get_import_job_meta() are found
+    """
+    if not redis_connected():
+        return False
+    queue = django_rq.get_queue(queue_name)
+    meta = get_import_job_meta(import_id)
+    if is_job_in_queue(queue, 'async_import_background', meta=meta):
+        return True
+    for job_id in queue.started_job_registry.get_job_ids():
+        job = queue.fetch_job(job_id)
+        if job is not None and job.meta == meta:
+            return True
+    return False
+
+
 def set_import_background_failure(job, connection, type, value, _):
     import_id = job.args[0]
     ProjectImport.objects.filter(id=import_id).update(
@@ -147,6 +386,11 @@ def async_reimport_background(reimport_id, organization_id, user, **kwargs):
 
     project = reimport.project
 
+    if reimport.diff:
+        async_reimport_diff(reimport, user)
+        post_process_reimport(reimport)
+        return
+
     tasks, found_formats, data_columns = FileUpload.load_tasks_from_uploaded_files(
         reimport.project, reimport.file_upload_ids, files_as_tasks_list=reimport.files_as_tasks_list
     )
@@ -194,3 +438,42 @@ def async_reimport_background(reimport_id, organization_id, user, **kwargs):
     reimport.save()
 
     post_process_reimport(reimport)
+
+
+def async_reimport_diff(reimport, user):
+    """Reimport files by the difference with their existing tasks, files are streamed by batches"""
+    project = reimport.project
+
+    def iter_tasks():
+        # files are read twice by reimport_tasks_diff(): to validate and to apply the rows
+        tasks, _, _ = FileUpload.iter_tasks_from_uploaded_files(
+            project, reimport.file_upload_ids, files_as_tasks_list=reimport.files_as_tasks_list
+        )
+        return tasks
+
+    _, found_formats, data_columns = FileUpload.iter_tasks_from_uploaded_files(
+        project, reimport.file_upload_ids, files_as_tasks_list=reimport.files_as_tasks_list
+    )
+    result = reimport_tasks_diff(project, iter_tasks, reimport.file_upload_ids, user, diff_key=reimport.diff_key)
+
+    # counters of created tasks are updated by batches, only task states and project stats are left
+    if result['task_count'] or result['deleted_count']:
+        project.update_tasks_counters_and_task_states(
+            tasks_queryset=[],
+            maximum_annotations_changed=False,
+            overlap_cohort_percentage_changed=False,
+            tasks_number_changed=True,
+            recalculate_stats_counts={
+                'task_count': result['task_count'],
+                'annotation_count': result['annotation_count'],
+                'prediction_count': result['prediction_count'],
+            },
+        )
+    logger.info('Tasks bulk_update finished (async reimport diff)')
+
+    for field, value in result.items():
+        setattr(reimport, field, value)
+    reimport.found_formats = found_formats
+    reimport.data_columns = list(data_columns)
+    reimport.status = ProjectReimport.Status.COMPLETED
+    reimport.save()
@@ -0,0 +1,63 @@
+import logging
+from datetime import timedelta
+
+from core.redis import start_job_async_or_sync
+from data_import.functions import (
+    async_import_background,
+    get_import_job_meta,
+    is_import_job_alive,
+    set_import_background_failure,
+)
+from django.core.management.base import BaseCommand
+from django.utils.timezone import now
+from projects.models import ProjectImport
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        'Resume failed or interrupted async imports from the last committed batch. '
+        'In progress imports are resumed if they are listed with --import, '
+        'or their job is neither queued nor running and they were not updated for --stale-minutes'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--import', dest='imports', type=int, action='append', help='project import id')
+        parser.add_argument('--user', type=int, default=None, help='user id, project creator is used by default')
+        parser.add_argument(
+            '--stale-minutes',
+            type=int,
+            default=30,
+            help='in progress imports not updated for this time are considered interrupted',
+        )
+
+    def handle(self, *args, **options):
+        project_imports = ProjectImport.objects.filter(
+            status__in=[ProjectImport.Status.FAILED, ProjectImport.Status.IN_PROGRESS]
+        ).select_related('project')
+        if options['imports']:
+            project_imports = project_imports.filter(id__in=options['imports'])
+        stale_before = now() - timedelta(minutes=options['stale_minutes'])
+
+        for project_import in project_imports:
+            # in progress import can be still running, resuming it would create duplicated tasks
+            if project_import.status == ProjectImport.Status.IN_PROGRESS and not options['imports']:
+                if is_import_job_alive(project_import.id):
+                    logger.debug(f'Skip import {project_import.id}: its job is queued or running')
+                    continue
+                if project_import.updated_at and project_import.updated_at > stale_before:
+                    logger.debug(f'Skip import {project_import.id}: it was updated at {project_import.updated_at}')
+                    continue
+
+            logger.debug(f'Resume import {project_import.id} from task {project_import.processed_count}')
+            start_job_async_or_sync(
+                async_import_background,
+                project_import.id,
+                options['user'] or project_import.project.created_by_id,
+                resume=True,
+                queue_name='high',
+                on_failure=set_import_background_failure,
+                meta=get_import_job_meta(project_import.id),
+                project_id=project_import.project_id,
+            )
@@ -1,22 +1,20 @@
 """This file and its contents are licensed under the Apache License 2.0. Please see the included NOTICE for copyright information and LICENSE for a copy of the license.
 """
 import logging
+import multiprocessing
 import os
 import uuid
 from collections import Counter
-
-import pandas as pd
-
-try:
-    import ujson as json
-except:  # noqa: E722
-    import json
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice, repeat
 
 from django.conf import settings
 from django.db import models
 from django.utils.functional import cached_property
 from rest_framework.exceptions import ValidationError
 
+from .streaming import iter_csv, iter_json, iter_jsonl
+
 logger = logging.getLogger(__name__)
 
 
@@ -73,11 +71,29 @@ class FileUpload(models.Model):
             setattr(self, '_file_body', body)
         return body
 
-    def read_tasks_list_from_csv(self, sep=','):
+    def _csv_converters(self):
+        """Columns of object tags which don't accept numbers (e.g. HyperText) are kept as strings,
+        other cells are converted to numbers where possible
+        """
+        from tasks.validation import get_data_type_classes
+
+        return {
+            key: str
+            for key, data_type in self.project.data_types.items()
+            if not set(get_data_type_classes(data_type)) & {int, float}
+        }
+
+    def iter_tasks_list_from_csv(self, sep=','):
         logger.debug('Read tasks list from CSV file {}'.format(self.filepath))
-        tasks = pd.read_csv(self.file.open(), sep=sep).fillna('').to_dict('records')
-        tasks = [{'data': task} for task in tasks]
-        return tasks
+        with self.file.open('rb') as f:
+            for row in iter_csv(f, sep=sep, converters=self._csv_converters()):
+                yield {'data': row}
+
+    def read_tasks_list_from_csv(self, sep=','):
+        return list(self.iter_tasks_list_from_csv(sep))
+
+    def iter_tasks_list_from_tsv(self):
+        return self.iter_tasks_list_from_csv('\t')
 
     def read_tasks_list_from_tsv(self):
         return self.read_tasks_list_from_csv('\t')
@@ -88,25 +104,33 @@ class FileUpload(models.Model):
         tasks = [{'data': {settings.DATA_UNDEFINED_NAME: line}} for line in lines]
         return tasks
 
-    def read_tasks_list_from_json(self):
+    @staticmethod
+    def _format_json_task(task):
+        if not task.get('data'):
+            task = {'data': task}
+        if not isinstance(task['data'], dict):
+            raise ValidationError('Task item should be dict')
+        return task
+
+    def iter_tasks_list_from_json(self):
+        """JSON array is parsed incrementally, so the file is never loaded into memory as a whole"""
         logger.debug('Read tasks list from JSON file {}'.format(self.filepath))
+        with self.file.open('rb') as f:
+            # items of the array or a single task
+            for task in iter_json(f):
+                yield self._format_json_task(task)
 
-        raw_data = self.content
-        # Python 3.5 compatibility fix https://docs.python.org/3/whatsnew/3.6.html#json
-        try:
-            tasks = json.loads(raw_data)
-        except TypeError:
-            tasks = json.loads(raw_data.decode('utf8'))
-        if isinstance(tasks, dict):
-            tasks = [tasks]
-        tasks_formatted = []
-        for i, task in enumerate(tasks):
-            if not task.get('data'):
-                task = {'data': task}
-            if not isinstance(task['data'], dict):
-                raise ValidationError('Task item should be dict')
-            tasks_formatted.append(task)
-        return tasks_formatted
+    def read_tasks_list_from_json(self):
+        return list(self.iter_tasks_list_from_json())
+
+    def iter_tasks_list_from_jsonl(self):
+        logger.debug('Read tasks list from JSONL file {}'.format(self.filepath))
+        with self.file.open('rb') as f:
+            for task in iter_jsonl(f):
+                yield self._format_json_task(task)
+
+    def read_tasks_list_from_jsonl(self):
+        return list(self.iter_tasks_list_from_jsonl())
 
     def read_task_from_hypertext_body(self):
         logger.debug('Read 1 task from hypertext file {}'.format(self.filepath))
@@ -126,35 +150,91 @@ class FileUpload(models.Model):
     def format_could_be_tasks_list(self):
         return self.format in ('.csv', '.tsv', '.txt')
 
-    def read_tasks(self, file_as_tasks_list=True):
+    def _iter_tasks(self, file_as_tasks_list):
         file_format = self.format
-        try:
-            # file as tasks list
-            if file_format == '.csv' and file_as_tasks_list:
-                tasks = self.read_tasks_list_from_csv()
-            elif file_format == '.tsv' and file_as_tasks_list:
-                tasks = self.read_tasks_list_from_tsv()
-            elif file_format == '.txt' and file_as_tasks_list:
-                tasks = self.read_tasks_list_from_txt()
-            elif file_format == '.json':
-                tasks = self.read_tasks_list_from_json()
-
-            # otherwise - only one object tag should be presented in label config
-            elif not self.project.one_object_in_label_config:
-                raise ValidationError(
-                    'Your label config has more than one data key and direct file upload supports only '
-                    'one data key. To import data with multiple data keys, use a JSON or CSV file.'
-                )
-
-            # file as a single asset
-            elif file_format in ('.html', '.htm', '.xml'):
-                tasks = self.read_task_from_hypertext_body()
-            else:
-                tasks = self.read_task_from_uploaded_file()
+        # file as tasks list
+        if file_format == '.csv' and file_as_tasks_list:
+            yield from self.iter_tasks_list_from_csv()
+        elif file_format == '.tsv' and file_as_tasks_list:
+            yield from self.iter_tasks_list_from_tsv()
+        elif file_format == '.txt' and file_as_tasks_list:
+            yield from self.read_tasks_list_from_txt()
+        elif file_format == '.json':
+            yield from self.iter_tasks_list_from_json()
+        elif file_format == '.jsonl':
+            yield from self.iter_tasks_list_from_jsonl()
+
+        # otherwise - only one object tag should be presented in label config
+        elif not self.project.one_object_in_label_config:
+            raise ValidationError(
+                'Your label config has more than one data key and direct file upload supports only '
+                'one data key. To import data with multiple data keys, use a JSON or CSV file.'
+            )
 
+        # file as a single asset
+        elif file_format in ('.html', '.htm', '.xml'):
+            yield from self.read_task_from_hypertext_body()
+        else:
+            yield from self.read_task_from_uploaded_file()
+
+    def iter_tasks(self, file_as_tasks_list=True):
+        """Tasks generator, JSON, JSONL, CSV and TSV files are parsed lazily"""
+        try:
+            yield from self._iter_tasks(file_as_tasks_list)
         except Exception as exc:
             raise ValidationError('Failed to parse input file ' + self.file_name + ': ' + str(exc))
-        return tasks
+
+    def read_tasks(self, file_as_tasks_list=True):
+        return list(self.iter_tasks(file_as_tasks_list))
+
+    @staticmethod
+    def _get_file_uploads(project, file_upload_ids=None, formats=None):
+        # project is used by parsers, so it's loaded once and passed to the parsing processes with the file upload
+        file_uploads = FileUpload.objects.filter(project=project).select_related('project')
+        if file_upload_ids:
+            file_uploads = file_uploads.filter(id__in=file_upload_ids)
+        for file_upload in file_uploads:
+            if formats and file_upload.format not in formats:
+                continue
+            yield file_upload
+
+    @staticmethod
+    def _check_data_fields(common_data_fields, new_tasks, file_upload):
+        """Data keys of all files must intersect, return the common keys"""
+        new_data_fields = set(iter(new_tasks[0]['data'].keys())) if len(new_tasks) > 0 else set()
+        if not common_data_fields:
+            return new_data_fields
+        if not common_data_fields.intersection(new_data_fields):
+            raise ValidationError(
+                _old_vs_new_data_keys_inconsistency_message(new_data_fields, common_data_fields, file_upload.file.name)
+            )
+        return common_data_fields & new_data_fields
+
+    @staticmethod
+    def _read_files_tasks(file_uploads, files_as_tasks_list):
+        """Yield tasks of each file in the order of file_uploads. Files are parsed in a process pool
+        if IMPORT_PARSE_PROCESSES is set. Processes are not forked: web and RQ workers are threaded
+        and have open database connections, so processes are started clean and set up Django
+        """
+        processes = min(settings.IMPORT_PARSE_PROCESSES, len(file_uploads))
+        if processes <= 1:
+            for file_upload in file_uploads:
+                yield file_upload.read_tasks(files_as_tasks_list)
+            return
+
+        start_method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+        executor = ProcessPoolExecutor(
+            max_workers=processes,
+            mp_context=multiprocessing.get_context(start_method),
+            initializer=_init_parse_process,
+        )
+        try:
+            for tasks, error in executor.map(_read_file_upload_tasks, file_uploads, repeat(files_as_tasks_list)):
+                if error is not None:
+                    raise ValidationError(error)
+                yield tasks
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
 
     @classmethod
     def load_tasks_from_uploaded_files(
@@ -165,31 +245,14 @@ class FileUpload(models.Model):
         common_data_fields = set()
 
         # scan all files
-        file_uploads = FileUpload.objects.filter(project=project)
-        if file_upload_ids:
-            file_uploads = file_uploads.filter(id__in=file_upload_ids)
-        for file_upload in file_uploads:
-            file_format = file_upload.format
-            if formats and file_format not in formats:
-                continue
-            new_tasks = file_upload.read_tasks(files_as_tasks_list)
+        file_uploads = list(cls._get_file_uploads(project, file_upload_ids, formats))
+        for file_upload, new_tasks in zip(file_uploads, cls._read_files_tasks(file_uploads, files_as_tasks_list)):
             for task in new_tasks:
                 task['file_upload_id'] = file_upload.id
 
-            new_data_fields = set(iter(new_tasks[0]['data'].keys())) if len(new_tasks) > 0 else set()
-            if not common_data_fields:
-                common_data_fields = new_data_fields
-            elif not common_data_fields.intersection(new_data_fields):
-                raise ValidationError(
-                    _old_vs_new_data_keys_inconsistency_message(
-                        new_data_fields, common_data_fields, file_upload.file.name
-                    )
-                )
-            else:
-                common_data_fields &= new_data_fields
-
+            common_data_fields = cls._check_data_fields(common_data_fields, new_tasks, file_upload)
             tasks += new_tasks
-            fileformats.append(file_format)
+            fileformats.append(file_upload.format)
 
             if trim_size is not None:
                 if len(tasks) > trim_size:
@@ -197,6 +260,48 @@ class FileUpload(models.Model):
 
         return tasks, dict(Counter(fileformats)), common_data_fields
 
+    @classmethod
+    def iter_tasks_from_uploaded_files(cls, project, file_upload_ids=None, formats=None, files_as_tasks_list=True):
+        """Same as load_tasks_from_uploaded_files, but tasks are returned as a generator:
+        only the first task of each file is parsed beforehand to check data keys consistency
+        """
+        file_uploads = []
+        fileformats = []
+        common_data_fields = set()
+
+        for file_upload in cls._get_file_uploads(project, file_upload_ids, formats):
+            tasks = file_upload.iter_tasks(files_as_tasks_list)
+            first_tasks = list(islice(tasks, 1))
+            tasks.close()
+            common_data_fields = cls._check_data_fields(common_data_fields, first_tasks, file_upload)
+            file_uploads.append(file_upload)
+            fileformats.append(file_upload.format)
+
+        def iter_tasks():
+            for file_upload in file_uploads:
+                for task in file_upload.iter_tasks(files_as_tasks_list):
+                    task['file_upload_id'] = file_upload.id
+                    yield task
+
+        return iter_tasks(), dict(Counter(fileformats)), common_data_fields
+
+
+def _init_parse_process():
+    """Process pool initializer: Django is set up by DJANGO_SETTINGS_MODULE inherited from the parent process"""
+    import django
+
+    django.setup()
+
+
+def _read_file_upload_tasks(file_upload, files_as_tasks_list):
+    """Process pool worker: parse the file without database queries, errors are returned as details,
+    because ValidationError loses them on pickling
+    """
+    try:
+        return file_upload.read_tasks(files_as_tasks_list), None
+    except ValidationError as exc:
+        return None, exc.detail
+
 
 def _old_vs_new_data_keys_inconsistency_message(new_data_keys, old_data_keys, current_file):
     new_data_keys_list = ','.join(new_data_keys)
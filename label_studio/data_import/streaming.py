@@ -0,0 +1,295 @@
+"""This file and its contents are licensed under the Apache License 2.0. Please see the included NOTICE for copyright information and LICENSE for a copy of the license.
+"""
+import codecs
+import csv
+import json
+from collections import Counter
+from itertools import islice
+from typing import IO, Any, Callable, Dict, Iterable, Iterator, List
+
+try:
+    import ujson as fast_json
+except:  # noqa: E722
+    fast_json = json
+
+from django.conf import settings
+
+_WHITESPACE = ' \t\n\r'
+_NUMBER_CHARS = '0123456789.eE+-'
+# JSON errors this close to the end of the buffer can be caused by a cut value, e.g. "\u12" of "\u1234"
+_INCOMPLETE_TAIL = 16
+# pandas.read_csv defaults, so CSV files are imported the same way as before
+_CSV_NA_VALUES = frozenset(
+    [
+        '',
+        '#N/A',
+        '#N/A N/A',
+        '#NA',
+        '-1.#IND',
+        '-1.#QNAN',
+        '-NaN',
+        '-nan',
+        '1.#IND',
+        '1.#QNAN',
+        '<NA>',
+        'N/A',
+        'NA',
+        'NULL',
+        'NaN',
+        'None',
+        'n/a',
+        'nan',
+        'null',
+    ]
+)
+_CSV_BOOL_VALUES = {'True': True, 'TRUE': True, 'true': True, 'False': False, 'FALSE': False, 'false': False}
+
+
+def iter_text_chunks(file: IO, chunk_size: int = None) -> Iterator[str]:
+    """Read binary or text file by chunks, utf-8 (with optional BOM) is decoded incrementally"""
+    chunk_size = chunk_size or settings.IMPORT_STREAMING_CHUNK_SIZE
+    decoder = codecs.getincrementaldecoder('utf-8-sig')()
+    while True:
+        chunk = file.read(chunk_size)
+        if not chunk:
+            break
+        yield decoder.decode(chunk) if isinstance(chunk, bytes) else chunk
+    tail = decoder.decode(b'', final=True)
+    if tail:
+        yield tail
+
+
+def iter_lines(file: IO, chunk_size: int = None, keepends: bool = False) -> Iterator[str]:
+    """Split file into lines without reading it whole"""
+    rest = ''
+    for chunk in iter_text_chunks(file, chunk_size):
+        lines = (rest + chunk).split('\n')
+        rest = lines.pop()
+        if keepends:
+            yield from (line + '\n' for line in lines)
+        else:
+            yield from lines
+    if rest:
+        yield rest
+
+
+def iter_jsonl(file: IO, chunk_size: int = None) -> Iterator[Any]:
+    """Parse JSON Lines file, empty lines are skipped"""
+    for line_number, line in enumerate(iter_lines(file, chunk_size), start=1):
+        if not line.strip():
+            continue
+        try:
+            yield fast_json.loads(line)
+        except ValueError as exc:
+            raise ValueError(f'Line {line_number}: {exc}')
+
+
+def parse_csv_value(value: str) -> Any:
+    """Convert CSV cell to int, float or bool, missing values become empty strings"""
+    if value in _CSV_NA_VALUES:
+        return ''
+    if value in _CSV_BOOL_VALUES:
+        return _CSV_BOOL_VALUES[value]
+    # skip int() and float() for the most of text cells, "1_000" and "inf" are not numbers in CSV
+    if value[0] not in _NUMBER_CHARS or '_' in value:
+        return value
+    try:
+        return int(value)
+    except ValueError:
+        pass
+    try:
+        return float(value)
+    except ValueError:
+        return value
+
+
+def _csv_header(row: List[str]) -> List[str]:
+    """Name empty and duplicated columns like pandas: "Unnamed: 2", "text.1" """
+    header, seen = [], Counter()
+    for i, name in enumerate(row):
+        name = name or f'Unnamed: {i}'
+        column = name if not seen[name] else f'{name}.{seen[name]}'
+        seen[name] += 1
+        header.append(column)
+    return header
+
+
+def _csv_reader(file: IO, sep: str, chunk_size: int = None):
+    """CSV reader positioned after the header and the header columns"""
+    reader = csv.reader(iter_lines(file, chunk_size, keepends=True), delimiter=sep)
+    for row in reader:
+        if row:
+            return reader, _csv_header(row)
+    raise ValueError('No columns to parse from file')
+
+
+def _merge_csv_types(column_type: type, cell_type: type) -> type:
+    """Common type of the column cells, None is a column with missing values only"""
+    if column_type is None or column_type is cell_type:
+        return cell_type
+    if cell_type is None:
+        return column_type
+    if {column_type, cell_type} == {int, float}:
+        return float
+    return str
+
+
+def infer_csv_column_types(file: IO, sep: str = ',', chunk_size: int = None) -> List[type]:
+    """Column types like in pandas: a column is numeric or boolean only if all its cells are,
+    otherwise all the cells are kept as strings, e.g. zip codes "02134" in a column with "SW1A 1AA"
+    """
+    reader, header = _csv_reader(file, sep, chunk_size)
+    types = [None] * len(header)
+    for row in reader:
+        for i, value in enumerate(row[: len(header)]):
+            cell_type = None if value in _CSV_NA_VALUES else type(parse_csv_value(value))
+            types[i] = _merge_csv_types(types[i], cell_type)
+    return types
+
+
+def _csv_column_converter(column_type: type) -> Callable[[str], Any]:
+    if column_type in (None, str):
+        return lambda value: '' if value in _CSV_NA_VALUES else value
+    if column_type is bool:
+        return lambda value: '' if value in _CSV_NA_VALUES else _CSV_BOOL_VALUES[value]
+    return lambda value: '' if value in _CSV_NA_VALUES else column_type(value)
+
+
+def iter_csv(
+    file: IO, sep: str = ',', converters: Dict[str, Callable[[str], Any]] = None, chunk_size: int = None
+) -> Iterator[dict]:
+    """Read CSV file row by row, the first row is the header.
+    Cells are converted by the column types from infer_csv_column_types() or with the column converter,
+    e.g. {'html': str}. Seekable files are read twice to infer the types, other files are converted
+    cell by cell with parse_csv_value()
+    """
+    converters = converters or {}
+    if file.seekable():
+        start = file.tell()
+        types = infer_csv_column_types(file, sep, chunk_size)
+        file.seek(start)
+        reader, header = _csv_reader(file, sep, chunk_size)
+        default_converters = [_csv_column_converter(column_type) for column_type in types]
+    else:
+        reader, header = _csv_reader(file, sep, chunk_size)
+        default_converters = [parse_csv_value] * len(header)
+
+    columns = [(column, converters.get(column, default)) for column, default in zip(header, default_converters)]
+    for row in reader:
+        # blank lines are skipped
+        if not row:
+            continue
+        if len(row) > len(columns):
+            raise ValueError(f'Expected {len(columns)} fields in line {reader.line_num}, saw {len(row)}')
+        item = {column: convert(value) for (column, convert), value in zip(columns, row)}
+        # missing trailing cells
+        for column, _ in columns[len(row) :]:
+            item[column] = ''
+        yield item
+
+
+class _Buffer:
+    """Text buffer over the file chunks, consumed part is dropped on each refill"""
+
+    def __init__(self, file, chunk_size):
+        self.chunks = iter_text_chunks(file, chunk_size)
+        self.text = ''
+        self.pos = 0
+        self.eof = False
+
+    def fill(self, grow: bool = False) -> bool:
+        """Read the next chunk, return False at the end of file.
+        With grow=True chunks are read until the unconsumed text is doubled, so a large value
+        is parsed again only O(log(size / chunk_size)) times
+        """
+        target = 2 * (len(self.text) - self.pos) if grow else 0
+        chunks = [self.text[self.pos :]]
+        size = len(chunks[0])
+        while True:
+            chunk = next(self.chunks, None)
+            if chunk is None:
+                self.eof = True
+                break
+            chunks.append(chunk)
+            size += len(chunk)
+            if size >= target:
+                break
+        self.text = ''.join(chunks)
+        self.pos = 0
+        return len(chunks) > 1
+
+    def peek(self) -> str:
+        """Next non-whitespace char or empty string at the end of file"""
+        while True:
+            while self.pos < len(self.text) and self.text[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.text):
+                return self.text[self.pos]
+            if not self.fill():
+                return ''
+
+    def _is_incomplete(self, exc: json.JSONDecodeError) -> bool:
+        """The error is caused by the end of the buffer, e.g. "[1, " or a cut string or escape sequence"""
+        return exc.pos >= len(self.text) - _INCOMPLETE_TAIL or exc.msg.startswith('Unterminated string')
+
+    def decode(self, decoder: json.JSONDecoder) -> Any:
+        """Decode the next value, the buffer is refilled while the value is incomplete"""
+        self.peek()
+        while True:
+            try:
+                value, end = decoder.raw_decode(self.text, self.pos)
+            except json.JSONDecodeError as exc:
+                # only incomplete values are read further, syntax errors are raised without reading the file
+                if self.eof or not self._is_incomplete(exc) or not self.fill(grow=True):
+                    raise
+                continue
+            # numbers can be cut by the chunk border, e.g. "2." + "5e3"
+            if (
+                isinstance(value, (int, float))
+                and (end == len(self.text) or self.text[end] in _NUMBER_CHARS)
+                and not self.eof
+                and self.fill()
+            ):
+                continue
+            self.pos = end
+            return value
+
+
+def iter_json(file: IO, chunk_size: int = None) -> Iterator[Any]:
+    """Incremental parser for a JSON array: items are yielded one by one,
+    so only the current item and one chunk are kept in memory. Other JSON values are yielded as is
+    """
+    decoder = json.JSONDecoder()
+    buffer = _Buffer(file, chunk_size)
+
+    if buffer.peek() != '[':
+        value = buffer.decode(decoder)
+        if buffer.peek():
+            raise ValueError(f'Extra data after JSON value at position {buffer.pos}')
+        yield value
+        return
+
+    buffer.pos += 1
+    if buffer.peek() == ']':
+        buffer.pos += 1
+    else:
+        while True:
+            yield buffer.decode(decoder)
+            char = buffer.peek()
+            buffer.pos += 1
+            if char == ']':
+                break
+            if char != ',':
+                raise ValueError(f'Expecting "," or "]" delimiter in JSON array, got "{char}"')
+    if buffer.peek():
+        raise ValueError('Extra data after JSON array')
+
+
+def iter_batches(iterable: Iterable, batch_size: int) -> Iterator[List]:
+    """Split any iterable into lists of batch_size items"""
+    iterator = iter(iterable)
+    while True:
+        items = list(islice(iterator, batch_size))
+        if not items:
+            return
+        yield items
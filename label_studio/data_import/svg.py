@@ -0,0 +1,111 @@
+"""This file and its contents are licensed under the Apache License 2.0. Please see the included NOTICE for copyright information and LICENSE for a copy of the license.
+"""
+import logging
+from typing import IO
+from xml.sax.saxutils import escape, quoteattr
+
+from django.conf import settings
+from lxml import etree
+
+logger = logging.getLogger(__name__)
+
+# tags kept in sanitized SVG, other tags are dropped, but their content is kept
+SVG_ALLOWED_TAGS = frozenset(['svg', 'circle', 'ellipse', 'line', 'path', 'polygon', 'polyline', 'rect'])
+# tags dropped together with their content
+SVG_KILLED_TAGS = frozenset(['script', 'style', 'foreignObject', 'iframe', 'object', 'embed', 'applet'])
+
+
+def _local_name(name):
+    return name.rsplit('}', 1)[-1]
+
+
+def _is_safe_attribute(name, value):
+    """Event handlers, inline styles and javascript: links are removed"""
+    name = _local_name(name).lower()
+    if name.startswith('on') or name == 'style':
+        return False
+    return not ''.join(value.split()).lower().startswith('javascript:')
+
+
+class SvgSanitizer:
+    """lxml parser target writing allowed SVG elements to the output file as they are parsed,
+    comments, processing instructions and doctype are skipped
+    """
+
+    def __init__(self, output: IO[bytes]):
+        self.output = output
+        self.prefixes = {}
+        self.pending_namespaces = {}
+        # written tag names or None for dropped tags
+        self.stack = []
+        self.killed_depth = 0
+
+    def _qualified_name(self, name):
+        if not name.startswith('{'):
+            return name
+        uri, local = name[1:].split('}', 1)
+        prefix = self.prefixes.get(uri)
+        return f'{prefix}:{local}' if prefix else local
+
+    def write(self, text):
+        self.output.write(text.encode())
+
+    def start(self, tag, attrib, nsmap=None):
+        for prefix, uri in (nsmap or {}).items():
+            self.prefixes[uri] = prefix
+            self.pending_namespaces[prefix] = uri
+        if self.killed_depth or _local_name(tag) in SVG_KILLED_TAGS:
+            self.killed_depth += 1
+            return
+        if _local_name(tag) not in SVG_ALLOWED_TAGS:
+            self.stack.append(None)
+            return
+
+        name = self._qualified_name(tag)
+        self.write('<' + name)
+        # namespaces declared on dropped tags are moved to the next written tag
+        for prefix, uri in self.pending_namespaces.items():
+            self.write(f' xmlns:{prefix}={quoteattr(uri)}' if prefix else f' xmlns={quoteattr(uri)}')
+        self.pending_namespaces = {}
+        for key, value in attrib.items():
+            if _is_safe_attribute(key, value):
+                self.write(f' {self._qualified_name(key)}={quoteattr(value)}')
+        self.write('>')
+        self.stack.append(name)
+
+    def end(self, tag):
+        if self.killed_depth:
+            self.killed_depth -= 1
+            return
+        name = self.stack.pop()
+        if name is not None:
+            self.write(f'</{name}>')
+
+    def data(self, text):
+        if not self.killed_depth:
+            self.write(escape(text))
+
+    def close(self):
+        """Close tags left open by a truncated file"""
+        while self.stack:
+            name = self.stack.pop()
+            if name is not None:
+                self.write(f'</{name}>')
+        self.output.flush()
+
+
+def sanitize_svg(svg_file: IO[bytes], output: IO[bytes], chunk_size: int = None):
+    """Filter out malicious/harmful content from SVG file by allowed tags, the file is parsed by chunks,
+    so it's never loaded into memory as a whole. External entities are not resolved
+    """
+    chunk_size = chunk_size or settings.IMPORT_STREAMING_CHUNK_SIZE
+    sanitizer = SvgSanitizer(output)
+    parser = etree.XMLParser(target=sanitizer, recover=True, resolve_entities=False, no_network=True, huge_tree=True)
+    try:
+        while chunk := svg_file.read(chunk_size):
+            parser.feed(chunk.encode() if isinstance(chunk, str) else chunk)
+        parser.close()
+    except etree.XMLSyntaxError as exc:
+        # invalid files are still accepted with the content parsed before the error
+        logger.warning(f'SVG file is not valid XML: {exc}')
+        sanitizer.close()
@@ -5,6 +5,8 @@ import io
 import logging
 import mimetypes
 import os
+import tempfile
+from itertools import chain, islice
 
 try:
     import ujson as json
@@ -14,10 +16,14 @@ except:  # noqa: E722
 from core.utils.common import timeit
 from core.utils.io import ssrf_safe_get
 from django.conf import settings
+from django.core.files import File
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.files.uploadhandler import FileUploadHandler
+from django.db import transaction
 from rest_framework.exceptions import ValidationError
 
 from .models import FileUpload
+from .svg import sanitize_svg
 
 logger = logging.getLogger(__name__)
 csv.field_size_limit(131072 * 10)
@@ -48,6 +54,16 @@ def check_max_task_number(tasks):
         )
 
 
+def check_max_task_number_of_file_uploads(project, file_upload_ids):
+    """Count tasks of the uploaded files by a streaming pass before the import,
+    so the import fails before any batch is committed
+    """
+    tasks, _, _ = FileUpload.iter_tasks_from_uploaded_files(project, file_upload_ids)
+    task_count = sum(1 for _ in islice(tasks, settings.TASKS_MAX_NUMBER + 1))
+    if task_count > settings.TASKS_MAX_NUMBER:
+        raise ValidationError(f'Maximum task number is {settings.TASKS_MAX_NUMBER}')
+
+
 def check_tasks_max_file_size(value):
     if value >= settings.TASKS_MAX_FILE_SIZE:
         raise ValidationError(
@@ -69,49 +85,49 @@ def check_request_files_size(files):
     check_tasks_max_file_size(total)
 
 
-def create_file_upload(user, project, file):
-    instance = FileUpload(user=user, project=project, file=file)
+class TasksMaxFileSizeUploadHandler(FileUploadHandler):
+    """Check the total size of uploaded files while the request body is received,
+    so too large uploads are rejected before they are buffered completely
+    """
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.total_size = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.total_size += len(raw_data)
+        check_tasks_max_file_size(self.total_size)
+        return raw_data
+
+    def file_complete(self, file_size):
+        # the file is created by the next handlers
+        return None
+
+
+def _sanitized_svg_file(file):
+    """Sanitize SVG by chunks into a temporary file, it's kept in memory only for small files"""
+    output = tempfile.SpooledTemporaryFile(max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE)
+    file.seek(0)
+    sanitize_svg(file, output)
+    output.seek(0)
+    return File(output, name=file.name)
+
+
+def _store_file_upload(user, project, file):
+    """Write the file to the configured storage, FileUpload instance is returned unsaved"""
     if settings.SVG_SECURITY_CLEANUP:
-        content_type, encoding = mimetypes.guess_type(str(instance.file.name))
+        content_type, encoding = mimetypes.guess_type(str(file.name))
         if content_type in ['image/svg+xml']:
-            clean_xml = allowlist_svg(instance.file.read().decode())
-            instance.file.seek(0)
-            instance.file.write(clean_xml.encode())
-            instance.file.truncate()
-    instance.save()
+            file = _sanitized_svg_file(file)
+    instance = FileUpload(user=user, project=project)
+    instance.file.save(file.name, file, save=False)
     return instance
 
 
-def allowlist_svg(dirty_xml):
-    """Filter out malicious/harmful content from SVG files
-    by defining allowed tags
-    """
-    from lxml.html import clean
-
-    allow_tags = [
-        'xml',
-        'svg',
-        'circle',
-        'ellipse',
-        'line',
-        'path',
-        'polygon',
-        'polyline',
-        'rect',
-    ]
-
-    cleaner = clean.Cleaner(
-        allow_tags=allow_tags,
-        style=True,
-        links=True,
-        add_nofollow=False,
-        page_structure=True,
-        safe_attrs_only=False,
-        remove_unknown_tags=False,
-    )
-
-    clean_xml = cleaner.clean_html(dirty_xml)
-    return clean_xml
+def create_file_upload(user, project, file):
+    instance = _store_file_upload(user, project, file)
+    instance.save()
+    return instance
 
 
 def str_to_json(data):
@@ -148,29 +164,31 @@ def tasks_from_url(file_upload_ids, project, user, url, could_be_tasks_list):
 
 @timeit
 def create_file_uploads(user, project, FILES):
-    could_be_tasks_list = False
-    file_upload_ids = []
+    """Store files and create their FileUpload rows in one transaction"""
     check_request_files_size(FILES)
     check_extensions(FILES)
-    for _, file in FILES.items():
-        file_upload = create_file_upload(user, project, file)
-        if file_upload.format_could_be_tasks_list:
-            could_be_tasks_list = True
-        file_upload_ids.append(file_upload.id)
+    file_uploads = [_store_file_upload(user, project, file) for _, file in FILES.items()]
+    with transaction.atomic():
+        file_uploads = FileUpload.objects.bulk_create(file_uploads)
+    could_be_tasks_list = any(file_upload.format_could_be_tasks_list for file_upload in file_uploads)
+    file_upload_ids = [file_upload.id for file_upload in file_uploads]
 
     logger.debug(f'created file uploads: {file_upload_ids} could_be_tasks_list: {could_be_tasks_list}')
     return file_upload_ids, could_be_tasks_list
 
 
 def load_tasks_for_async_import(project_import, user):
-    """Load tasks from different types of request.data / request.files saved in project_import model"""
+    """Load tasks from different types of request.data / request.files saved in project_import model,
+    tasks are returned as an iterator: uploaded files are parsed lazily
+    """
     file_upload_ids, found_formats, data_keys = [], [], set()
 
     if project_import.file_upload_ids:
         file_upload_ids = project_import.file_upload_ids
-        tasks, found_formats, data_keys = FileUpload.load_tasks_from_uploaded_files(
+        tasks, found_formats, data_keys = FileUpload.iter_tasks_from_uploaded_files(
             project_import.project, file_upload_ids
         )
+        check_max_task_number_of_file_uploads(project_import.project, file_upload_ids)
 
     # take tasks from url address
     elif project_import.url:
@@ -184,9 +202,10 @@ def load_tasks_for_async_import(project_import, user):
                 SimpleUploadedFile('inplace.json', url.encode()),
             )
             file_upload_ids.append(file_upload.id)
-            tasks, found_formats, data_keys = FileUpload.load_tasks_from_uploaded_files(
+            tasks, found_formats, data_keys = FileUpload.iter_tasks_from_uploaded_files(
                 project_import.project, file_upload_ids
             )
+            check_max_task_number_of_file_uploads(project_import.project, file_upload_ids)
 
         # download file using url and read tasks from it
         else:
@@ -201,20 +220,25 @@ def load_tasks_for_async_import(project_import, user):
             if could_be_tasks_list:
                 project_import.could_be_tasks_list = True
                 project_import.save(update_fields=['could_be_tasks_list'])
+            check_max_task_number(tasks)
 
     elif project_import.tasks:
         tasks = project_import.tasks
+        # check is data root is list
+        if not isinstance(tasks, list):
+            raise ValidationError('load_tasks: Data root must be list')
+        check_max_task_number(tasks)
 
-    # check is data root is list
-    if not isinstance(tasks, list):
-        raise ValidationError('load_tasks: Data root must be list')
+    else:
+        tasks = []
 
     # empty tasks error
-    if not tasks:
+    tasks = iter(tasks)
+    first_task = next(tasks, None)
+    if first_task is None:
         raise ValidationError('load_tasks: No tasks added')
 
-    check_max_task_number(tasks)
-    return tasks, file_upload_ids, found_formats, list(data_keys)
+    return chain([first_task], tasks), file_upload_ids, found_formats, list(data_keys)
 
 
 def load_tasks(request, project):
@@ -224,13 +248,7 @@ def load_tasks(request, project):
 
     # take tasks from request FILES
     if len(request.FILES):
-        check_request_files_size(request.FILES)
-        check_extensions(request.FILES)
-        for filename, file in request.FILES.items():
-            file_upload = create_file_upload(request.user, project, file)
-            if file_upload.format_could_be_tasks_list:
-                could_be_tasks_list = True
-            file_upload_ids.append(file_upload.id)
+        file_upload_ids, could_be_tasks_list = create_file_uploads(request.user, project, request.FILES)
         tasks, found_formats, data_keys = FileUpload.load_tasks_from_uploaded_files(project, file_upload_ids)
 
     # take tasks from url address
@@ -5,7 +5,7 @@ import logging
 
 from core.permissions import AllPermissions
 from core.redis import start_job_async_or_sync
-from tasks.models import Annotation, Prediction, Task
+from tasks.models import Annotation, Prediction, Task, bulk_update_tasks_data
 
 logger = logging.getLogger(__name__)
 all_permissions = AllPermissions()
@@ -51,7 +51,7 @@ def cache_labels_job(project, queryset, **kwargs):
         else:
             task.data[column_name] = ', '.join(sorted(list(set(task_labels))))
 
-    Task.objects.bulk_update(tasks, fields=['data'], batch_size=1000)
+    bulk_update_tasks_data(tasks)
     first_task = Task.objects.get(id=queryset.first().id)
     project.summary.update_data_columns([first_task])
     return {'response_code': 200, 'detail': f'Updated {len(tasks)} tasks'}
@@ -9,7 +9,7 @@ from core.permissions import AllPermissions
 from core.utils.db import fast_first
 from data_manager.functions import DataManagerException
 from django.conf import settings
-from tasks.models import Annotation, Task
+from tasks.models import Annotation, Task, bulk_update_tasks_data
 from tasks.serializers import TaskSerializerBulk
 
 logger = logging.getLogger(__name__)
@@ -116,6 +116,7 @@ def rename_labels(project, queryset, **kwargs):
     project.summary.update_data_columns(project.tasks.all())
     annotations = Annotation.objects.filter(project=project)
     project.summary.update_created_annotations_and_labels(annotations)
+    project.summary.fold_deltas()
 
     return {
         'response_code': 200,
@@ -177,7 +178,7 @@ def add_data_field(project, queryset, **kwargs):
             tasks = list(queryset.only('data'))
             for task in tasks:
                 task.data[value_name] = value
-            Task.objects.bulk_update(tasks, fields=['data'], batch_size=1000)
+            bulk_update_tasks_data(tasks)
 
         # postgres and other DB
         else:
@@ -187,7 +188,9 @@ def add_data_field(project, queryset, **kwargs):
                     Value([value_name]),
                     Value(value, JSONField()),
                     function='jsonb_set',
-                )
+                ),
+                # data is changed in the db, fill_tasks_data_hash() recalculates hashes when they are needed
+                data_hash=None,
             )
 
     project.summary.update_data_columns([queryset.first()])
@@ -267,7 +270,7 @@ def add_expression(queryset, size, value, value_name):
     else:
         raise Exception('Undefined expression, you can use: ' + add_data_field_examples)
 
-    Task.objects.bulk_update(tasks, fields=['data'], batch_size=1000)
+    bulk_update_tasks_data(tasks)
 
 
 def add_data_field_form(user, project):
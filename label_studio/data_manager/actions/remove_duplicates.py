@@ -4,17 +4,16 @@
 import logging
 from collections import defaultdict
 
-import ujson as json
-from core.label_config import replace_task_data_undefined_with_config_field
 from core.permissions import AllPermissions
 from core.redis import start_job_async_or_sync
 from data_manager.actions.basic import delete_tasks
+from django.db.models import Count
 from io_storages.azure_blob.models import AzureBlobImportStorageLink
 from io_storages.gcs.models import GCSImportStorageLink
 from io_storages.localfiles.models import LocalFilesImportStorageLink
 from io_storages.redis.models import RedisImportStorageLink
 from io_storages.s3.models import S3ImportStorageLink
-from tasks.models import Task
+from tasks.models import Task, fill_tasks_data_hash
 
 logger = logging.getLogger(__name__)
 all_permissions = AllPermissions()
@@ -182,7 +181,9 @@ def restore_storage_links_for_duplicated_tasks(duplicates) -> None:
 
 
 def find_duplicated_tasks_by_data(project, queryset):
-    """Find duplicated tasks by `task.data` and return them as a dict"""
+    """Find duplicated tasks by `task.data_hash` and return them as a dict {data_hash: [task, ...]},
+    duplicated hashes are grouped in SQL, so only duplicated tasks are loaded
+    """
 
     # get io_storage_* links for tasks, we need to copy them
     storages = []
@@ -190,17 +191,19 @@ def find_duplicated_tasks_by_data(project, queryset):
         if field.startswith('io_storages_'):
             storages += [field]
 
-    groups = defaultdict(list)
-    tasks = list(queryset.values('data', 'id', 'total_annotations', 'cancelled_annotations', *storages))
-    logger.info(f'Retrieved {len(tasks)} tasks from queryset')
+    tasks = Task.objects.filter(id__in=queryset.values('id'))
+    fill_tasks_data_hash(tasks)
+    duplicated_hashes = (
+        tasks.order_by().values('data_hash').annotate(count=Count('id')).filter(count__gt=1).values('data_hash')
+    )
+    duplicated_tasks = tasks.filter(data_hash__in=duplicated_hashes).order_by('id')
 
-    for task in list(tasks):
-        replace_task_data_undefined_with_config_field(task['data'], project)
-        task['data'] = json.dumps(task['data'])
-        groups[task['data']].append(task)
+    duplicates = defaultdict(list)
+    for task in duplicated_tasks.values('data_hash', 'id', 'total_annotations', 'cancelled_annotations', *storages):
+        duplicates[task.pop('data_hash')].append(task)
+    duplicates = dict(duplicates)
 
     # make groups of duplicated ids for info print
-    duplicates = {d: groups[d] for d in groups if len(groups[d]) > 1}
     info = {d: [task['id'] for task in duplicates[d]] for d in duplicates}
 
     logger.info(f'Found {len(duplicates)} duplicated tasks')
@@ -6,6 +6,7 @@ import os
 
 from core.permissions import all_permissions
 from core.utils.io import read_yaml
+from core.utils.params import bool_from_request
 from django.conf import settings
 from drf_yasg import openapi as openapi
 from drf_yasg.utils import swagger_auto_schema
@@ -118,7 +119,7 @@ class ImportStorageSyncAPI(generics.GenericAPIView):
             response_data = {'message': f'Storage {str(storage.id)} is not synchronizable'}
             return Response(status=status.HTTP_400_BAD_REQUEST, data=response_data)
         storage.validate_connection()
-        storage.sync()
+        storage.sync(full_rescan=bool_from_request(request.data, 'full_rescan', False))
         storage.refresh_from_db()
         return Response(self.serializer_class(storage).data)
 
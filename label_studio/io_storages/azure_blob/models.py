@@ -67,8 +67,15 @@ class AzureBlobStorageMixin(models.Model):
             + account_key
             + ';EndpointSuffix=core.windows.net'
         )
+        # the client is thread-safe and keeps a connection pool, so it's reused by the storage instance
+        cache_key = (connection_string, str(self.container))
+        cached = getattr(self, '_client_and_container', None)
+        if cached and cached[0] == cache_key:
+            return cached[1]
+
         client = BlobServiceClient.from_connection_string(conn_str=connection_string)
         container = client.get_container_client(str(self.container))
+        self._client_and_container = (cache_key, (client, container))
         return client, container
 
     def get_container(self):
@@ -123,9 +130,12 @@ class AzureBlobImportStorageBase(AzureBlobStorageMixin, ImportStorage):
             yield file.name
 
     def get_data(self, key):
+        return self.get_data_with_size(key)[0]
+
+    def get_data_with_size(self, key):
         if self.use_blob_urls:
             data_key = settings.DATA_UNDEFINED_NAME
-            return {data_key: f'{self.url_scheme}://{self.container}/{key}'}
+            return {data_key: f'{self.url_scheme}://{self.container}/{key}'}, 0
 
         container = self.get_container()
         blob = container.download_blob(key)
@@ -135,7 +145,7 @@ class AzureBlobImportStorageBase(AzureBlobStorageMixin, ImportStorage):
             raise ValueError(
                 f'Error on key {key}: For {self.__class__.__name__} your JSON file must be a dictionary with one task'
             )
-        return value
+        return value, len(blob_str)
 
     def scan_and_create_links(self):
         return self._scan_and_create_links(AzureBlobImportStorageLink)
@@ -3,7 +3,9 @@
 import base64
 import json
 import logging
+import re
 import traceback as tb
+from contextlib import closing
 from datetime import datetime
 from typing import Union
 from urllib.parse import urljoin
@@ -14,7 +16,9 @@ import rq.exceptions
 from core.feature_flags import flag_set
 from core.redis import is_job_in_queue, is_job_on_worker, redis_connected
 from core.utils.common import load_func
+from core.utils.db import copy_bulk_create
 from data_export.serializers import ExportDataSerializer
+from data_import.streaming import iter_batches
 from django.conf import settings
 from django.contrib.auth.models import AnonymousUser
 from django.db import models, transaction
@@ -23,9 +27,17 @@ from django.shortcuts import reverse
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from django_rq import job
-from io_storages.utils import get_uri_via_regex
+from io_storages.presign_cache import get_presigned_url
+from io_storages.utils import get_uri_via_regex, iter_prefetched
 from rq.job import Job
-from tasks.models import Annotation, Task
+from tasks.models import (
+    Annotation,
+    Prediction,
+    Task,
+    bulk_update_stats_project_tasks,
+    get_task_data_hash,
+    update_project_annotation_count,
+)
 from tasks.serializers import AnnotationSerializer, PredictionSerializer
 from webhooks.models import WebhookAction
 from webhooks.utils import emit_webhooks_for_instance
@@ -223,12 +235,40 @@ class Storage(StorageInfo):
 
 
 class ImportStorage(Storage):
+    sync_checkpoint = JSONField(
+        _('sync_checkpoint'),
+        null=True,
+        default=dict,
+        editable=False,
+        help_text='Listing checkpoint of the last completed sync, the next sync lists only objects added after it',
+    )
+
     def iterkeys(self):
         return iter(())
 
+    def iterkeys_incremental(self, checkpoint, next_checkpoint):
+        """Keys added after the checkpoint of the previous sync, next_checkpoint is filled while keys are listed.
+        Storages without incremental listing list all keys
+        """
+        return self.iterkeys()
+
+    def _iterkeys_after_last_key(self, checkpoint, next_checkpoint, listing):
+        """Incremental listing for storages returning keys in lexicographic order:
+        the last listed key is the checkpoint, and the listing parameters must be the same to reuse it
+        """
+        last_key = checkpoint.get('last_key') if checkpoint and checkpoint.get('listing') == listing else None
+        next_checkpoint.update(listing=listing, last_key=last_key)
+        for key in self.iterkeys(start_after=last_key):
+            next_checkpoint['last_key'] = key
+            yield key
+
     def get_data(self, key):
         raise NotImplementedError
 
+    def get_data_with_size(self, key):
+        """get_data() and the size of the read object in bytes, the size limits objects prefetched by sync"""
+        return self.get_data(key), 0
+
     def generate_http_url(self, url):
         raise NotImplementedError
 
@@ -280,7 +320,7 @@ class ImportStorage(Storage):
                     return uri.replace(extracted_uri, proxy_url)
                 else:
                     # resolve uri to url using storages
-                    http_url = self.generate_http_url(extracted_uri)
+                    http_url, _ = get_presigned_url(self, extracted_uri)
 
                 return uri.replace(extracted_uri, http_url)
             except Exception:
@@ -298,8 +338,9 @@ class ImportStorage(Storage):
 
         raise NotImplementedError
 
-    @classmethod
-    def add_task(cls, data, project, maximum_annotations, max_inner_id, storage, key, link_class):
+    @staticmethod
+    def _parse_task_data(data):
+        """Split storage object into task data, predictions, annotations and the number of cancelled annotations"""
         # predictions
         predictions = data.get('predictions', [])
         if predictions:
@@ -320,6 +361,11 @@ class ImportStorage(Storage):
 
         if 'data' in data and isinstance(data['data'], dict):
             data = data['data']
+        return data, predictions, annotations, cancelled_annotations
+
+    @classmethod
+    def add_task(cls, data, project, maximum_annotations, max_inner_id, storage, key, link_class):
+        data, predictions, annotations, cancelled_annotations = cls._parse_task_data(data)
 
         with transaction.atomic():
             task = Task.objects.create(
@@ -360,81 +406,234 @@ class ImportStorage(Storage):
         return task
         # FIXME: add_annotation_history / post_process_annotations should be here
 
+    @staticmethod
+    def _validate_task_items(serializer_class, tasks, items_by_task, raise_exception):
+        """Validate predictions or annotations of each task like add_task() does:
+        if any item of a task is invalid, all items of this task are skipped
+        """
+        validated = []
+        for task, items in zip(tasks, items_by_task):
+            if not items:
+                continue
+            for item in items:
+                item['task'] = task.id
+                item['project'] = task.project_id
+            serializer = serializer_class(data=items, many=True)
+            if serializer.is_valid(raise_exception=raise_exception):
+                validated.extend(serializer.validated_data)
+        return validated
+
+    @classmethod
+    def add_tasks(cls, items, project, maximum_annotations, max_inner_id, storage, link_class):
+        """Bulk version of add_task() for a page of (key, data) items: tasks, links, predictions and annotations
+        are created with one insert per model. Signals aren't sent, so project summary and counters
+        are updated here for the whole page
+        """
+        from projects.functions.project_counters import update_project_counters
+        from projects.models import ProjectSummary
+        from tasks.functions import train_ml_backends_after_bulk_create
+
+        parsed = [cls._parse_task_data(data) for _, data in items]
+        tasks = [
+            Task(
+                data=data,
+                data_hash=get_task_data_hash(data),
+                project=project,
+                overlap=maximum_annotations,
+                is_labeled=len(annotations) >= maximum_annotations,
+                total_predictions=len(predictions),
+                total_annotations=len(annotations) - cancelled_annotations,
+                cancelled_annotations=cancelled_annotations,
+                inner_id=max_inner_id + i,
+            )
+            for i, (data, predictions, annotations, cancelled_annotations) in enumerate(parsed)
+        ]
+        raise_exception = not flag_set(
+            'ff_fix_back_dev_3342_storage_scan_with_invalid_annotations', user=AnonymousUser()
+        )
+
+        with transaction.atomic():
+            tasks = copy_bulk_create(Task, tasks)
+            link_class.create_many(tasks, [key for key, _ in items], storage)
+            logger.debug(f'Created {len(tasks)} tasks with {storage.__class__.__name__} links')
+
+            predictions = cls._validate_task_items(
+                PredictionSerializer, tasks, [item[1] for item in parsed], raise_exception
+            )
+            # "result" is normalized like in Prediction.save()
+            for prediction in predictions:
+                prediction['result'] = Prediction.prepare_prediction_result(prediction['result'], project)
+            predictions = copy_bulk_create(Prediction, [Prediction(**prediction) for prediction in predictions])
+
+            annotations = cls._validate_task_items(
+                AnnotationSerializer, tasks, [item[2] for item in parsed], raise_exception
+            )
+            # result_count is calculated like in Annotation.save()
+            annotations = Annotation.objects.bulk_create(
+                [
+                    Annotation(
+                        **annotation, result_count=len({item.get('id') for item in annotation.get('result') or []})
+                    )
+                    for annotation in annotations
+                ],
+                batch_size=settings.BATCH_SIZE,
+            )
+            if annotations:
+                bulk_update_stats_project_tasks(
+                    Task.objects.filter(id__in={a.task_id for a in annotations}), project=project
+                )
+                update_project_annotation_count(project.id, len(annotations))
+
+            summary = ProjectSummary.objects.select_for_update().get(project=project)
+            summary.update_data_columns(tasks)
+            summary.update_created_annotations_and_labels(annotations)
+            update_project_counters(
+                project.id,
+                task_number=len(tasks),
+                finished_task_number=sum(task.is_labeled for task in tasks),
+                total_predictions_number=len(predictions),
+            )
+
+        train_ml_backends_after_bulk_create(project, len([a for a in annotations if not a.ground_truth]))
+        return tasks
+
+    def _fetch_task_data(self, key):
+        try:
+            return self.get_data_with_size(key)
+        except (UnicodeDecodeError, json.decoder.JSONDecodeError) as exc:
+            logger.debug(exc, exc_info=True)
+            raise ValueError(
+                f'Error loading JSON from file "{key}".\nIf you\'re trying to import non-JSON data '
+                f'(images, audio, text, etc.), edit storage settings and enable '
+                f'"Treat every bucket object as a source file"'
+            )
+
+    def _iter_new_keys(self, keys_iter, link_class, stats, report_progress=True):
+        """Keys without links, existing links are checked by pages of STORAGE_SYNC_BATCH_SIZE keys"""
+        for keys in iter_batches(keys_iter, settings.STORAGE_SYNC_BATCH_SIZE):
+            existing_keys = link_class.exists_many(keys, self)
+            for key in keys:
+                if key in existing_keys:
+                    logger.debug(f'{self.__class__.__name__} link {key} already exists')
+                    stats['tasks_existed'] += 1
+                    continue
+                logger.debug(f'{self}: found new key {key}')
+                # the same key can't be listed twice
+                existing_keys.add(key)
+                yield key
+            if report_progress:
+                self.info_update_progress(last_sync_count=stats['tasks_created'], tasks_existed=stats['tasks_existed'])
+
     def _scan_and_create_links(self, link_class):
         """
         TODO: deprecate this function and transform it to "pipeline" version  _scan_and_create_links_v2,
         TODO: it must be compatible with opensource, so old version is needed as well
+        Keys are processed by pages of STORAGE_SYNC_BATCH_SIZE: one query checks existing links of the page
+        and new tasks are created with add_tasks(). Objects of new keys are read ahead
+        by STORAGE_SYNC_CONCURRENCY threads while the previous page is saved.
+        With STORAGE_SYNC_INCREMENTAL storages list only keys added after the checkpoint of the previous sync
         """
         # set in progress status for storage info
         self.info_set_in_progress()
 
-        tasks_existed = tasks_created = 0
-        maximum_annotations = self.project.maximum_annotations
-        task = self.project.tasks.order_by('-inner_id').first()
-        max_inner_id = (task.inner_id + 1) if task else 1
+        stats = {'tasks_created': 0, 'tasks_existed': 0}
+        next_checkpoint = {}
+        if settings.STORAGE_SYNC_INCREMENTAL:
+            keys_iter = self.iterkeys_incremental(self.sync_checkpoint or {}, next_checkpoint)
+        else:
+            keys_iter = self.iterkeys()
+        self._create_tasks_for_keys(keys_iter, link_class, stats)
 
-        tasks_for_webhook = []
-        for key in self.iterkeys():
-            # w/o Dataflow
-            # pubsub.push(topic, key)
-            # -> GF.pull(topic, key) + env -> add_task()
-            logger.debug(f'Scanning key {key}')
-            self.info_update_progress(last_sync_count=tasks_created, tasks_existed=tasks_existed)
-
-            # skip if task already exists
-            if link_class.exists(key, self):
-                logger.debug(f'{self.__class__.__name__} link {key} already exists')
-                tasks_existed += 1  # update progress counter
-                continue
+        # all listed keys are saved, so the next sync can start after them
+        if settings.STORAGE_SYNC_INCREMENTAL:
+            self.sync_checkpoint = next_checkpoint
+            self.save(update_fields=['sync_checkpoint'])
 
-            logger.debug(f'{self}: found new key {key}')
-            try:
-                data = self.get_data(key)
-            except (UnicodeDecodeError, json.decoder.JSONDecodeError) as exc:
-                logger.debug(exc, exc_info=True)
-                raise ValueError(
-                    f'Error loading JSON from file "{key}".\nIf you\'re trying to import non-JSON data '
-                    f'(images, audio, text, etc.), edit storage settings and enable '
-                    f'"Treat every bucket object as a source file"'
-                )
+        # sync is finished, set completed status for storage info
+        self.info_set_completed(last_sync_count=stats['tasks_created'], tasks_existed=stats['tasks_existed'])
 
-            task = self.add_task(data, self.project, maximum_annotations, max_inner_id, self, key, link_class)
-            max_inner_id += 1
+    def ingest_keys(self, keys, update_tasks_states=True):
+        """Create tasks for keys of created objects reported by storage events, without listing the storage.
+        Keys are filtered like listed ones, keys with existing links are skipped.
+        update_tasks_states=False leaves project.update_tasks_states() to the caller, e.g. once per many batches
+        """
+        stats = {'tasks_created': 0, 'tasks_existed': 0}
+        keys = [key for key in keys if self.is_listed_key(key)]
+        if keys:
+            self._create_tasks_for_keys(
+                iter(keys), self.links.model, stats, report_progress=False, update_tasks_states=update_tasks_states
+            )
+        return stats
 
-            # update progress counters for storage info
-            tasks_created += 1
+    def is_listed_key(self, key):
+        """If the key could be returned by iterkeys(), checked for keys of storage events"""
+        prefix = getattr(self, 'prefix', None)
+        if prefix and not key.startswith(prefix):
+            return False
+        regex_filter = getattr(self, 'regex_filter', None)
+        return not regex_filter or bool(re.match(str(regex_filter), key))
 
-            # add task to webhook list
-            tasks_for_webhook.append(task)
+    def _create_tasks_for_keys(self, keys_iter, link_class, stats, report_progress=True, update_tasks_states=True):
+        """Create tasks for keys without links, stats are updated with created and existed tasks"""
+        maximum_annotations = self.project.maximum_annotations
+        task = self.project.tasks.order_by('-inner_id').first()
+        max_inner_id = (task.inner_id + 1) if task else 1
 
-            # settings.WEBHOOK_BATCH_SIZE
-            # `WEBHOOK_BATCH_SIZE` sets the maximum number of tasks sent in a single webhook call, ensuring manageable payload sizes.
-            # When `tasks_for_webhook` accumulates tasks equal to/exceeding `WEBHOOK_BATCH_SIZE`, they're sent in a webhook via
-            # `emit_webhooks_for_instance`, and `tasks_for_webhook` is cleared for new tasks.
-            # If tasks remain in `tasks_for_webhook` at process end (less than `WEBHOOK_BATCH_SIZE`), they're sent in a final webhook
-            # call to ensure all tasks are processed and no task is left unreported in the webhook.
-            if len(tasks_for_webhook) >= settings.WEBHOOK_BATCH_SIZE:
-                emit_webhooks_for_instance(
-                    self.project.organization, self.project, WebhookAction.TASKS_CREATED, tasks_for_webhook
-                )
-                tasks_for_webhook = []
+        tasks_for_webhook = []
+        items = iter_prefetched(
+            self._iter_new_keys(keys_iter, link_class, stats, report_progress),
+            self._fetch_task_data,
+            settings.STORAGE_SYNC_CONCURRENCY,
+            settings.STORAGE_SYNC_MAX_INFLIGHT_BYTES,
+        )
+        # prefetching threads are stopped on errors
+        with closing(items):
+            for page in iter_batches(items, settings.STORAGE_SYNC_BATCH_SIZE):
+                tasks = self.add_tasks(page, self.project, maximum_annotations, max_inner_id, self, link_class)
+                max_inner_id += len(tasks)
+                stats['tasks_created'] += len(tasks)
+                tasks_for_webhook.extend(tasks)
+
+                # update progress counters for storage info
+                if report_progress:
+                    self.info_update_progress(
+                        last_sync_count=stats['tasks_created'], tasks_existed=stats['tasks_existed']
+                    )
+
+                # settings.WEBHOOK_BATCH_SIZE
+                # `WEBHOOK_BATCH_SIZE` sets the maximum number of tasks sent in a single webhook call, ensuring manageable payload sizes.
+                # When `tasks_for_webhook` accumulates tasks equal to/exceeding `WEBHOOK_BATCH_SIZE`, they're sent in a webhook via
+                # `emit_webhooks_for_instance`, and `tasks_for_webhook` is cleared for new tasks.
+                # If tasks remain in `tasks_for_webhook` at process end (less than `WEBHOOK_BATCH_SIZE`), they're sent in a final webhook
+                # call to ensure all tasks are processed and no task is left unreported in the webhook.
+                while len(tasks_for_webhook) >= settings.WEBHOOK_BATCH_SIZE:
+                    emit_webhooks_for_instance(
+                        self.project.organization,
+                        self.project,
+                        WebhookAction.TASKS_CREATED,
+                        tasks_for_webhook[: settings.WEBHOOK_BATCH_SIZE],
+                    )
+                    tasks_for_webhook = tasks_for_webhook[settings.WEBHOOK_BATCH_SIZE :]
         if tasks_for_webhook:
             emit_webhooks_for_instance(
                 self.project.organization, self.project, WebhookAction.TASKS_CREATED, tasks_for_webhook
             )
 
-        self.project.update_tasks_states(
-            maximum_annotations_changed=False, overlap_cohort_percentage_changed=False, tasks_number_changed=True
-        )
-
-        # sync is finished, set completed status for storage info
-        self.info_set_completed(last_sync_count=tasks_created, tasks_existed=tasks_existed)
+        if update_tasks_states:
+            self.project.update_tasks_states(
+                maximum_annotations_changed=False, overlap_cohort_percentage_changed=False, tasks_number_changed=True
+            )
 
     def scan_and_create_links(self):
         """This is proto method - you can override it, or just replace ImportStorageLink by your own model"""
         self._scan_and_create_links(ImportStorageLink)
 
-    def sync(self):
+    def sync(self, full_rescan=False):
+        if full_rescan:
+            # without checkpoint all storage objects are listed and checked for links
+            self.sync_checkpoint = {}
+            self.save(update_fields=['sync_checkpoint'])
+
         if redis_connected():
             queue = django_rq.get_queue('low')
             meta = {'project': self.project.id, 'storage': self.id}
@@ -603,11 +802,22 @@ class ImportStorageLink(models.Model):
     def exists(cls, key, storage):
         return cls.objects.filter(key=key, storage=storage.id).exists()
 
+    @classmethod
+    def exists_many(cls, keys, storage):
+        """Return the keys having links, one query for the whole list"""
+        return set(cls.objects.filter(key__in=keys, storage=storage.id).values_list('key', flat=True))
+
     @classmethod
     def create(cls, task, key, storage):
         link, created = cls.objects.get_or_create(task_id=task.id, key=key, storage=storage, object_exists=True)
         return link
 
+    @classmethod
+    def create_many(cls, tasks, keys, storage):
+        """Create links for new tasks with one insert"""
+        links = [cls(task_id=task.id, key=key, storage=storage, object_exists=True) for task, key in zip(tasks, keys)]
+        return cls.objects.bulk_create(links, batch_size=settings.BATCH_SIZE)
+
     class Meta:
         abstract = True
 
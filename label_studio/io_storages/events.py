@@ -0,0 +1,210 @@
+"""This file and its contents are licensed under the Apache License 2.0. Please see the included NOTICE for copyright information and LICENSE for a copy of the license.
+"""
+import logging
+import time
+from typing import Iterable, List, Optional, Tuple
+
+import django_rq
+from core.redis import get_redis_client, is_job_in_queue
+from core.utils.common import load_func
+from django.conf import settings
+from django_rq import job
+
+logger = logging.getLogger(__name__)
+
+# how long one read waits for new events, the idle timeout is checked between reads
+EVENTS_READ_BLOCK_MS = 1000
+
+
+class StorageEventSource:
+    """Object created events of import storages, selected with settings.STORAGE_EVENT_SOURCE.
+    Bucket notification bridges (or a local stand-in) publish keys of created objects,
+    import_events_background job reads them and creates tasks without listing the storage
+    """
+
+    def is_available(self) -> bool:
+        return True
+
+    def publish(self, storage, keys: Iterable[str]) -> None:
+        raise NotImplementedError
+
+    def read(self, storage, count: int, block_ms: int) -> List[Tuple[str, str]]:
+        """Up to count (event id, key) pairs of the oldest events, waits up to block_ms if there are no events.
+        Events are read again until they are acknowledged
+        """
+        raise NotImplementedError
+
+    def ack(self, storage, event_ids: List[str]) -> None:
+        """Remove events, tasks for their keys are created"""
+        raise NotImplementedError
+
+    def count(self, storage) -> int:
+        """Number of not acknowledged events"""
+        raise NotImplementedError
+
+    def acquire_consumer(self, storage, ttl: int) -> bool:
+        """Only one consumer reads events of a storage, False if another consumer is running"""
+        raise NotImplementedError
+
+    def release_consumer(self, storage) -> None:
+        raise NotImplementedError
+
+
+class RedisStreamStorageEventSource(StorageEventSource):
+    """Events are entries of redis stream storage_events:<storage model>:<storage id>
+    with the object key in the `key` field, e.g. storage_events:s3importstorage:1.
+    Acknowledged entries are deleted, so reading from the stream start returns unprocessed events only
+    """
+
+    STREAM_KEY = 'storage_events:{model_name}:{storage_id}'
+    CONSUMER_KEY = 'storage_events:{model_name}:{storage_id}:consumer'
+
+    @property
+    def redis(self):
+        return get_redis_client()
+
+    def is_available(self):
+        return self.redis is not None
+
+    def get_stream_key(self, storage):
+        return self.STREAM_KEY.format(model_name=storage._meta.model_name, storage_id=storage.id)
+
+    def publish(self, storage, keys):
+        stream_key = self.get_stream_key(storage)
+        pipe = self.redis.pipeline()
+        for key in keys:
+            pipe.xadd(stream_key, {'key': key})
+        pipe.execute()
+
+    def read(self, storage, count, block_ms):
+        result = self.redis.xread({self.get_stream_key(storage): '0-0'}, count=count, block=block_ms)
+        if not result:
+            return []
+        _, entries = result[0]
+        events = []
+        for event_id, fields in entries:
+            key = fields.get(b'key') or fields.get('key')
+            events.append((_decode(event_id), _decode(key)))
+        return events
+
+    def ack(self, storage, event_ids):
+        if event_ids:
+            self.redis.xdel(self.get_stream_key(storage), *event_ids)
+
+    def count(self, storage):
+        return self.redis.xlen(self.get_stream_key(storage))
+
+    def acquire_consumer(self, storage, ttl):
+        consumer_key = self.CONSUMER_KEY.format(model_name=storage._meta.model_name, storage_id=storage.id)
+        return bool(self.redis.set(consumer_key, 1, nx=True, ex=ttl))
+
+    def release_consumer(self, storage):
+        self.redis.delete(self.CONSUMER_KEY.format(model_name=storage._meta.model_name, storage_id=storage.id))
+
+
+def _decode(value):
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def get_storage_event_source() -> Optional[StorageEventSource]:
+    source = load_func(settings.STORAGE_EVENT_SOURCE)()
+    if not source.is_available():
+        logger.warning(f'Storage event source {settings.STORAGE_EVENT_SOURCE} is not available')
+        return
+    return source
+
+
+def publish_storage_events(storage, keys: Iterable[str]) -> None:
+    """Report created objects of the storage and start the events consumer"""
+    source = get_storage_event_source()
+    if source is None:
+        return
+    source.publish(storage, keys)
+    start_events_consumer(storage)
+
+
+def start_events_consumer(storage) -> None:
+    """Enqueue the events consumer job of the storage if it isn't queued yet,
+    a consumer that is already running reads new events too
+    """
+    queue = django_rq.get_queue('low')
+    meta = {'project': storage.project_id, 'storage': storage.id}
+    if not is_job_in_queue(queue, 'import_events_background', meta=meta):
+        queue.enqueue(
+            import_events_background,
+            storage.__class__,
+            storage.id,
+            meta=meta,
+            job_timeout=settings.RQ_LONG_JOB_TIMEOUT,
+        )
+
+
+def ingest_events(storage, events: List[Tuple[str, str]]) -> int:
+    """Create tasks for keys of the events, returns the number of created tasks.
+    If the batch fails, keys are ingested one by one and failed keys are logged and skipped,
+    so one broken object doesn't block the events behind it
+    """
+    keys = [key for _, key in events]
+    try:
+        return storage.ingest_keys(keys, update_tasks_states=False)['tasks_created']
+    except Exception:
+        logger.warning(f'{storage}: batch of {len(keys)} events failed, ingesting keys one by one', exc_info=True)
+
+    # links of already created tasks are kept, so their keys are skipped here
+    tasks_created = 0
+    for key in keys:
+        try:
+            tasks_created += storage.ingest_keys([key], update_tasks_states=False)['tasks_created']
+        except Exception:
+            logger.error(f'{storage}: skipped object created event for key {key}', exc_info=True)
+    return tasks_created
+
+
+def consume_storage_events(storage) -> int:
+    """Create tasks for object created events by batches of STORAGE_SYNC_BATCH_SIZE keys
+    until no new events come for STORAGE_EVENTS_IDLE_TIMEOUT seconds, returns the number of created tasks
+    """
+    source = get_storage_event_source()
+    if source is None:
+        return 0
+
+    tasks_created = 0
+    # the consumer stops before the job timeout and starts the next job if events are left
+    deadline = time.monotonic() + settings.RQ_LONG_JOB_TIMEOUT / 2
+    try:
+        while source.acquire_consumer(storage, settings.RQ_LONG_JOB_TIMEOUT):
+            try:
+                idle_since = time.monotonic()
+                while time.monotonic() - idle_since < settings.STORAGE_EVENTS_IDLE_TIMEOUT:
+                    if time.monotonic() > deadline:
+                        break
+                    events = source.read(storage, settings.STORAGE_SYNC_BATCH_SIZE, EVENTS_READ_BLOCK_MS)
+                    if not events:
+                        continue
+                    created = ingest_events(storage, events)
+                    source.ack(storage, [event_id for event_id, _ in events])
+                    tasks_created += created
+                    logger.debug(f'{storage}: {created} tasks created from {len(events)} events')
+                    idle_since = time.monotonic()
+            finally:
+                source.release_consumer(storage)
+
+            # events published before the consumer is released can be skipped by a concurrently started job
+            if not source.count(storage):
+                break
+            if time.monotonic() > deadline:
+                start_events_consumer(storage)
+                break
+    finally:
+        # task states are updated once for all batches of the consumer
+        if tasks_created:
+            storage.project.update_tasks_states(
+                maximum_annotations_changed=False, overlap_cohort_percentage_changed=False, tasks_number_changed=True
+            )
+    return tasks_created
+
+
+@job('low')
+def import_events_background(storage_class, storage_id, timeout=settings.RQ_LONG_JOB_TIMEOUT, **kwargs):
+    storage = storage_class.objects.get(id=storage_id)
+    consume_storage_events(storage)
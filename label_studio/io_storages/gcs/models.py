@@ -70,21 +70,32 @@ class GCSImportStorageBase(GCSStorageMixin, ImportStorage):
         _('presign_ttl'), default=1, help_text='Presigned URLs TTL (in minutes)'
     )
 
-    def iterkeys(self):
+    def iterkeys(self, start_after=None):
         return GCS.iter_blobs(
             client=self.get_client(),
             bucket_name=self.bucket,
             prefix=self.prefix,
             regex_filter=self.regex_filter,
             return_key=True,
+            start_after=start_after,
         )
 
+    def iterkeys_incremental(self, checkpoint, next_checkpoint):
+        listing = [self.bucket, self.prefix, self.regex_filter]
+        return self._iterkeys_after_last_key(checkpoint, next_checkpoint, listing)
+
     def get_data(self, key):
+        return self.get_data_with_size(key)[0]
+
+    def get_data_with_size(self, key):
         if self.use_blob_urls:
-            return {settings.DATA_UNDEFINED_NAME: GCS.get_uri(self.bucket, key)}
-        return GCS.read_file(
-            client=self.get_client(), bucket_name=self.bucket, key=key, convert_to=GCS.ConvertBlobTo.JSON_DICT
-        )
+            return {settings.DATA_UNDEFINED_NAME: GCS.get_uri(self.bucket, key)}, 0
+        # bucket() doesn't request bucket metadata for every object, unlike get_bucket() in GCS.read_file()
+        blob_str = self.get_client().bucket(self.bucket).blob(key).download_as_bytes()
+        value = GCS._try_read_json(blob_str)
+        if not isinstance(value, dict):
+            raise ValueError(f'Error on key {key}: For GCS your JSON file must be a dictionary with one task.')
+        return value, len(blob_str)
 
     def generate_http_url(self, url):
         return GCS.generate_http_url(
@@ -4,6 +4,7 @@ import json
 import logging
 import os
 import re
+import time
 from pathlib import Path
 from urllib.parse import quote
 
@@ -57,12 +58,34 @@ class LocalFilesImportStorageBase(LocalFilesMixin, ImportStorage):
     def can_resolve_url(self, url):
         return False
 
-    def iterkeys(self):
+    def iterkeys(self, modified_since=None, known_dirs=None, listed_dirs=None):
+        """Files of the storage path, with modified_since files are listed only from directories
+        modified (or renamed, or not in known_dirs) since that time. listed_dirs gets all found directories
+        """
         path = Path(self.path)
         regex = re.compile(str(self.regex_filter)) if self.regex_filter else None
+        # directory mtime changes when files are added, renamed or removed in it, ctime changes also when
+        # the directory itself is moved; directories moved with their subdirectories (mv, rsync -a, cp -p)
+        # keep the old times of the nested ones, they are found as directories unknown to the previous sync
+        dir_modified = {}
+
+        def is_dir_modified(directory):
+            if directory not in dir_modified:
+                stat = directory.stat()
+                dir_modified[directory] = (
+                    max(stat.st_mtime, stat.st_ctime) >= modified_since
+                    or known_dirs is not None
+                    and str(directory.relative_to(path)) not in known_dirs
+                )
+            return dir_modified[directory]
+
         # For better control of imported tasks, file reading has been changed to ascending order of filenames.
         # In other words, the task IDs are sorted by filename order.
         for file in sorted(path.rglob('*'), key=os.path.basename):
+            if listed_dirs is not None and file.is_dir():
+                listed_dirs.add(str(file.relative_to(path)))
+            if modified_since is not None and not is_dir_modified(file.parent):
+                continue
             if file.is_file():
                 key = file.name
                 if regex and not regex.match(key):
@@ -70,6 +93,24 @@ class LocalFilesImportStorageBase(LocalFilesMixin, ImportStorage):
                     continue
                 yield str(file)
 
+    def iterkeys_incremental(self, checkpoint, next_checkpoint):
+        listing = [self.path, self.regex_filter]
+        modified_since, known_dirs = None, None
+        if checkpoint.get('listing') == listing and 'dirs' in checkpoint:
+            modified_since, known_dirs = checkpoint['listed_at'], set(checkpoint['dirs'])
+        # files added while keys are listed get into the next sync too,
+        # and a couple of seconds more are taken for filesystems with coarse mtime resolution
+        next_checkpoint.update(listing=listing, listed_at=time.time() - 2)
+        listed_dirs = {'.'}
+        yield from self.iterkeys(modified_since=modified_since, known_dirs=known_dirs, listed_dirs=listed_dirs)
+        next_checkpoint['dirs'] = sorted(listed_dirs)
+
+    def is_listed_key(self, key):
+        path = Path(key)
+        if Path(self.path) not in path.parents:
+            return False
+        return not self.regex_filter or bool(re.match(str(self.regex_filter), path.name))
+
     def get_data(self, key):
         path = Path(key)
         if self.use_blob_urls:
@@ -96,6 +137,10 @@ class LocalFilesImportStorageBase(LocalFilesMixin, ImportStorage):
             )
         return value
 
+    def get_data_with_size(self, key):
+        data = self.get_data(key)
+        return data, 0 if self.use_blob_urls else Path(key).stat().st_size
+
     def scan_and_create_links(self):
         return self._scan_and_create_links(LocalFilesImportStorageLink)
 
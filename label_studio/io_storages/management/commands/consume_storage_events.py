@@ -0,0 +1,35 @@
+import logging
+
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from io_storages.events import consume_storage_events, start_events_consumer
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Create tasks for object created events published to import storages by notification bridges'
+
+    def add_arguments(self, parser):
+        parser.add_argument('model', type=str, help='import storage model name, e.g. s3importstorage')
+        parser.add_argument('--storage', dest='storages', type=int, action='append', help='storage id')
+        parser.add_argument(
+            '--foreground',
+            dest='foreground',
+            action='store_true',
+            default=False,
+            help='Consume events in this process instead of the rq job',
+        )
+
+    def handle(self, *args, **options):
+        storage_class = apps.get_model('io_storages', options['model'])
+        storages = storage_class.objects.all()
+        if options['storages']:
+            storages = storages.filter(id__in=options['storages'])
+
+        for storage in storages:
+            if options['foreground']:
+                tasks_created = consume_storage_events(storage)
+                logger.info(f'{storage}: {tasks_created} tasks created from storage events')
+            else:
+                start_events_consumer(storage)
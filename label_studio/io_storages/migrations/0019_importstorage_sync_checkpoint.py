@@ -0,0 +1,38 @@
+# Generated by Django 4.2.15 on 2026-10-18 21:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('io_storages', '0018_alter_azureblobexportstorage_project_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='azureblobimportstorage',
+            name='sync_checkpoint',
+            field=models.JSONField(default=dict, editable=False, help_text='Listing checkpoint of the last completed sync, the next sync lists only objects added after it', null=True, verbose_name='sync_checkpoint'),
+        ),
+        migrations.AddField(
+            model_name='gcsimportstorage',
+            name='sync_checkpoint',
+            field=models.JSONField(default=dict, editable=False, help_text='Listing checkpoint of the last completed sync, the next sync lists only objects added after it', null=True, verbose_name='sync_checkpoint'),
+        ),
+        migrations.AddField(
+            model_name='localfilesimportstorage',
+            name='sync_checkpoint',
+            field=models.JSONField(default=dict, editable=False, help_text='Listing checkpoint of the last completed sync, the next sync lists only objects added after it', null=True, verbose_name='sync_checkpoint'),
+        ),
+        migrations.AddField(
+            model_name='redisimportstorage',
+            name='sync_checkpoint',
+            field=models.JSONField(default=dict, editable=False, help_text='Listing checkpoint of the last completed sync, the next sync lists only objects added after it', null=True, verbose_name='sync_checkpoint'),
+        ),
+        migrations.AddField(
+            model_name='s3importstorage',
+            name='sync_checkpoint',
+            field=models.JSONField(default=dict, editable=False, help_text='Listing checkpoint of the last completed sync, the next sync lists only objects added after it', null=True, verbose_name='sync_checkpoint'),
+        ),
+    ]
@@ -0,0 +1,107 @@
+"""This file and its contents are licensed under the Apache License 2.0. Please see the included NOTICE for copyright information and LICENSE for a copy of the license.
+"""
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from core.redis import redis_get, redis_set
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class PresignedURLCache:
+    """LRU cache of presigned urls in process memory with an optional redis tier (PRESIGN_CACHE_REDIS).
+    Entries are (url, expires_at) pairs, expires_at is the unix time when the entry can't be used anymore
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Tuple[str, float]]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[1] > now:
+                    self._entries.move_to_end(key)
+                    return entry
+                del self._entries[key]
+
+        if settings.PRESIGN_CACHE_REDIS:
+            value = redis_get(key)
+            if value:
+                url, expires_at = json.loads(value)
+                if expires_at > now:
+                    self._set_local(key, (url, expires_at))
+                    return url, expires_at
+        return None
+
+    def set(self, key: str, url: str, ttl: float) -> None:
+        entry = (url, time.time() + ttl)
+        self._set_local(key, entry)
+        if settings.PRESIGN_CACHE_REDIS:
+            redis_set(key, json.dumps(entry), ttl=max(1, int(ttl)))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def _set_local(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+
+presigned_url_cache = PresignedURLCache(settings.PRESIGN_CACHE_SIZE)
+
+
+def get_storage_version(storage) -> str:
+    """Hash of storage settings, it's a part of cache keys, so urls signed before the storage is edited
+    (e.g. credentials or bucket are changed) aren't returned from the cache of any process.
+    Fields updated by syncs are skipped, they don't change signed urls
+    """
+    from io_storages.base_models import StorageInfo
+
+    skipped_fields = {field.name for field in StorageInfo._meta.fields} | {'sync_checkpoint'}
+    values = [
+        (field.attname, getattr(storage, field.attname))
+        for field in storage._meta.concrete_fields
+        if field.name not in skipped_fields
+    ]
+    return hashlib.sha1(json.dumps(values, default=str).encode()).hexdigest()
+
+
+def get_presigned_url(storage, uri: str) -> Tuple[str, int]:
+    """storage.generate_http_url(uri) cached by (storage, storage settings, uri),
+    and the number of seconds clients can cache it.
+    Urls are cached for a half of presign_ttl, so a url from the cache stays valid for at least another half
+    """
+    presign_ttl = getattr(storage, 'presign_ttl', None)
+    if not settings.PRESIGN_CACHE_SIZE or not getattr(storage, 'presign', False) or not presign_ttl or not storage.pk:
+        return storage.generate_http_url(uri), 0
+
+    key = (
+        f'presigned_url:{storage._meta.model_name}:{storage.pk}:{get_storage_version(storage)}:'
+        f'{hashlib.sha1(uri.encode()).hexdigest()}'
+    )
+    entry = presigned_url_cache.get(key)
+    if entry is not None:
+        url, expires_at = entry
+        return url, int(expires_at - time.time())
+
+    ttl = presign_ttl * 60 / 2
+    url = storage.generate_http_url(uri)
+    # unresolved urls are returned as is on signing errors, they aren't cached
+    if url and url != uri:
+        presigned_url_cache.set(key, url, ttl)
+        return url, int(ttl)
+    return url, 0
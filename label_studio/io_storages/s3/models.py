@@ -129,15 +129,17 @@ class S3ImportStorageBase(S3StorageMixin, ImportStorage):
     )
 
     @catch_and_reraise_from_none
-    def iterkeys(self):
+    def iterkeys(self, start_after=None):
         client, bucket = self.get_client_and_bucket()
+        list_kwargs = {}
         if self.prefix:
-            list_kwargs = {'Prefix': self.prefix.rstrip('/') + '/'}
+            list_kwargs['Prefix'] = self.prefix.rstrip('/') + '/'
             if not self.recursive_scan:
                 list_kwargs['Delimiter'] = '/'
-            bucket_iter = bucket.objects.filter(**list_kwargs).all()
-        else:
-            bucket_iter = bucket.objects.all()
+        if start_after:
+            # S3 lists keys in lexicographic order, so the listing continues after the given key
+            list_kwargs['Marker'] = start_after
+        bucket_iter = bucket.objects.filter(**list_kwargs).all() if list_kwargs else bucket.objects.all()
         regex = re.compile(str(self.regex_filter)) if self.regex_filter else None
         for obj in bucket_iter:
             key = obj.key
@@ -149,6 +151,10 @@ class S3ImportStorageBase(S3StorageMixin, ImportStorage):
                 continue
             yield key
 
+    def iterkeys_incremental(self, checkpoint, next_checkpoint):
+        listing = [self.bucket, self.prefix, self.regex_filter, self.recursive_scan]
+        return self._iterkeys_after_last_key(checkpoint, next_checkpoint, listing)
+
     @catch_and_reraise_from_none
     def scan_and_create_links(self):
         return self._scan_and_create_links(S3ImportStorageLink)
@@ -163,21 +169,24 @@ class S3ImportStorageBase(S3StorageMixin, ImportStorage):
 
     @catch_and_reraise_from_none
     def get_data(self, key):
+        return self.get_data_with_size(key)[0]
+
+    @catch_and_reraise_from_none
+    def get_data_with_size(self, key):
         uri = f'{self.url_scheme}://{self.bucket}/{key}'
         if self.use_blob_urls:
             data_key = settings.DATA_UNDEFINED_NAME
-            return {data_key: uri}
+            return {data_key: uri}, 0
 
-        # read task json from bucket and validate it
-        _, s3 = self.get_client_and_resource()
-        bucket = s3.Bucket(self.bucket)
-        obj = s3.Object(bucket.name, key).get()['Body'].read().decode('utf-8')
-        value = json.loads(obj)
+        # read task json from bucket and validate it,
+        # the cached client is used because it's thread-safe, unlike the boto3 resource
+        body = self.get_client().get_object(Bucket=self.bucket, Key=key)['Body'].read()
+        value = json.loads(body.decode('utf-8'))
         if not isinstance(value, dict):
             raise ValueError(f'Error on key {key}: For S3 your JSON file must be a dictionary with one task')
 
         value = self._get_validated_task(value, key)
-        return value
+        return value, len(body)
 
     @catch_and_reraise_from_none
     def generate_http_url(self, url):
@@ -292,6 +301,14 @@ class S3ImportStorageLink(ImportStorageLink):
             or cls.objects.filter(key=prefix + '/' + key, storage=storage.id).exists()
         )
 
+    @classmethod
+    def exists_many(cls, keys, storage):
+        # the same workaround for old keys version as in exists()
+        prefix = str(storage.prefix) or ''
+        variants = {key: {key, prefix + key, prefix + '/' + key} for key in keys}
+        existing = super(S3ImportStorageLink, cls).exists_many(set().union(*variants.values()), storage)
+        return {key for key, key_variants in variants.items() if key_variants & existing}
+
 
 class S3ExportStorageLink(ExportStorageLink):
     storage = models.ForeignKey(S3ExportStorage, on_delete=models.CASCADE, related_name='links')
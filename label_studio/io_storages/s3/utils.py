@@ -32,12 +32,16 @@ def get_client_and_resource(
         aws_secret_access_key=aws_secret_access_key,
         aws_session_token=aws_session_token,
     )
-    settings = {'region_name': region_name or get_env('S3_region') or 'us-east-1'}
+    client_settings = {'region_name': region_name or get_env('S3_region') or 'us-east-1'}
     s3_endpoint = s3_endpoint or get_env('S3_ENDPOINT')
     if s3_endpoint:
-        settings['endpoint_url'] = s3_endpoint
-    client = session.client('s3', config=boto3.session.Config(signature_version='s3v4'), **settings)
-    resource = session.resource('s3', config=boto3.session.Config(signature_version='s3v4'), **settings)
+        client_settings['endpoint_url'] = s3_endpoint
+    # the client is cached and shared by storage sync threads, so the connection pool must fit all of them
+    config = boto3.session.Config(
+        signature_version='s3v4', max_pool_connections=max(10, settings.STORAGE_SYNC_CONCURRENCY)
+    )
+    client = session.client('s3', config=config, **client_settings)
+    resource = session.resource('s3', config=boto3.session.Config(signature_version='s3v4'), **client_settings)
     return client, resource
 
 
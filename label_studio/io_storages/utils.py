@@ -2,8 +2,10 @@
 """
 import logging
 import re
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
-from typing import Union
+from typing import Any, Callable, Iterable, Iterator, Tuple, Union
 
 logger = logging.getLogger(__name__)
 
@@ -79,3 +81,39 @@ def storage_can_resolve_bucket_url(storage, url) -> bool:
         return False
 
     return True
+
+
+def iter_prefetched(
+    keys: Iterable[str], fetch: Callable[[str], Tuple[Any, int]], concurrency: int, max_inflight_bytes: int
+) -> Iterator[Tuple[str, Any]]:
+    """Yield (key, data) in the keys order, fetch(key) -> (data, size in bytes) runs in a thread pool
+    ahead of the consumer. At most 2 * concurrency keys are read ahead, and new fetches aren't started
+    while fetched, but not consumed objects take more than max_inflight_bytes.
+    Fetch errors are raised in the keys order, like with serial reading
+    """
+    if concurrency <= 1:
+        for key in keys:
+            yield key, fetch(key)[0]
+        return
+
+    keys = iter(keys)
+    pending = deque()
+    executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='storage-prefetch')
+    try:
+        while True:
+            while len(pending) < 2 * concurrency:
+                inflight_bytes = sum(
+                    future.result()[1] for _, future in pending if future.done() and not future.exception()
+                )
+                if pending and inflight_bytes >= max_inflight_bytes:
+                    break
+                key = next(keys, None)
+                if key is None:
+                    break
+                pending.append((key, executor.submit(fetch, key)))
+            if not pending:
+                return
+            key, future = pending.popleft()
+            yield key, future.result()[0]
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
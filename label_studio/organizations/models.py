@@ -67,7 +67,9 @@ class OrganizationMember(OrganizationMemberMixin, models.Model):
             ).first()
             self.user.save(update_fields=['active_organization'])
 
-        self.user.task_locks.all().delete()
+        from tasks.locks import get_task_lock_backend
+
+        get_task_lock_backend().release_user_locks(self.user)
 
 
 OrganizationMixin = load_func(settings.ORGANIZATION_MIXIN)
@@ -601,6 +601,11 @@ class ProjectSummaryAPI(generics.RetrieveAPIView):
     permission_required = all_permissions.projects_view
     queryset = ProjectSummary.objects.all()
 
+    def get_object(self):
+        summary = super(ProjectSummaryAPI, self).get_object()
+        summary.fold_deltas()
+        return summary
+
     @swagger_auto_schema(auto_schema=None)
     def get(self, *args, **kwargs):
         return super(ProjectSummaryAPI, self).get(*args, **kwargs)
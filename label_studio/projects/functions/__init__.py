@@ -4,27 +4,43 @@ from django.db.models import Count, OuterRef, Q
 from tasks.models import Annotation, Prediction, Task
 
 
-def annotate_task_number(queryset):
+def task_number_subquery():
     tasks = Task.objects.filter(project=OuterRef('id')).values_list('id')
-    return queryset.annotate(task_number=SQCount(tasks))
+    return SQCount(tasks)
 
 
-def annotate_finished_task_number(queryset):
+def annotate_task_number(queryset):
+    return queryset.annotate(task_number=task_number_subquery())
+
+
+def finished_task_number_subquery():
     tasks = Task.objects.filter(project=OuterRef('id'), is_labeled=True).values_list('id')
-    return queryset.annotate(finished_task_number=SQCount(tasks))
+    return SQCount(tasks)
 
 
-def annotate_total_predictions_number(queryset):
+def annotate_finished_task_number(queryset):
+    return queryset.annotate(finished_task_number=finished_task_number_subquery())
+
+
+def total_predictions_number_subquery():
     predictions = Prediction.objects.filter(project=OuterRef('id')).values('id')
-    return queryset.annotate(total_predictions_number=SQCount(predictions))
+    return SQCount(predictions)
 
 
-def annotate_total_annotations_number(queryset):
+def annotate_total_predictions_number(queryset):
+    return queryset.annotate(total_predictions_number=total_predictions_number_subquery())
+
+
+def total_annotations_number_subquery():
     subquery = Annotation.objects.filter(Q(project=OuterRef('pk')) & Q(was_cancelled=False)).values('id')
-    return queryset.annotate(total_annotations_number=SQCount(subquery))
+    return SQCount(subquery)
 
 
-def annotate_num_tasks_with_annotations(queryset):
+def annotate_total_annotations_number(queryset):
+    return queryset.annotate(total_annotations_number=total_annotations_number_subquery())
+
+
+def num_tasks_with_annotations_subquery():
     # @todo: check do we really need this counter?
     # this function is very slow because of tasks__id and distinct
     subquery = (
@@ -34,21 +50,37 @@ def annotate_num_tasks_with_annotations(queryset):
         .values('task__id')
         .distinct()
     )
-    return queryset.annotate(num_tasks_with_annotations=SQCount(subquery))
+    return SQCount(subquery)
 
 
-def annotate_useful_annotation_number(queryset):
+def annotate_num_tasks_with_annotations(queryset):
+    return queryset.annotate(num_tasks_with_annotations=num_tasks_with_annotations_subquery())
+
+
+def useful_annotation_number_subquery():
     subquery = Annotation.objects.filter(
         Q(project=OuterRef('pk')) & Q(was_cancelled=False) & Q(ground_truth=False) & Q(result__isnull=False)
     ).values('id')
-    return queryset.annotate(useful_annotation_number=SQCount(subquery))
+    return SQCount(subquery)
 
 
-def annotate_ground_truth_number(queryset):
+def annotate_useful_annotation_number(queryset):
+    return queryset.annotate(useful_annotation_number=useful_annotation_number_subquery())
+
+
+def ground_truth_number_subquery():
     subquery = Annotation.objects.filter(Q(project=OuterRef('pk')) & Q(ground_truth=True)).values('id')
-    return queryset.annotate(ground_truth_number=SQCount(subquery))
+    return SQCount(subquery)
 
 
-def annotate_skipped_annotations_number(queryset):
+def annotate_ground_truth_number(queryset):
+    return queryset.annotate(ground_truth_number=ground_truth_number_subquery())
+
+
+def skipped_annotations_number_subquery():
     subquery = Annotation.objects.filter(Q(project=OuterRef('pk')) & Q(was_cancelled=True)).values('id')
-    return queryset.annotate(skipped_annotations_number=SQCount(subquery))
+    return SQCount(subquery)
+
+
+def annotate_skipped_annotations_number(queryset):
+    return queryset.annotate(skipped_annotations_number=skipped_annotations_number_subquery())
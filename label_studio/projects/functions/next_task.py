@@ -1,4 +1,5 @@
 import logging
+import random
 from collections import Counter
 from typing import List, Tuple, Union
 
@@ -7,8 +8,10 @@ from core.utils.common import conditional_atomic, db_is_not_sqlite, load_func
 from django.conf import settings
 from django.db.models import BooleanField, Case, Count, Exists, F, Max, OuterRef, Q, QuerySet, Value, When
 from django.db.models.fields import DecimalField
+from projects.functions.next_task_queue import can_use_next_task_queue, get_next_task_queue_candidates
 from projects.functions.stream_history import add_stream_history
 from projects.models import Project
+from tasks.locks import get_task_lock_backend
 from tasks.models import Annotation, Task
 from users.models import User
 
@@ -24,26 +27,92 @@ def get_next_task_logging_level(user: User) -> int:
     return level
 
 
+def _use_batch_lock_check(project: Project) -> bool:
+    """Agreement threshold changes the overlap of each task individually, use Task.has_lock() for it"""
+    lse_project = getattr(project, 'lse_project', None)
+    return not (lse_project and lse_project.agreement_threshold is not None)
+
+
+def _get_first_unlocked_from_ids(task_ids: List[int], user: User) -> Union[Task, None]:
+    """Lock the page of candidates with SKIP LOCKED and count their locks and annotations for the whole page,
+    then return the first candidate that is not taken by collaborators
+    """
+    tasks = {task.id: task for task in Task.objects.select_for_update(skip_locked=True).filter(pk__in=task_ids)}
+    if not tasks:
+        logger.debug(f'Tasks with ids {task_ids} locked')
+        return
+
+    project = next(iter(tasks.values())).project
+    for task in tasks.values():
+        task.project = project
+
+    if not _use_batch_lock_check(project):
+        for task_id in task_ids:
+            if task_id in tasks and not tasks[task_id].has_lock(user):
+                return tasks[task_id]
+        return
+
+    exclude_q = next(iter(tasks.values())).get_lock_exclude_query(user)
+    num_locks = get_task_lock_backend().num_locks_by_task(tasks, exclude_user=user)
+    num_annotations = (
+        Annotation.objects.filter(task_id__in=list(tasks))
+        .exclude(exclude_q)
+        .values('task_id')
+        .annotate(count=Count('id'))
+        .values_list('task_id', 'count')
+    )
+    counters = Counter(num_locks)
+    counters.update(dict(num_annotations))
+
+    for task_id in task_ids:
+        task = tasks.get(task_id)
+        if task is None:
+            logger.debug('Task with id {} locked'.format(task_id))
+            continue
+        num = counters.get(task_id, 0)
+        if num > task.overlap:
+            # inconsistent state, has_lock() reports it and fixes is_labeled
+            task.has_lock(user)
+        elif num < task.overlap:
+            logger.log(
+                get_next_task_logging_level(user),
+                f'Task {task} locked: False; num_locks_and_annotations: {num} skipped mode: {project.skip_queue}',
+            )
+            return task
+
+
 def _get_random_unlocked(task_query: QuerySet[Task], user: User, upper_limit=None) -> Union[Task, None]:
-    for task in task_query.order_by('?').only('id')[: settings.RANDOM_NEXT_TASK_SAMPLE_SIZE]:
-        try:
-            task = Task.objects.select_for_update(skip_locked=True).get(pk=task.id)
-            if not task.has_lock(user):
-                return task
-        except Task.DoesNotExist:
-            logger.debug('Task with id {} locked'.format(task.id))
+    task_ids = list(task_query.order_by('?').values_list('id', flat=True)[: settings.RANDOM_NEXT_TASK_SAMPLE_SIZE])
+    if task_ids:
+        return _get_first_unlocked_from_ids(task_ids, user)
 
 
 def _get_first_unlocked(tasks_query: QuerySet[Task], user) -> Union[Task, None]:
     # Skip tasks that are locked due to being taken by collaborators
-    for task_id in tasks_query.values_list('id', flat=True):
-        try:
-            task = Task.objects.select_for_update(skip_locked=True).get(pk=task_id)
-            if not task.has_lock(user):
-                return task
+    # id as a tie-breaker makes pagination stable
+    tasks_query = tasks_query.order_by(*tasks_query.query.order_by, 'id')
+
+    page_size = settings.NEXT_TASK_LOCK_BATCH_SIZE
+    offset = 0
+    while task_ids := list(tasks_query.values_list('id', flat=True)[offset : offset + page_size]):
+        task = _get_first_unlocked_from_ids(task_ids, user)
+        if task:
+            return task
+        offset += page_size
+
+
+def _try_next_task_queue(tasks: QuerySet[Task], project: Project, user: User) -> Union[Task, None]:
+    """Take candidates from the precomputed queue instead of scanning all project tasks"""
+    candidate_ids = get_next_task_queue_candidates(project)
+    if not candidate_ids:
+        return
 
-        except Task.DoesNotExist:
-            logger.debug('Task with id {} locked'.format(task_id))
+    if project.sampling == project.UNIFORM:
+        # spread concurrent annotators over the queue head
+        random.shuffle(candidate_ids)
+    preserved_order = Case(*[When(pk=pk, then=pos) for pos, pk in enumerate(candidate_ids)])
+    candidates = tasks.filter(pk__in=candidate_ids).order_by(preserved_order)
+    return _get_first_unlocked(candidates, user)
 
 
 def _try_ground_truth(tasks: QuerySet[Task], project: Project, user: User) -> Union[Task, None]:
@@ -341,6 +410,12 @@ def get_next_task(
                     tasks_with_overlap, user_solved_tasks_array, prepared_tasks, user, project, queue_info
                 )
 
+        if not next_task and can_use_next_task_queue(project, dm_queue, assigned_flag, prioritized_low_agreement):
+            logger.debug(f'User={user} tries precomputed next task queue')
+            next_task = _try_next_task_queue(not_solved_tasks, project, user)
+            if next_task:
+                queue_info += (' & ' if queue_info else '') + 'Precomputed queue'
+
         if not next_task:
             if dm_queue:
                 queue_info += (' & ' if queue_info else '') + 'Data manager queue'
@@ -371,7 +446,7 @@ def get_next_task(
                 count = next_task.annotations.filter(was_cancelled=False).count()
                 task_overlap_reached = count >= next_task.overlap
                 global_overlap_reached = count >= project.maximum_annotations
-                locks = next_task.locks.count() > project.maximum_annotations - next_task.annotations.count()
+                locks = next_task.num_locks > project.maximum_annotations - next_task.annotations.count()
                 if next_task.is_labeled or task_overlap_reached or global_overlap_reached or locks:
                     from tasks.serializers import TaskSimpleSerializer
 
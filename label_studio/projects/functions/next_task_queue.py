@@ -0,0 +1,108 @@
+import logging
+from typing import List, Union
+
+from core.redis import get_redis_client, start_job_async_or_sync
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+NEXT_TASK_QUEUE_KEY = 'project:{project_id}:next_task_queue:{sampling}'
+NEXT_TASK_QUEUE_REBUILD_KEY = NEXT_TASK_QUEUE_KEY + ':rebuild'
+
+
+def _queue_key(project_id, sampling):
+    return NEXT_TASK_QUEUE_KEY.format(project_id=project_id, sampling=sampling)
+
+
+def _all_queue_keys(project_id):
+    from projects.models import Project
+
+    return [_queue_key(project_id, sampling) for sampling, _ in Project.SAMPLING_CHOICES]
+
+
+def can_use_next_task_queue(project, dm_queue, assigned_flag, prioritized_low_agreement) -> bool:
+    """The queue stores plain unlabeled tasks in sampling order,
+    so it's used only when the label stream doesn't depend on annotations of other users
+    """
+    return bool(
+        settings.NEXT_TASK_QUEUE_ENABLED
+        and not dm_queue
+        and not assigned_flag
+        and not prioritized_low_agreement
+        and project.sampling in (project.SEQUENCE, project.UNIFORM)
+        and project.maximum_annotations <= 1
+        and not project.show_ground_truth_first
+        and not project.show_overlap_first
+    )
+
+
+def rebuild_next_task_queue(project_id, sampling):
+    """Fill the queue with the first NEXT_TASK_QUEUE_SIZE unlabeled tasks of the project"""
+    from projects.models import Project
+    from tasks.models import Task
+
+    client = get_redis_client()
+    if client is None:
+        return
+
+    tasks = Task.objects.filter(project_id=project_id, is_labeled=False)
+    tasks = tasks.order_by('?') if sampling == Project.UNIFORM else tasks.order_by('id')
+    task_ids = list(tasks.values_list('id', flat=True)[: settings.NEXT_TASK_QUEUE_SIZE])
+
+    key = _queue_key(project_id, sampling)
+    with client.pipeline() as pipe:
+        pipe.delete(key)
+        if task_ids:
+            pipe.rpush(key, *task_ids)
+            pipe.expire(key, settings.NEXT_TASK_QUEUE_TTL)
+        pipe.execute()
+    logger.debug(f'Next task queue {key} rebuilt with {len(task_ids)} tasks')
+
+
+def schedule_next_task_queue_rebuild(project):
+    """Start queue rebuilding in background, not more often than NEXT_TASK_QUEUE_REBUILD_THROTTLE seconds"""
+    client = get_redis_client()
+    if client is None:
+        return
+
+    rebuild_key = NEXT_TASK_QUEUE_REBUILD_KEY.format(project_id=project.id, sampling=project.sampling)
+    if client.set(rebuild_key, 1, nx=True, ex=settings.NEXT_TASK_QUEUE_REBUILD_THROTTLE):
+        start_job_async_or_sync(rebuild_next_task_queue, project.id, project.sampling, queue_name='low')
+
+
+def get_next_task_queue_candidates(project) -> Union[List[int], None]:
+    """Return task ids from the head of the queue or None if the queue is empty or invalidated"""
+    client = get_redis_client()
+    if client is None:
+        return
+
+    task_ids = client.lrange(_queue_key(project.id, project.sampling), 0, settings.NEXT_TASK_QUEUE_WINDOW - 1)
+    if not task_ids:
+        schedule_next_task_queue_rebuild(project)
+        return
+    return [int(task_id) for task_id in task_ids]
+
+
+def remove_task_from_next_task_queue(project_id, task_id):
+    """Labeled tasks don't go to anybody anymore, so drop them from the queue"""
+    if not settings.NEXT_TASK_QUEUE_ENABLED:
+        return
+    client = get_redis_client()
+    if client is None:
+        return
+
+    with client.pipeline() as pipe:
+        for key in _all_queue_keys(project_id):
+            pipe.lrem(key, 0, task_id)
+        pipe.execute()
+
+
+def invalidate_next_task_queue(project_id):
+    """Drop queues of the project, they will be rebuilt on the next request"""
+    if not settings.NEXT_TASK_QUEUE_ENABLED:
+        return
+    client = get_redis_client()
+    if client is None:
+        return
+
+    client.delete(*_all_queue_keys(project_id))
@@ -0,0 +1,148 @@
+import logging
+import traceback as tb
+import uuid
+
+from core.redis import start_job_async_or_sync
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, Count, F, IntegerField, Q, Value, When, Window
+from django.db.models.functions import RowNumber
+
+logger = logging.getLogger(__name__)
+
+
+def _annotate_annotations(tasks, maximum_annotations):
+    """Count annotations of tasks, is_finished = 1 for tasks having maximum_annotations finished annotations"""
+    from tasks.models import Q_task_finished_annotations
+
+    return tasks.annotate(
+        finished=Count('annotations', filter=Q_task_finished_annotations & Q(annotations__ground_truth=False)),
+        anno=Count('annotations'),
+    ).annotate(
+        is_finished=Case(
+            When(finished__gte=maximum_annotations, then=Value(1)), default=Value(0), output_field=IntegerField()
+        )
+    )
+
+
+def get_overlap_cutoff(project, must_tasks):
+    """Return the must_tasks-th task (id, anno, is_finished) in the overlap order:
+    finished tasks first, then by annotation count desc and id
+    """
+    from tasks.models import Task
+
+    if must_tasks <= 0:
+        return None
+    tasks = _annotate_annotations(Task.objects.filter(project=project), project.maximum_annotations).annotate(
+        position=Window(RowNumber(), order_by=[F('is_finished').desc(), F('anno').desc(), F('id').asc()])
+    )
+    return tasks.filter(position=must_tasks).values('id', 'anno', 'is_finished').first()
+
+
+def start_overlap_cohort_rearrange(project):
+    """Save the rearrangement parameters and start the job, the previous run of the project is superseded"""
+    from projects.models import ProjectOverlapRearrange
+
+    total_count = project.tasks.count()
+    must_tasks = int(total_count * project.overlap_cohort_percentage / 100 + 0.5)
+    cutoff = get_overlap_cutoff(project, must_tasks)
+    # finished tasks get maximum overlap anyway, so only unfinished cutoff task matters
+    if cutoff is not None and cutoff['is_finished']:
+        cutoff = None
+    logger.info(f'Project {project.id} overlap cohort: required tasks {must_tasks}, cutoff task {cutoff}')
+
+    state, _ = ProjectOverlapRearrange.objects.update_or_create(
+        project=project,
+        defaults={
+            'run_id': uuid.uuid4(),
+            'status': ProjectOverlapRearrange.Status.QUEUED,
+            'maximum_annotations': project.maximum_annotations,
+            'cutoff_annotations': cutoff['anno'] if cutoff else None,
+            'cutoff_task_id': cutoff['id'] if cutoff else None,
+            'last_task_id': 0,
+            'processed_count': 0,
+            'total_count': total_count,
+            'traceback': None,
+        },
+    )
+    _start_job_on_commit(project.id, state.run_id)
+    return state
+
+
+def _start_job_on_commit(project_id, run_id):
+    """Callers save the state inside transaction.atomic(), e.g. imports and project settings updates:
+    a worker started before the commit wouldn't find the state and would exit leaving it QUEUED
+    """
+    transaction.on_commit(lambda: start_job_async_or_sync(rearrange_overlap_cohort_job, project_id, str(run_id)))
+
+
+def resume_overlap_cohort_rearrange(state):
+    """Continue the job from the last processed task, e.g. after a worker restart"""
+    state.status = state.Status.QUEUED
+    state.traceback = None
+    state.save(update_fields=['status', 'traceback', 'updated_at'])
+    _start_job_on_commit(state.project_id, state.run_id)
+
+
+def _rearrange_chunk(project, state):
+    """Update overlap and is_labeled of the next chunk of tasks, return False if there are no tasks left"""
+    from projects.functions.project_counters import mark_project_counters_stale
+    from tasks.models import Task, bulk_update_stats_project_tasks
+
+    tasks = Task.objects.filter(project=project, id__gt=state.last_task_id).order_by('id')
+    upper_id = tasks[settings.BATCH_SIZE - 1 :].values_list('id', flat=True).first()
+    chunk = Task.objects.filter(project=project, id__gt=state.last_task_id)
+    if upper_id is not None:
+        chunk = chunk.filter(id__lte=upper_id)
+
+    maximum_overlap = Q(is_finished=1)
+    if state.cutoff_task_id is not None:
+        maximum_overlap |= Q(anno__gt=state.cutoff_annotations) | Q(
+            anno=state.cutoff_annotations, id__lte=state.cutoff_task_id
+        )
+    maximum_overlap_ids = _annotate_annotations(chunk, state.maximum_annotations).filter(maximum_overlap).values('id')
+    updated = chunk.update(
+        overlap=Case(When(id__in=maximum_overlap_ids, then=Value(state.maximum_annotations)), default=Value(1))
+    )
+    bulk_update_stats_project_tasks(chunk, project=project, mark_counters_stale=False)
+
+    state.processed_count += updated
+    if upper_id is None:
+        state.status = state.Status.COMPLETED
+        # chunks don't mark counters stale one by one, cached finished_task_number is rebuilt once at the end
+        mark_project_counters_stale([project.id])
+    else:
+        state.status = state.Status.IN_PROGRESS
+        state.last_task_id = upper_id
+    state.save(update_fields=['status', 'last_task_id', 'processed_count', 'updated_at'])
+    return upper_id is not None
+
+
+def rearrange_overlap_cohort_job(project_id, run_id):
+    """Assign maximum overlap to finished tasks and to the tasks before the cutoff, overlap 1 to others.
+    Each chunk is committed with the job state, the state row lock serializes duplicated jobs
+    """
+    from projects.models import ProjectOverlapRearrange
+
+    has_more = True
+    while has_more:
+        try:
+            with transaction.atomic():
+                state = (
+                    ProjectOverlapRearrange.objects.select_for_update()
+                    .filter(project_id=project_id, run_id=run_id)
+                    .first()
+                )
+                if state is None or state.status in (state.Status.COMPLETED, state.Status.FAILED):
+                    logger.info(f'Overlap cohort job {run_id} for project {project_id} is finished or superseded')
+                    return
+                has_more = _rearrange_chunk(state.project, state)
+        except Exception:
+            ProjectOverlapRearrange.objects.filter(project_id=project_id, run_id=run_id).update(
+                status=ProjectOverlapRearrange.Status.FAILED, traceback=str(tb.format_exc())
+            )
+            raise
+        logger.info(
+            f'Overlap cohort job {run_id} for project {project_id}: '
+            f'{state.processed_count}/{state.total_count} tasks processed'
+        )
@@ -0,0 +1,74 @@
+import logging
+from typing import Iterable
+
+from core.redis import start_job_async_or_sync
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+
+logger = logging.getLogger(__name__)
+
+
+def update_project_counters(project_id, **deltas):
+    """Increment cached project counters, e.g. update_project_counters(project.id, task_number=1).
+    Stale counters are skipped, they will be recalculated by rebuild_project_counters()
+    """
+    if not settings.PROJECT_COUNTERS_CACHE_ENABLED:
+        return
+    deltas = {field: delta for field, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    from projects.models import ProjectCounters
+
+    ProjectCounters.objects.filter(project_id=project_id, is_stale=False).update(
+        **{field: F(field) + delta for field, delta in deltas.items()}
+    )
+
+
+def mark_project_counters_stale(project_ids: Iterable[int]):
+    """Counters can't be updated incrementally after bulk changes:
+    with_counts() reads live subqueries until the counters are rebuilt in background.
+    Call it after the changes are made: without an atomic block the rebuild starts immediately
+    """
+    if not settings.PROJECT_COUNTERS_CACHE_ENABLED:
+        return
+    from projects.models import ProjectCounters
+
+    project_ids = set(project_ids) - {None}
+    if not project_ids:
+        return
+    ProjectCounters.objects.filter(project_id__in=project_ids, is_stale=False).update(is_stale=True)
+
+    def rebuild():
+        for project_id in project_ids:
+            start_job_async_or_sync(rebuild_project_counters, project_id, queue_name='low')
+
+    transaction.on_commit(rebuild)
+
+
+def rebuild_project_counters(project_id):
+    """Recalculate cached counters of the project with live subqueries"""
+    from projects.models import Project, ProjectCounters, ProjectManager
+
+    subqueries = ProjectManager.CACHED_COUNTER_FIELDS
+    if not Project.objects.filter(id=project_id).exists():
+        return
+    ProjectCounters.objects.get_or_create(project_id=project_id)
+    with transaction.atomic():
+        # lock the row before reading live values: increments committed before the lock are skipped
+        # for stale counters, so they must be included in the values read under the lock,
+        # and increments waiting for the lock are applied after the rebuild
+        counters = ProjectCounters.objects.select_for_update().get(project_id=project_id)
+        values = (
+            Project.objects.filter(id=project_id)
+            .annotate(**{field: subquery() for field, subquery in subqueries.items()})
+            .values(*subqueries)
+            .first()
+        )
+        if values is None:
+            return
+        for field, value in values.items():
+            setattr(counters, field, value)
+        counters.is_stale = False
+        counters.save()
+    logger.debug(f'Project {project_id} counters rebuilt: {values}')
@@ -1,60 +1,72 @@
 from django.conf import settings
-from django.db import transaction
-from projects.models import LabelStreamHistory
+from django.db.models import Case, IntegerField, Subquery, Value, When
+from projects.models import LabelStreamHistoryItem
 from tasks.models import Annotation, Task
 
 TASK_ID_KEY = 'taskId'
 ANNOTATION_ID_KEY = 'annotationId'
 
 
+def _history_items(user, project):
+    return LabelStreamHistoryItem.objects.filter(user=user, project=project)
+
+
 def add_stream_history(next_task, user, project):
-    if next_task is not None:
-        with transaction.atomic():
-            history, created = LabelStreamHistory.objects.get_or_create(user=user, project=project)
-            new_history_data = {TASK_ID_KEY: next_task.id, ANNOTATION_ID_KEY: None}
-            if created:
-                history.data = [new_history_data]
-            else:
-                task_ids = set([h[TASK_ID_KEY] for h in history.data])
-                if next_task.id not in task_ids:
-                    history.data.append(new_history_data)
-                if len(task_ids) + 1 > settings.LABEL_STREAM_HISTORY_LIMIT:
-                    history.data = history.data[-settings.LABEL_STREAM_HISTORY_LIMIT :]
-            history.save()
+    """Append the task to the history if it's not there yet and trim the oldest items,
+    the number of queries doesn't depend on the history length
+    """
+    if next_task is None:
+        return
+    LabelStreamHistoryItem.objects.bulk_create(
+        [LabelStreamHistoryItem(user=user, project=project, task_id=next_task.id)], ignore_conflicts=True
+    )
+    items = _history_items(user, project)
+    limit = settings.LABEL_STREAM_HISTORY_LIMIT
+    oldest_kept_id = items.order_by('-id').values('id')[limit - 1 : limit]
+    items.filter(id__lt=Subquery(oldest_kept_id)).delete()
 
 
 def fill_history_annotation(user, task, annotation):
-    history = user.histories.filter(project=task.project).first()
-    if history and history.data:
-        for item in history.data:
-            if item[TASK_ID_KEY] == task.id:
-                item[ANNOTATION_ID_KEY] = annotation.id
-        history.save()
+    fill_history_annotations(user, task.project, [annotation])
+
+
+def fill_history_annotations(user, project, annotations):
+    annotation_ids = {annotation.task_id: annotation.id for annotation in annotations}
+    items = _history_items(user, project).filter(task_id__in=list(annotation_ids))
+    # history is bounded by LABEL_STREAM_HISTORY_LIMIT, so only a few tasks are matched
+    task_ids = list(items.values_list('task_id', flat=True))
+    if not task_ids:
+        return
+    items.update(
+        annotation_id=Case(
+            *[When(task_id=task_id, then=Value(annotation_ids[task_id])) for task_id in task_ids],
+            output_field=IntegerField(),
+        )
+    )
 
 
 def get_label_stream_history(user, project):
-    result = []
-
-    with transaction.atomic():
-        history = user.histories.filter(project=project).first()
-        if history is None:
-            return result
-
-        data = history.data
-
-        task_ids = set([h[TASK_ID_KEY] for h in history.data])
-        annotation_ids = set([h[ANNOTATION_ID_KEY] for h in history.data])
-        existing_task_ids = set(Task.objects.filter(pk__in=task_ids).values_list('id', flat=True))
-        existing_annotation_ids = set(Annotation.objects.filter(pk__in=annotation_ids).values_list('id', flat=True))
-
-        result = []
-        for item in data:
-            if item[TASK_ID_KEY] not in existing_task_ids:
-                continue
-            if item[ANNOTATION_ID_KEY] not in existing_annotation_ids:
-                item[ANNOTATION_ID_KEY] = None
-            result.append(item)
-        history.data = result
-        history.save(update_fields=['data'])
-
-    return result
+    items = _history_items(user, project)
+    data = list(items.order_by('id').values_list('task_id', 'annotation_id'))
+    if not data:
+        return []
+
+    task_ids = {task_id for task_id, _ in data}
+    annotation_ids = {annotation_id for _, annotation_id in data if annotation_id is not None}
+    existing_task_ids = set(Task.objects.filter(pk__in=task_ids).values_list('id', flat=True))
+    existing_annotation_ids = set(Annotation.objects.filter(pk__in=annotation_ids).values_list('id', flat=True))
+
+    # clean up removed tasks and annotations
+    if task_ids - existing_task_ids:
+        items.filter(task_id__in=task_ids - existing_task_ids).delete()
+    if annotation_ids - existing_annotation_ids:
+        items.filter(annotation_id__in=annotation_ids - existing_annotation_ids).update(annotation_id=None)
+
+    return [
+        {
+            TASK_ID_KEY: task_id,
+            ANNOTATION_ID_KEY: annotation_id if annotation_id in existing_annotation_ids else None,
+        }
+        for task_id, annotation_id in data
+        if task_id in existing_task_ids
+    ]
@@ -0,0 +1,38 @@
+import logging
+
+from core.redis import start_job_async_or_sync
+from django.core.management.base import BaseCommand
+from projects.functions.project_counters import rebuild_project_counters
+from projects.models import Project
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Rebuild cached project counters (ProjectCounters) used by the projects list'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--project', dest='projects', type=int, action='append', help='project id')
+        parser.add_argument('--organization', type=int, default=None, help='organization id')
+        parser.add_argument(
+            '--stale-only',
+            dest='stale_only',
+            action='store_true',
+            default=False,
+            help='Rebuild only stale or missing counters',
+        )
+
+    def handle(self, *args, **options):
+        projects = Project.objects.all()
+        if options['projects']:
+            projects = projects.filter(id__in=options['projects'])
+        if options['organization'] is not None:
+            projects = projects.filter(organization_id=options['organization'])
+        if options['stale_only']:
+            projects = projects.exclude(counters__is_stale=False)
+
+        for project_id in projects.values_list('id', flat=True):
+            logger.debug(f'Start rebuilding counters for project {project_id}')
+            start_job_async_or_sync(rebuild_project_counters, project_id, queue_name='low')
+
+        logger.debug('Project counters were rebuilt')
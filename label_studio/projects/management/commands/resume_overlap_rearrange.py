@@ -0,0 +1,35 @@
+import logging
+
+from django.core.management.base import BaseCommand
+from projects.functions.overlap_cohort import resume_overlap_cohort_rearrange
+from projects.models import ProjectOverlapRearrange
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Resume overlap cohort rearrangements interrupted by a worker restart'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--project', dest='projects', type=int, action='append', help='project id')
+        parser.add_argument(
+            '--failed',
+            dest='failed',
+            action='store_true',
+            default=False,
+            help='Resume failed rearrangements as well',
+        )
+
+    def handle(self, *args, **options):
+        statuses = [ProjectOverlapRearrange.Status.QUEUED, ProjectOverlapRearrange.Status.IN_PROGRESS]
+        if options['failed']:
+            statuses.append(ProjectOverlapRearrange.Status.FAILED)
+        states = ProjectOverlapRearrange.objects.filter(status__in=statuses)
+        if options['projects']:
+            states = states.filter(project_id__in=options['projects'])
+
+        for state in states:
+            logger.debug(
+                f'Resume overlap cohort rearrangement for project {state.project_id} from task {state.last_task_id}'
+            )
+            resume_overlap_cohort_rearrange(state)
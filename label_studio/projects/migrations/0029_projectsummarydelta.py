@@ -0,0 +1,62 @@
+# Generated by Django 5.1.15 on 2026-10-18 17:34
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("projects", "0028_auto_20241107_1031"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProjectSummaryDelta",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "created_annotations",
+                    models.JSONField(default=dict, verbose_name="created annotations"),
+                ),
+                (
+                    "created_labels",
+                    models.JSONField(default=dict, verbose_name="created labels"),
+                ),
+                (
+                    "created_labels_drafts",
+                    models.JSONField(
+                        default=dict, verbose_name="created labels in drafts"
+                    ),
+                ),
+                (
+                    "removed",
+                    models.BooleanField(
+                        default=False,
+                        help_text="Counters are decremented, missing keys are skipped",
+                        verbose_name="removed",
+                    ),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(auto_now_add=True, verbose_name="created at"),
+                ),
+                (
+                    "project",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="summary_deltas",
+                        to="projects.project",
+                    ),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.1.15 on 2026-10-18 17:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("projects", "0029_projectsummarydelta"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="project",
+            name="annotation_count",
+            field=models.IntegerField(
+                default=0,
+                help_text="Annotations counter maintained by annotation signals, it triggers ML backend training",
+                verbose_name="annotation count",
+            ),
+        ),
+    ]
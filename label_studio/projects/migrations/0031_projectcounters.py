@@ -0,0 +1,49 @@
+# Generated by Django 5.1.15 on 2026-10-18 18:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("projects", "0030_project_annotation_count"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProjectCounters",
+            fields=[
+                (
+                    "project",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="counters",
+                        serialize=False,
+                        to="projects.project",
+                    ),
+                ),
+                ("task_number", models.IntegerField(default=0)),
+                ("finished_task_number", models.IntegerField(default=0)),
+                ("total_predictions_number", models.IntegerField(default=0)),
+                ("total_annotations_number", models.IntegerField(default=0)),
+                ("num_tasks_with_annotations", models.IntegerField(default=0)),
+                ("useful_annotation_number", models.IntegerField(default=0)),
+                ("ground_truth_number", models.IntegerField(default=0)),
+                ("skipped_annotations_number", models.IntegerField(default=0)),
+                (
+                    "is_stale",
+                    models.BooleanField(
+                        default=True,
+                        help_text="Counters must be rebuilt, live subqueries are used meanwhile",
+                        verbose_name="is stale",
+                    ),
+                ),
+                (
+                    "updated_at",
+                    models.DateTimeField(auto_now=True, verbose_name="updated at"),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,86 @@
+# Generated by Django 5.1.15 on 2026-10-18 18:32
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("projects", "0031_projectcounters"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProjectOverlapRearrange",
+            fields=[
+                (
+                    "project",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="overlap_rearrange",
+                        serialize=False,
+                        to="projects.project",
+                    ),
+                ),
+                (
+                    "run_id",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        help_text="Jobs of previous runs stop on mismatch",
+                        verbose_name="run id",
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("queued", "Queued"),
+                            ("in_progress", "In progress"),
+                            ("failed", "Failed"),
+                            ("completed", "Completed"),
+                        ],
+                        default="queued",
+                        max_length=64,
+                    ),
+                ),
+                ("maximum_annotations", models.IntegerField(default=1)),
+                (
+                    "cutoff_annotations",
+                    models.IntegerField(
+                        default=None,
+                        help_text="Annotation count of the last unfinished task getting maximum overlap",
+                        null=True,
+                    ),
+                ),
+                (
+                    "cutoff_task_id",
+                    models.IntegerField(
+                        default=None,
+                        help_text="Id of the last unfinished task getting maximum overlap",
+                        null=True,
+                    ),
+                ),
+                (
+                    "last_task_id",
+                    models.IntegerField(
+                        default=0,
+                        help_text="Tasks with id <= last_task_id are processed",
+                    ),
+                ),
+                ("processed_count", models.IntegerField(default=0)),
+                ("total_count", models.IntegerField(default=0)),
+                ("traceback", models.TextField(blank=True, null=True)),
+                (
+                    "created_at",
+                    models.DateTimeField(auto_now_add=True, verbose_name="created at"),
+                ),
+                (
+                    "updated_at",
+                    models.DateTimeField(auto_now=True, verbose_name="updated at"),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,99 @@
+# Generated by Django 5.1.15 on 2026-10-18 18:40
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def forwards(apps, schema_editor):
+    LabelStreamHistory = apps.get_model('projects', 'LabelStreamHistory')
+    LabelStreamHistoryItem = apps.get_model('projects', 'LabelStreamHistoryItem')
+    for history in LabelStreamHistory.objects.iterator():
+        LabelStreamHistoryItem.objects.bulk_create(
+            [
+                LabelStreamHistoryItem(
+                    user_id=history.user_id,
+                    project_id=history.project_id,
+                    task_id=item['taskId'],
+                    annotation_id=item.get('annotationId'),
+                )
+                for item in history.data or []
+            ],
+            ignore_conflicts=True,
+        )
+
+
+def backwards(apps, schema_editor):
+    LabelStreamHistory = apps.get_model('projects', 'LabelStreamHistory')
+    LabelStreamHistoryItem = apps.get_model('projects', 'LabelStreamHistoryItem')
+    histories = {}
+    for item in LabelStreamHistoryItem.objects.order_by('id').iterator():
+        histories.setdefault((item.user_id, item.project_id), []).append(
+            {'taskId': item.task_id, 'annotationId': item.annotation_id}
+        )
+    LabelStreamHistory.objects.bulk_create(
+        [
+            LabelStreamHistory(user_id=user_id, project_id=project_id, data=data)
+            for (user_id, project_id), data in histories.items()
+        ]
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("projects", "0032_projectoverlaprearrange"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="LabelStreamHistoryItem",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("task_id", models.IntegerField(verbose_name="task id")),
+                (
+                    "annotation_id",
+                    models.IntegerField(
+                        default=None, null=True, verbose_name="annotation id"
+                    ),
+                ),
+                (
+                    "project",
+                    models.ForeignKey(
+                        help_text="Project ID",
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="stream_history_items",
+                        to="projects.project",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        help_text="User ID",
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="stream_history_items",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="labelstreamhistoryitem",
+            constraint=models.UniqueConstraint(
+                fields=("user", "project", "task_id"), name="unique_stream_history_item"
+            ),
+        ),
+        migrations.RunPython(forwards, backwards),
+        migrations.DeleteModel(
+            name="LabelStreamHistory",
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.1.15 on 2026-10-18 19:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("projects", "0033_label_stream_history_items"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="projectimport",
+            name="processed_count",
+            field=models.IntegerField(
+                default=0,
+                help_text="Number of source tasks committed to the project, resumed import skips them",
+            ),
+        ),
+    ]
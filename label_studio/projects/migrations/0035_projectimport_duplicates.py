@@ -0,0 +1,23 @@
+# Generated by Django 5.1.15 on 2026-10-18 19:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("projects", "0034_projectimport_processed_count"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="projectimport",
+            name="duplicates",
+            field=models.CharField(
+                choices=[("keep", "Keep"), ("skip", "Skip"), ("update", "Update")],
+                default="keep",
+                help_text="Keep, skip or update imported tasks with the same data as existing tasks",
+                max_length=16,
+            ),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.1.15 on 2026-10-18 19:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("projects", "0035_projectimport_duplicates"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="projectreimport",
+            name="deleted_count",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="projectreimport",
+            name="diff",
+            field=models.BooleanField(
+                default=False,
+                help_text="Create, update and delete only the changed tasks of the file uploads instead of recreating them",
+            ),
+        ),
+        migrations.AddField(
+            model_name="projectreimport",
+            name="diff_key",
+            field=models.CharField(
+                blank=True,
+                help_text="Task data key to match reimported rows with existing tasks, the whole data is compared if empty",
+                max_length=256,
+                null=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name="projectreimport",
+            name="updated_count",
+            field=models.IntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.1.15 on 2026-10-18 21:10
+
+from django.db import migrations
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def forwards(apps, schema_editor):
+    Project = apps.get_model('projects', 'Project')
+    Annotation = apps.get_model('tasks', 'Annotation')
+    annotation_count = (
+        Annotation.objects.filter(project_id=OuterRef('id'))
+        .order_by()
+        .values('project_id')
+        .annotate(count=Count('id'))
+        .values('count')
+    )
+    Project.objects.update(annotation_count=Coalesce(Subquery(annotation_count), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("projects", "0036_projectreimport_diff"),
+        ("tasks", "0029_annotation_project"),
+    ]
+
+    operations = [
+        migrations.RunPython(forwards, migrations.RunPython.noop),
+    ]
@@ -2,6 +2,7 @@
 """
 import json
 import logging
+import uuid
 from typing import Any, Mapping, Optional
 
 from annoying.fields import AutoOneToOneField
@@ -19,6 +20,7 @@ from core.label_config import (
     get_sample_task,
     validate_label_config,
 )
+from core.redis import start_job_async_or_sync
 from core.utils.common import (
     create_hash,
     get_attr_or_item,
@@ -29,7 +31,7 @@ from core.utils.db import fast_first
 from django.conf import settings
 from django.core.validators import MaxLengthValidator, MinLengthValidator
 from django.db import models, transaction
-from django.db.models import Avg, BooleanField, Case, Count, JSONField, Max, Q, Sum, Value, When
+from django.db.models import Avg, BooleanField, Case, Count, F, IntegerField, JSONField, Max, Q, Sum, Value, When
 from django.utils.translation import gettext_lazy as _
 from label_studio_sdk._extensions.label_studio_tools.core.label_config import parse_config
 from labels_manager.models import Label
@@ -42,7 +44,18 @@ from projects.functions import (
     annotate_total_annotations_number,
     annotate_total_predictions_number,
     annotate_useful_annotation_number,
+    finished_task_number_subquery,
+    ground_truth_number_subquery,
+    num_tasks_with_annotations_subquery,
+    skipped_annotations_number_subquery,
+    task_number_subquery,
+    total_annotations_number_subquery,
+    total_predictions_number_subquery,
+    useful_annotation_number_subquery,
 )
+from projects.functions.next_task_queue import invalidate_next_task_queue
+from projects.functions.overlap_cohort import start_overlap_cohort_rearrange
+from projects.functions.project_counters import mark_project_counters_stale
 from projects.functions.utils import make_queryset_from_iterable
 from projects.signals import ProjectSignals
 from rest_framework.exceptions import ValidationError
@@ -81,6 +94,18 @@ class ProjectManager(models.Manager):
         'skipped_annotations_number': annotate_skipped_annotations_number,
     }
 
+    # counters stored in ProjectCounters table when PROJECT_COUNTERS_CACHE_ENABLED
+    CACHED_COUNTER_FIELDS = {
+        'task_number': task_number_subquery,
+        'finished_task_number': finished_task_number_subquery,
+        'total_predictions_number': total_predictions_number_subquery,
+        'total_annotations_number': total_annotations_number_subquery,
+        'num_tasks_with_annotations': num_tasks_with_annotations_subquery,
+        'useful_annotation_number': useful_annotation_number_subquery,
+        'ground_truth_number': ground_truth_number_subquery,
+        'skipped_annotations_number': skipped_annotations_number_subquery,
+    }
+
     def for_user(self, user):
         return self.filter(organization=user.active_organization)
 
@@ -95,8 +120,21 @@ class ProjectManager(models.Manager):
         else:
             to_annotate = {field: available_fields[field] for field in fields if field in available_fields}
 
-        for _, annotate_func in to_annotate.items():  # noqa: F402
-            queryset = annotate_func(queryset)
+        cached_fields = ProjectManager.CACHED_COUNTER_FIELDS if settings.PROJECT_COUNTERS_CACHE_ENABLED else {}
+        for field, annotate_func in to_annotate.items():  # noqa: F402
+            if field in cached_fields:
+                # read the cached counter, use live subquery if counters are stale or not built yet
+                queryset = queryset.annotate(
+                    **{
+                        field: Case(
+                            When(counters__is_stale=False, then=F(f'counters__{field}')),
+                            default=cached_fields[field](),
+                            output_field=IntegerField(),
+                        )
+                    }
+                )
+            else:
+                queryset = annotate_func(queryset)
 
         return queryset
 
@@ -191,6 +229,11 @@ class Project(ProjectMixin, models.Model):
     result_count = models.IntegerField(
         _('result count'), default=0, help_text='Total results inside of annotations counter'
     )
+    annotation_count = models.IntegerField(
+        _('annotation count'),
+        default=0,
+        help_text='Annotations counter maintained by annotation signals, it triggers ML backend training',
+    )
     color = models.CharField(_('color'), max_length=16, default='#FFFFFF', null=True, blank=True)
 
     created_by = models.ForeignKey(
@@ -416,6 +459,9 @@ class Project(ProjectMixin, models.Model):
             f'Starting _update_tasks_states with params: Project {str(self)} maximum_annotations '
             f'{self.maximum_annotations} and percentage {self.overlap_cohort_percentage}'
         )
+        # settings or tasks were changed, so precomputed label stream is not valid anymore
+        invalidate_next_task_queue(self.id)
+
         # if only maximum annotations parameter is tweaked
         if maximum_annotations_changed and (not overlap_cohort_percentage_changed or self.maximum_annotations == 1):
             tasks_with_overlap = self.tasks.filter(overlap__gt=1)
@@ -439,48 +485,19 @@ class Project(ProjectMixin, models.Model):
         elif tasks_number_changed and self.overlap_cohort_percentage < 100 and self.maximum_annotations > 1:
             self._rearrange_overlap_cohort()
 
+        # tasks are changed, so the rebuild of counters doesn't read the previous values
+        mark_project_counters_stale([self.id])
+
     def _rearrange_overlap_cohort(self):
         """
-        Rearrange overlap depending on annotation count in tasks
+        Rearrange overlap depending on annotation count in tasks,
+        tasks are updated by id chunks in the background job, see ProjectOverlapRearrange
         """
-        all_project_tasks = Task.objects.filter(project=self)
-        max_annotations = self.maximum_annotations
-        must_tasks = int(self.tasks.count() * self.overlap_cohort_percentage / 100 + 0.5)
         logger.info(
             f'Starting _rearrange_overlap_cohort with params: Project {str(self)} maximum_annotations '
-            f'{max_annotations} and percentage {self.overlap_cohort_percentage}'
+            f'{self.maximum_annotations} and percentage {self.overlap_cohort_percentage}'
         )
-        tasks_with_max_annotations = all_project_tasks.annotate(
-            anno=Count('annotations', filter=Q_task_finished_annotations & Q(annotations__ground_truth=False))
-        ).filter(anno__gte=max_annotations)
-
-        tasks_with_min_annotations = all_project_tasks.exclude(id__in=tasks_with_max_annotations)
-        # check how many tasks left to finish
-        left_must_tasks = max(must_tasks - tasks_with_max_annotations.count(), 0)
-        logger.info(f'Required tasks {must_tasks} and left required tasks {left_must_tasks}')
-        if left_must_tasks > 0:
-            # if there are unfinished tasks update tasks with count(annotations) >= overlap
-            ids = list(tasks_with_max_annotations.values_list('id', flat=True))
-            all_project_tasks.filter(id__in=ids).update(overlap=max_annotations, is_labeled=True)
-            # order other tasks by count(annotations)
-            tasks_with_min_annotations = (
-                tasks_with_min_annotations.annotate(anno=Count('annotations')).order_by('-anno').distinct()
-            )
-            # assign overlap depending on annotation count
-            # assign max_annotations and update is_labeled
-            ids = list(tasks_with_min_annotations[:left_must_tasks].values_list('id', flat=True))
-            all_project_tasks.filter(id__in=ids).update(overlap=max_annotations)
-            # assign 1 to left
-            ids = list(tasks_with_min_annotations[left_must_tasks:].values_list('id', flat=True))
-            min_tasks_to_update = all_project_tasks.filter(id__in=ids)
-            min_tasks_to_update.update(overlap=1)
-        else:
-            ids = list(tasks_with_max_annotations.values_list('id', flat=True))
-            all_project_tasks.filter(id__in=ids).update(overlap=max_annotations)
-            ids = list(tasks_with_min_annotations.values_list('id', flat=True))
-            all_project_tasks.filter(id__in=ids).update(overlap=1)
-        # update is labeled after tasks rearrange overlap
-        bulk_update_stats_project_tasks(all_project_tasks, project=self)
+        start_overlap_cohort_rearrange(self)
 
     def remove_tasks_by_file_uploads(self, file_upload_ids):
         self.tasks.filter(file_upload_id__in=file_upload_ids).delete()
@@ -523,6 +540,7 @@ class Project(ProjectMixin, models.Model):
         self.validate_label_config(config_string)
         if not hasattr(self, 'summary'):
             return
+        self.summary.fold_deltas()
 
         with transaction.atomic():
             # Lock summary for update to avoid race conditions
@@ -1012,14 +1030,17 @@ class Project(ProjectMixin, models.Model):
 
     def resolve_storage_uri(self, url: str) -> Optional[Mapping[str, Any]]:
         from io_storages.functions import get_storage_by_url
+        from io_storages.presign_cache import get_presigned_url
 
         storage_objects = self.get_all_storage_objects()
         storage = get_storage_by_url(url, storage_objects)
 
         if storage:
+            http_url, max_age = get_presigned_url(storage, url)
             return {
-                'url': storage.generate_http_url(url),
+                'url': http_url,
                 'presign_ttl': storage.presign_ttl,
+                'max_age': max_age,
             }
 
     def _update_tasks_counters_and_is_labeled(self, task_ids, from_scratch=True):
@@ -1126,16 +1147,27 @@ class ProjectOnboarding(models.Model):
             self.project.save(recalc=False)
 
 
-class LabelStreamHistory(models.Model):
+class LabelStreamHistoryItem(models.Model):
+    """Task shown to the user in the label stream, rows are appended on next task requests
+    and trimmed to LABEL_STREAM_HISTORY_LIMIT newest ones, see projects/functions/stream_history.py
+    """
 
     user = models.ForeignKey(
-        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='histories', help_text='User ID'
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='stream_history_items',
+        help_text='User ID',
+    )
+    project = models.ForeignKey(
+        Project, on_delete=models.CASCADE, related_name='stream_history_items', help_text='Project ID'
     )
-    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='histories', help_text='Project ID')
-    data = models.JSONField(default=list)
+    task_id = models.IntegerField(_('task id'))
+    annotation_id = models.IntegerField(_('annotation id'), null=True, default=None)
 
     class Meta:
-        constraints = [models.UniqueConstraint(fields=['user', 'project'], name='unique_history')]
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'project', 'task_id'], name='unique_stream_history_item')
+        ]
 
 
 class ProjectMember(models.Model):
@@ -1192,6 +1224,7 @@ class ProjectSummary(models.Model):
         self.created_labels = {}
         self.created_labels_drafts = {}
         self.save()
+        self.project.summary_deltas.all().delete()
 
     def update_data_columns(self, tasks):
         common_data_columns = set()
@@ -1280,9 +1313,73 @@ class ProjectSummary(models.Model):
                 labels.append(str(label))
         return labels
 
-    def update_created_annotations_and_labels(self, annotations):
-        created_annotations = dict(self.created_annotations)
-        labels = dict(self.created_labels)
+    def _append_delta(self, created_annotations=None, created_labels=None, created_labels_drafts=None, removed=False):
+        """Store counters change as a separate row instead of rewriting the summary,
+        so concurrent annotation saves don't serialize on the summary row
+        """
+        if not created_annotations and not created_labels and not created_labels_drafts:
+            return
+        ProjectSummaryDelta.objects.create(
+            project_id=self.project_id,
+            created_annotations=created_annotations or {},
+            created_labels=created_labels or {},
+            created_labels_drafts=created_labels_drafts or {},
+            removed=removed,
+        )
+        # delta ids are shared by all projects, so the fold is triggered by the number of unfolded project deltas
+        unfolded_count = ProjectSummaryDelta.objects.filter(project_id=self.project_id).count()
+        if unfolded_count % settings.PROJECT_SUMMARY_DELTAS_FOLD_INTERVAL == 0:
+            from projects.functions.utils import fold_project_summary_deltas
+
+            start_job_async_or_sync(fold_project_summary_deltas, self.project_id, queue_name='low')
+
+    @staticmethod
+    def _apply_counters(counters, delta, removed=False):
+        counters = dict(counters)
+        for key, count in delta.items():
+            if removed and key not in counters:
+                continue
+            counters[key] = counters.get(key, 0) + count
+            if counters[key] <= 0:
+                counters.pop(key)
+        return counters
+
+    def _apply_labels(self, labels, delta, removed=False):
+        labels = dict(labels)
+        for from_name, labels_delta in delta.items():
+            if removed and from_name not in labels:
+                continue
+            labels[from_name] = self._apply_counters(labels.get(from_name, {}), labels_delta, removed)
+            if removed and not labels[from_name]:
+                labels.pop(from_name)
+        return labels
+
+    def fold_deltas(self):
+        """Apply pending counters changes to the summary and drop them"""
+        with transaction.atomic():
+            summary = ProjectSummary.objects.select_for_update().get(pk=self.pk)
+            deltas = list(ProjectSummaryDelta.objects.filter(project_id=self.project_id).order_by('id'))
+            if deltas:
+                for delta in deltas:
+                    summary.created_annotations = self._apply_counters(
+                        summary.created_annotations, delta.created_annotations, delta.removed
+                    )
+                    summary.created_labels = self._apply_labels(
+                        summary.created_labels, delta.created_labels, delta.removed
+                    )
+                    summary.created_labels_drafts = self._apply_labels(
+                        summary.created_labels_drafts, delta.created_labels_drafts, delta.removed
+                    )
+                summary.save(update_fields=['created_annotations', 'created_labels', 'created_labels_drafts'])
+                ProjectSummaryDelta.objects.filter(id__in=[delta.id for delta in deltas]).delete()
+                logger.debug(f'Folded {len(deltas)} summary deltas for project_id={self.project_id}')
+
+        self.created_annotations = summary.created_annotations
+        self.created_labels = summary.created_labels
+        self.created_labels_drafts = summary.created_labels_drafts
+
+    def _count_annotations_and_labels(self, annotations, sign=1):
+        created_annotations, labels = {}, {}
         for annotation in annotations:
             results = get_attr_or_item(annotation, 'result') or []
             if not isinstance(results, list):
@@ -1293,64 +1390,17 @@ class ProjectSummary(models.Model):
                 key = self._get_annotation_key(result)
                 if not key:
                     continue
-                created_annotations[key] = created_annotations.get(key, 0) + 1
-                from_name = result['from_name']
+                created_annotations[key] = created_annotations.get(key, 0) + sign
 
                 # aggregate labels
-                if from_name not in self.created_labels:
-                    labels[from_name] = dict()
-
+                from_name = result['from_name']
+                labels.setdefault(from_name, {})
                 for label in self._get_labels(result):
-                    labels[from_name][label] = labels[from_name].get(label, 0) + 1
-
-        logger.debug(f'summary.created_annotations = {created_annotations}')
-        logger.debug(f'summary.created_labels = {labels}')
-        self.created_annotations = created_annotations
-        self.created_labels = labels
-        self.save(update_fields=['created_annotations', 'created_labels'])
-
-    def remove_created_annotations_and_labels(self, annotations):
-        # we are going to remove all annotations, so we'll reset the corresponding fields on the summary
-        remove_all_annotations = self.project.annotations.count() == len(annotations)
-        created_annotations, created_labels = (
-            ({}, {}) if remove_all_annotations else (dict(self.created_annotations), dict(self.created_labels))
-        )
+                    labels[from_name][label] = labels[from_name].get(label, 0) + sign
+        return created_annotations, labels
 
-        if not remove_all_annotations:
-            for annotation in annotations:
-                results = get_attr_or_item(annotation, 'result') or []
-                if not isinstance(results, list):
-                    continue
-
-                for result in results:
-                    # reduce annotation counters
-                    key = self._get_annotation_key(result)
-                    if key in created_annotations:
-                        created_annotations[key] -= 1
-                        if created_annotations[key] == 0:
-                            created_annotations.pop(key)
-
-                    # reduce labels counters
-                    from_name = result.get('from_name', None)
-                    if from_name not in created_labels:
-                        continue
-                    for label in self._get_labels(result):
-                        label = str(label)
-                        if label in created_labels[from_name]:
-                            created_labels[from_name][label] -= 1
-                            if created_labels[from_name][label] == 0:
-                                created_labels[from_name].pop(label)
-                    if not created_labels[from_name]:
-                        created_labels.pop(from_name)
-
-        logger.debug(f'summary.created_annotations = {created_annotations}')
-        logger.debug(f'summary.created_labels = {created_labels}')
-        self.created_annotations = created_annotations
-        self.created_labels = created_labels
-        self.save(update_fields=['created_annotations', 'created_labels'])
-
-    def update_created_labels_drafts(self, drafts):
-        labels = dict(self.created_labels_drafts)
+    def _count_drafts_labels(self, drafts, sign=1):
+        labels = {}
         for draft in drafts:
             results = get_attr_or_item(draft, 'result') or []
             if not isinstance(results, list):
@@ -1360,45 +1410,119 @@ class ProjectSummary(models.Model):
                 if 'from_name' not in result:
                     continue
                 from_name = result['from_name']
+                labels.setdefault(from_name, {})
+                for label in self._get_labels(result):
+                    labels[from_name][label] = labels[from_name].get(label, 0) + sign
+        return labels
 
-                # aggregate labels
-                if from_name not in self.created_labels_drafts:
-                    labels[from_name] = dict()
+    def update_created_annotations_and_labels(self, annotations):
+        created_annotations, labels = self._count_annotations_and_labels(annotations)
+        logger.debug(f'summary.created_annotations delta = {created_annotations}')
+        logger.debug(f'summary.created_labels delta = {labels}')
+        self._append_delta(created_annotations=created_annotations, created_labels=labels)
 
-                for label in self._get_labels(result):
-                    labels[from_name][label] = labels[from_name].get(label, 0) + 1
+    def remove_created_annotations_and_labels(self, annotations):
+        # we are going to remove all annotations, so we'll reset the corresponding fields on the summary
+        if self.project.annotations.count() == len(annotations):
+            self.fold_deltas()
+            self.created_annotations = {}
+            self.created_labels = {}
+            self.save(update_fields=['created_annotations', 'created_labels'])
+            return
+
+        created_annotations, labels = self._count_annotations_and_labels(annotations, sign=-1)
+        logger.debug(f'summary.created_annotations delta = {created_annotations}')
+        logger.debug(f'summary.created_labels delta = {labels}')
+        self._append_delta(created_annotations=created_annotations, created_labels=labels, removed=True)
 
-        logger.debug(f'update summary.created_labels_drafts = {labels}')
-        self.created_labels_drafts = labels
-        self.save(update_fields=['created_labels_drafts'])
+    def update_created_labels_drafts(self, drafts):
+        labels = self._count_drafts_labels(drafts)
+        logger.debug(f'summary.created_labels_drafts delta = {labels}')
+        self._append_delta(created_labels_drafts=labels)
 
     def remove_created_drafts_and_labels(self, drafts):
         # we are going to remove all drafts, so we'll reset the corresponding field on the summary
-        remove_all_drafts = AnnotationDraft.objects.filter(task__project=self.project).count() == len(drafts)
-        labels = {} if remove_all_drafts else dict(self.created_labels_drafts)
+        if AnnotationDraft.objects.filter(task__project=self.project).count() == len(drafts):
+            self.fold_deltas()
+            self.created_labels_drafts = {}
+            self.save(update_fields=['created_labels_drafts'])
+            return
 
-        if not remove_all_drafts:
-            for draft in drafts:
-                results = get_attr_or_item(draft, 'result') or []
-                if not isinstance(results, list):
-                    continue
+        labels = self._count_drafts_labels(drafts, sign=-1)
+        logger.debug(f'summary.created_labels_drafts delta = {labels}')
+        self._append_delta(created_labels_drafts=labels, removed=True)
+
+
+class ProjectSummaryDelta(models.Model):
+    """Change of ProjectSummary annotation counters made by one annotation or draft save / removal,
+    deltas are folded into the summary on read or periodically, see ProjectSummary.fold_deltas()
+    """
+
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='summary_deltas')
+    created_annotations = JSONField(_('created annotations'), default=dict)
+    created_labels = JSONField(_('created labels'), default=dict)
+    created_labels_drafts = JSONField(_('created labels in drafts'), default=dict)
+    removed = models.BooleanField(
+        _('removed'), default=False, help_text='Counters are decremented, missing keys are skipped'
+    )
+    created_at = models.DateTimeField(_('created at'), auto_now_add=True)
+
+
+class ProjectCounters(models.Model):
+    """Denormalized ProjectManager.COUNTER_FIELDS for the projects list,
+    incremented by task, annotation and prediction signals and rebuilt after bulk changes,
+    see projects/functions/project_counters.py
+    """
+
+    project = models.OneToOneField(Project, primary_key=True, on_delete=models.CASCADE, related_name='counters')
+    task_number = models.IntegerField(default=0)
+    finished_task_number = models.IntegerField(default=0)
+    total_predictions_number = models.IntegerField(default=0)
+    total_annotations_number = models.IntegerField(default=0)
+    num_tasks_with_annotations = models.IntegerField(default=0)
+    useful_annotation_number = models.IntegerField(default=0)
+    ground_truth_number = models.IntegerField(default=0)
+    skipped_annotations_number = models.IntegerField(default=0)
+    is_stale = models.BooleanField(
+        _('is stale'), default=True, help_text='Counters must be rebuilt, live subqueries are used meanwhile'
+    )
+    updated_at = models.DateTimeField(_('updated at'), auto_now=True)
+
+
+class ProjectOverlapRearrange(models.Model):
+    """State of the overlap cohort rearrangement job, tasks are processed in id order
+    and last_task_id is saved after each chunk, so the job can be resumed after a worker restart,
+    see projects/functions/overlap_cohort.py
+    """
 
-                for result in results:
-                    # reduce labels counters
-                    from_name = result.get('from_name', None)
-                    if from_name not in labels:
-                        continue
-                    for label in self._get_labels(result):
-                        label = str(label)
-                        if label in labels[from_name]:
-                            labels[from_name][label] -= 1
-                            if labels[from_name][label] == 0:
-                                labels[from_name].pop(label)
-                    if not labels[from_name]:
-                        labels.pop(from_name)
-        logger.debug(f'summary.created_labels_drafts = {labels}')
-        self.created_labels_drafts = labels
-        self.save(update_fields=['created_labels_drafts'])
+    class Status(models.TextChoices):
+        QUEUED = 'queued', _('Queued')
+        IN_PROGRESS = 'in_progress', _('In progress')
+        FAILED = 'failed', _('Failed')
+        COMPLETED = 'completed', _('Completed')
+
+    project = models.OneToOneField(
+        Project, primary_key=True, on_delete=models.CASCADE, related_name='overlap_rearrange'
+    )
+    run_id = models.UUIDField(_('run id'), default=uuid.uuid4, help_text='Jobs of previous runs stop on mismatch')
+    status = models.CharField(max_length=64, choices=Status.choices, default=Status.QUEUED)
+    maximum_annotations = models.IntegerField(default=1)
+    cutoff_annotations = models.IntegerField(
+        null=True, default=None, help_text='Annotation count of the last unfinished task getting maximum overlap'
+    )
+    cutoff_task_id = models.IntegerField(
+        null=True, default=None, help_text='Id of the last unfinished task getting maximum overlap'
+    )
+    last_task_id = models.IntegerField(default=0, help_text='Tasks with id <= last_task_id are processed')
+    processed_count = models.IntegerField(default=0)
+    total_count = models.IntegerField(default=0)
+    traceback = models.TextField(null=True, blank=True)
+    created_at = models.DateTimeField(_('created at'), auto_now_add=True)
+    updated_at = models.DateTimeField(_('updated at'), auto_now=True)
+
+    @property
+    def progress(self):
+        return self.processed_count / self.total_count if self.total_count else 1.0
 
 
 class ProjectImport(models.Model):
@@ -1408,10 +1532,23 @@ class ProjectImport(models.Model):
         FAILED = 'failed', _('Failed')
         COMPLETED = 'completed', _('Completed')
 
+    class Duplicates(models.TextChoices):
+        """What to do with imported tasks having the same data as existing project tasks"""
+
+        KEEP = 'keep', _('Keep')
+        SKIP = 'skip', _('Skip')
+        UPDATE = 'update', _('Update')
+
     project = models.ForeignKey('projects.Project', null=True, related_name='imports', on_delete=models.CASCADE)
     preannotated_from_fields = models.JSONField(null=True, blank=True)
     commit_to_project = models.BooleanField(default=False)
     return_task_ids = models.BooleanField(default=False)
+    duplicates = models.CharField(
+        max_length=16,
+        choices=Duplicates.choices,
+        default=Duplicates.KEEP,
+        help_text='Keep, skip or update imported tasks with the same data as existing tasks',
+    )
     status = models.CharField(max_length=64, choices=Status.choices, default=Status.CREATED)
     url = models.CharField(max_length=2048, null=True, blank=True)
     traceback = models.TextField(null=True, blank=True)
@@ -1422,6 +1559,9 @@ class ProjectImport(models.Model):
     task_count = models.IntegerField(default=0)
     annotation_count = models.IntegerField(default=0)
     prediction_count = models.IntegerField(default=0)
+    processed_count = models.IntegerField(
+        default=0, help_text='Number of source tasks committed to the project, resumed import skips them'
+    )
     duration = models.IntegerField(default=0)
     file_upload_ids = models.JSONField(default=list)
     could_be_tasks_list = models.BooleanField(default=False)
@@ -1453,6 +1593,18 @@ class ProjectReimport(models.Model):
     found_formats = models.JSONField(default=list)
     data_columns = models.JSONField(default=list)
     traceback = models.TextField(null=True, blank=True)
+    diff = models.BooleanField(
+        default=False,
+        help_text='Create, update and delete only the changed tasks of the file uploads instead of recreating them',
+    )
+    diff_key = models.CharField(
+        max_length=256,
+        null=True,
+        blank=True,
+        help_text='Task data key to match reimported rows with existing tasks, the whole data is compared if empty',
+    )
+    updated_count = models.IntegerField(default=0)
+    deleted_count = models.IntegerField(default=0)
 
     def has_permission(self, user):
         return self.project.has_permission(user)
@@ -20,9 +20,10 @@ from drf_yasg.utils import no_body, swagger_auto_schema
 from projects.functions.stream_history import fill_history_annotation
 from projects.models import Project
 from rest_framework import generics, viewsets
-from rest_framework.exceptions import PermissionDenied
+from rest_framework.exceptions import PermissionDenied, ValidationError
 from rest_framework.parsers import FormParser, JSONParser, MultiPartParser
 from rest_framework.response import Response
+from tasks.functions import bulk_create_annotations
 from tasks.models import Annotation, AnnotationDraft, Prediction, Task
 from tasks.openapi_schema import (
     annotation_request_schema,
@@ -34,6 +35,7 @@ from tasks.openapi_schema import (
     task_response_example,
 )
 from tasks.serializers import (
+    AnnotationBulkCreateSerializer,
     AnnotationDraftSerializer,
     AnnotationSerializer,
     PredictionSerializer,
@@ -601,6 +603,69 @@ class AnnotationsListAPI(GetParentObjectMixin, generics.ListCreateAPIView):
         return annotation
 
 
+@method_decorator(
+    name='post',
+    decorator=swagger_auto_schema(
+        tags=['Annotations'],
+        x_fern_sdk_group_name='annotations',
+        x_fern_sdk_method_name='create_bulk',
+        x_fern_audiences=['public'],
+        operation_summary='Bulk create annotations',
+        operation_description="""
+        Create annotations for many tasks of one project in a single request. Annotations are completed
+        by the current user and written with one bulk insert, so per-annotation webhooks aren't sent,
+        instead one `ANNOTATIONS_CREATED` webhook is emitted for all of them.
+        """,
+        request_body=AnnotationBulkCreateSerializer,
+        responses={
+            '201': openapi.Response(
+                description='IDs of created annotations',
+                schema=openapi.Schema(
+                    type=openapi.TYPE_OBJECT,
+                    properties={
+                        'count': openapi.Schema(type=openapi.TYPE_INTEGER),
+                        'annotation_ids': openapi.Schema(
+                            type=openapi.TYPE_ARRAY, items=openapi.Schema(type=openapi.TYPE_INTEGER)
+                        ),
+                    },
+                ),
+            )
+        },
+    ),
+)
+class AnnotationBulkCreateAPI(generics.CreateAPIView):
+    parser_classes = (JSONParser,)
+    permission_required = ViewClassPermission(POST=all_permissions.annotations_create)
+    serializer_class = AnnotationBulkCreateSerializer
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        user = request.user
+        project = generics.get_object_or_404(Project.objects.for_user(user), pk=serializer.validated_data['project'])
+        if not project.has_permission(user):
+            raise PermissionDenied(f'You have no permission to project id:{project.id}')
+
+        annotations = serializer.validated_data['annotations']
+        task_ids = {annotation['task'] for annotation in annotations}
+        missing_task_ids = task_ids - set(
+            Task.objects.filter(project=project, id__in=task_ids).values_list('id', flat=True)
+        )
+        if missing_task_ids:
+            raise ValidationError({'annotations': f'Tasks not found in project: {sorted(missing_task_ids)}'})
+
+        db_annotations = bulk_create_annotations(project, user, annotations)
+
+        user.activity_at = timezone.now()
+        user.save(update_fields=['activity_at'])
+
+        emit_webhooks_for_instance(
+            user.active_organization, project, WebhookAction.ANNOTATIONS_CREATED, db_annotations
+        )
+        annotation_ids = [annotation.id for annotation in db_annotations]
+        return Response(status=201, data={'count': len(annotation_ids), 'annotation_ids': annotation_ids})
+
+
 class AnnotationDraftListAPI(generics.ListCreateAPIView):
     parser_classes = (JSONParser, MultiPartParser, FormParser)
     serializer_class = AnnotationDraftSerializer
@@ -14,10 +14,15 @@ from data_export.serializers import ExportDataSerializer
 from data_manager.managers import TaskQuerySet
 from django.conf import settings
 from django.db import transaction
-from django.db.models import Count, Q
+from django.db.models import Count, F, Q
+from django.utils.timezone import now
 from organizations.models import Organization
+from projects.functions.next_task_queue import invalidate_next_task_queue
+from projects.functions.project_counters import mark_project_counters_stale
+from projects.functions.stream_history import fill_history_annotations
 from projects.models import Project
-from tasks.models import Annotation, Prediction, Task
+from tasks.locks import get_task_lock_backend
+from tasks.models import Annotation, AnnotationDraft, Prediction, Task, bulk_update_stats_project_tasks
 
 logger = logging.getLogger(__name__)
 
@@ -197,6 +202,7 @@ def update_tasks_counters(queryset, from_scratch=True):
         queryset = queryset.exclude(
             Q(total_annotations__gt=0) | Q(cancelled_annotations__gt=0) | Q(total_predictions__gt=0)
         )
+    project_ids = list(queryset.values_list('project_id', flat=True).distinct())
 
     # filter our tasks with 0 annotations and 0 predictions and update them with 0
     queryset.filter(annotations__isnull=True, predictions__isnull=True).update(
@@ -222,4 +228,104 @@ def update_tasks_counters(queryset, from_scratch=True):
             update_fields=['total_annotations', 'cancelled_annotations', 'total_predictions'],
             batch_size=settings.BATCH_SIZE,
         )
+    mark_project_counters_stale(project_ids)
     return len(objs)
+
+
+def reconcile_project_counters(project_id, updated_since=None):
+    """Repair drift of task counters and project.annotation_count,
+    they are incremented and decremented by annotation and prediction signals
+    :param project_id: Project.id
+    :param updated_since: check only tasks updated after this datetime
+    :return: Count of updated tasks
+    """
+    project = Project.objects.get(id=project_id)
+    tasks = Task.objects.filter(project_id=project_id)
+    if updated_since is not None:
+        tasks = tasks.filter(updated_at__gte=updated_since)
+
+    task_count = update_tasks_counters(tasks)
+    bulk_update_stats_project_tasks(tasks, project=project)
+    Project.objects.filter(id=project_id).update(
+        annotation_count=Annotation.objects.filter(project_id=project_id).count()
+    )
+    logger.debug(f'Reconciled counters for project {project_id}, processed {task_count} tasks')
+    return task_count
+
+
+def reconcile_counters(project_ids=None, updated_since=None):
+    """Periodic counters reconciliation, see reconcile_counters management command"""
+    projects = Project.objects.all()
+    if project_ids:
+        projects = projects.filter(id__in=project_ids)
+    if updated_since is not None:
+        projects = projects.filter(tasks__updated_at__gte=updated_since).distinct()
+
+    for project_id in projects.values_list('id', flat=True):
+        start_job_async_or_sync(reconcile_project_counters, project_id, updated_since=updated_since, queue_name='low')
+
+
+def train_ml_backends_after_bulk_create(project, created_count):
+    """Start training once per every min_annotations_to_start_training annotations, like update_ml_backend does,
+    project.annotation_count must already include the created annotations
+    """
+    if not project.min_annotations_to_start_training or not created_count:
+        return
+    annotation_count = Project.objects.values_list('annotation_count', flat=True).get(id=project.id)
+    previous_count = annotation_count - created_count
+    step = project.min_annotations_to_start_training
+    if annotation_count // step > previous_count // step:
+        for ml_backend in project.ml_backends.all():
+            ml_backend.train()
+
+
+def bulk_create_annotations(project, user, annotations):
+    """Create annotations with one bulk insert instead of saving them one by one.
+    Annotation signals aren't fired, so task counters, is_labeled, project summary,
+    label stream history, user drafts and task locks are updated here for all tasks at once
+    :param project: Project
+    :param user: User who submits the annotations
+    :param annotations: list of dicts with task, result, was_cancelled and lead_time
+    :return: list of created annotations
+    """
+    db_annotations = []
+    for annotation in annotations:
+        result = annotation['result']
+        db_annotations.append(
+            Annotation(
+                task_id=annotation['task'],
+                project=project,
+                result=result,
+                result_count=len({item.get('id') for item in result}),
+                was_cancelled=annotation.get('was_cancelled', False),
+                lead_time=annotation.get('lead_time'),
+                completed_by=user,
+                updated_by=user,
+            )
+        )
+    task_ids = {annotation.task_id for annotation in db_annotations}
+
+    with transaction.atomic():
+        db_annotations = Annotation.objects.bulk_create(db_annotations, batch_size=settings.BATCH_SIZE)
+        tasks = Task.objects.filter(id__in=task_ids)
+        tasks.update(updated_at=now(), updated_by=user)
+        update_tasks_counters(tasks)
+        bulk_update_stats_project_tasks(tasks, project=project)
+        Project.objects.filter(id=project.id).update(annotation_count=F('annotation_count') + len(db_annotations))
+
+    project.summary.update_created_annotations_and_labels(db_annotations)
+    fill_history_annotations(user, project, db_annotations)
+    invalidate_next_task_queue(project.id)
+
+    # drafts of the submitted tasks are removed like after the annotation is created from a draft,
+    # each draft is deleted individually to update created_labels_drafts
+    for draft in AnnotationDraft.objects.filter(task_id__in=task_ids, user=user, annotation__isnull=True):
+        draft.delete()
+
+    locked_task_ids = set(get_task_lock_backend().get_locked_task_ids(user)) & task_ids
+    for task in Task.objects.filter(id__in=locked_task_ids):
+        task.release_lock(user)
+
+    train_ml_backends_after_bulk_create(project, len(db_annotations))
+    logger.info(f'Bulk created {len(db_annotations)} annotations for {len(task_ids)} tasks in project {project.id}')
+    return db_annotations
@@ -0,0 +1,255 @@
+"""This file and its contents are licensed under the Apache License 2.0. Please see the included NOTICE for copyright information and LICENSE for a copy of the license.
+"""
+import datetime
+import logging
+import uuid
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from core.redis import get_redis_client
+from core.utils.common import load_func
+from core.utils.db import fast_first
+from core.utils.exceptions import LabelStudioError
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db.models import Count
+from django.dispatch import receiver
+from django.utils.timezone import now
+
+logger = logging.getLogger(__name__)
+
+
+class TaskLockBackend:
+    """Storage for task locks, selected with settings.TASK_LOCK_BACKEND"""
+
+    def is_available(self) -> bool:
+        return True
+
+    def set_lock(self, task, user, expire_at: datetime.datetime) -> None:
+        """Lock task by user until expire_at, prolong the lock if it already exists"""
+        raise NotImplementedError
+
+    def release_lock(self, task, user=None) -> None:
+        """Release lock of user or all locks of the task if user is None"""
+        raise NotImplementedError
+
+    def release_user_locks(self, user) -> None:
+        raise NotImplementedError
+
+    def clear_expired_locks(self, task) -> None:
+        raise NotImplementedError
+
+    def num_locks(self, task, exclude_user=None) -> int:
+        """Number of active locks of the task"""
+        return self.num_locks_by_task([task.id], exclude_user=exclude_user).get(task.id, 0)
+
+    def num_locks_by_task(self, task_ids: Iterable[int], exclude_user=None) -> Dict[int, int]:
+        """Number of active locks for each task, tasks without locks can be omitted"""
+        raise NotImplementedError
+
+    def get_locked_task_ids(self, user) -> List[int]:
+        """Ids of tasks actively locked by user"""
+        raise NotImplementedError
+
+    def get_locked_by(self, user, project=None, tasks=None):
+        """Task locked by user in project or tasks queryset"""
+        from tasks.models import Task
+
+        task_ids = self.get_locked_task_ids(user)
+        if not task_ids:
+            return
+        if project is not None:
+            return fast_first(Task.objects.filter(id__in=task_ids, project=project))
+        return fast_first(tasks.filter(id__in=task_ids))
+
+    def get_lock_id(self, task, user) -> Optional[uuid.UUID]:
+        """Unique id of the lock, it's returned to the client with the next task"""
+        raise NotImplementedError
+
+    def get_locks(self, task) -> List[Tuple[int, datetime.datetime]]:
+        """(user id, expire_at) pairs of all task locks, used for logging"""
+        raise NotImplementedError
+
+
+class DatabaseTaskLockBackend(TaskLockBackend):
+    """Locks are stored in TaskLock table"""
+
+    def set_lock(self, task, user, expire_at):
+        from tasks.models import TaskLock
+
+        try:
+            task_lock = TaskLock.objects.get(task=task, user=user)
+        except TaskLock.DoesNotExist:
+            TaskLock.objects.create(task=task, user=user, expire_at=expire_at)
+        else:
+            task_lock.expire_at = expire_at
+            task_lock.save()
+
+    def release_lock(self, task, user=None):
+        if user is not None:
+            task.locks.filter(user=user).delete()
+        else:
+            task.locks.all().delete()
+
+    def release_user_locks(self, user):
+        user.task_locks.all().delete()
+
+    def clear_expired_locks(self, task):
+        task.locks.filter(expire_at__lt=now()).delete()
+
+    def num_locks_by_task(self, task_ids, exclude_user=None):
+        from tasks.models import TaskLock
+
+        locks = TaskLock.objects.filter(task_id__in=list(task_ids), expire_at__gt=now())
+        if exclude_user is not None:
+            locks = locks.exclude(user=exclude_user)
+        return dict(locks.values('task_id').annotate(count=Count('id')).values_list('task_id', 'count'))
+
+    def get_locked_task_ids(self, user):
+        return list(user.task_locks.filter(expire_at__gt=now()).values_list('task_id', flat=True))
+
+    def get_locked_by(self, user, project=None, tasks=None):
+        from tasks.models import TaskLock
+
+        if project is not None:
+            lock = fast_first(TaskLock.objects.filter(user=user, expire_at__gt=now(), task__project=project))
+            return lock.task if lock else None
+        return fast_first(tasks.filter(locks__user=user, locks__expire_at__gt=now()))
+
+    def get_lock_id(self, task, user):
+        lock = task.locks.filter(user=user).first()
+        if lock:
+            return lock.unique_id
+
+    def get_locks(self, task):
+        return list(task.locks.values_list('user', 'expire_at'))
+
+
+class RedisTaskLockBackend(TaskLockBackend):
+    """Locks are stored in redis sorted sets scored by expiration timestamp:
+    task_lock:<task id> keeps user ids, task_lock:user:<user id> keeps task ids
+    """
+
+    TASK_KEY = 'task_lock:{task_id}'
+    TASK_LOCK_IDS_KEY = 'task_lock:{task_id}:ids'
+    USER_KEY = 'task_lock:user:{user_id}'
+
+    def __init__(self):
+        # the backend is created once by get_task_lock_backend(), get_redis_client() pings redis
+        self.redis = get_redis_client()
+
+    def is_available(self):
+        return self.redis is not None
+
+    def _task_keys(self, task_id):
+        return self.TASK_KEY.format(task_id=task_id), self.TASK_LOCK_IDS_KEY.format(task_id=task_id)
+
+    def set_lock(self, task, user, expire_at):
+        task_key, ids_key = self._task_keys(task.id)
+        user_key = self.USER_KEY.format(user_id=user.id)
+        score = expire_at.timestamp()
+        ttl = max(int(score - now().timestamp()), 1)
+        with self.redis.pipeline() as pipe:
+            pipe.zadd(task_key, {user.id: score})
+            pipe.hsetnx(ids_key, user.id, str(uuid.uuid4()))
+            # all locks of the task have the same ttl, so the task keys expire with the latest lock;
+            # user locks can come from projects with different ttl, they are trimmed on read instead
+            pipe.expire(task_key, ttl)
+            pipe.expire(ids_key, ttl)
+            pipe.zadd(user_key, {task.id: score})
+            pipe.execute()
+
+    def release_lock(self, task, user=None):
+        task_key, ids_key = self._task_keys(task.id)
+        user_ids = [user.id] if user is not None else [int(u) for u in self.redis.zrange(task_key, 0, -1)]
+        with self.redis.pipeline() as pipe:
+            for user_id in user_ids:
+                pipe.zrem(self.USER_KEY.format(user_id=user_id), task.id)
+            if user is not None:
+                pipe.zrem(task_key, user.id)
+                pipe.hdel(ids_key, user.id)
+            else:
+                pipe.delete(task_key, ids_key)
+            pipe.execute()
+
+    def release_user_locks(self, user):
+        user_key = self.USER_KEY.format(user_id=user.id)
+        task_ids = self.redis.zrange(user_key, 0, -1)
+        with self.redis.pipeline() as pipe:
+            for task_id in task_ids:
+                task_key, ids_key = self._task_keys(int(task_id))
+                pipe.zrem(task_key, user.id)
+                pipe.hdel(ids_key, user.id)
+            pipe.delete(user_key)
+            pipe.execute()
+
+    def clear_expired_locks(self, task):
+        task_key, ids_key = self._task_keys(task.id)
+        expired = self.redis.zrangebyscore(task_key, '-inf', now().timestamp())
+        if expired:
+            with self.redis.pipeline() as pipe:
+                pipe.zrem(task_key, *expired)
+                pipe.hdel(ids_key, *expired)
+                pipe.execute()
+
+    def num_locks_by_task(self, task_ids, exclude_user=None):
+        task_ids = list(task_ids)
+        timestamp = now().timestamp()
+        with self.redis.pipeline() as pipe:
+            for task_id in task_ids:
+                task_key = self.TASK_KEY.format(task_id=task_id)
+                pipe.zcount(task_key, f'({timestamp}', '+inf')
+                if exclude_user is not None:
+                    pipe.zscore(task_key, exclude_user.id)
+            results = pipe.execute()
+
+        step = 1 if exclude_user is None else 2
+        counts = {}
+        for i, task_id in enumerate(task_ids):
+            count = results[i * step]
+            if exclude_user is not None:
+                user_score = results[i * step + 1]
+                count -= int(user_score is not None and user_score > timestamp)
+            counts[task_id] = count
+        return counts
+
+    def get_locked_task_ids(self, user):
+        user_key = self.USER_KEY.format(user_id=user.id)
+        timestamp = now().timestamp()
+        self.redis.zremrangebyscore(user_key, '-inf', timestamp)
+        return [int(task_id) for task_id in self.redis.zrangebyscore(user_key, f'({timestamp}', '+inf')]
+
+    def get_lock_id(self, task, user):
+        lock_id = self.redis.hget(self.TASK_LOCK_IDS_KEY.format(task_id=task.id), user.id)
+        if lock_id:
+            return uuid.UUID(lock_id.decode() if isinstance(lock_id, bytes) else lock_id)
+
+    def get_locks(self, task):
+        locks = self.redis.zrange(self.TASK_KEY.format(task_id=task.id), 0, -1, withscores=True)
+        return [
+            (int(user_id), datetime.datetime.fromtimestamp(score, tz=datetime.timezone.utc))
+            for user_id, score in locks
+        ]
+
+
+_task_lock_backend: Optional[TaskLockBackend] = None
+
+
+def get_task_lock_backend() -> TaskLockBackend:
+    """Backend of settings.TASK_LOCK_BACKEND, it's created and checked for availability once per process.
+    There is no fallback to another backend: locks set in one store would be invisible to the other one
+    and tasks would be given out twice
+    """
+    global _task_lock_backend
+    if _task_lock_backend is None:
+        backend = load_func(settings.TASK_LOCK_BACKEND)()
+        if not backend.is_available():
+            raise LabelStudioError(f'Task lock backend {settings.TASK_LOCK_BACKEND} is not available')
+        _task_lock_backend = backend
+    return _task_lock_backend
+
+
+@receiver(setting_changed)
+def reset_task_lock_backend(setting, **kwargs):
+    global _task_lock_backend
+    if setting == 'TASK_LOCK_BACKEND':
+        _task_lock_backend = None
@@ -0,0 +1,34 @@
+import logging
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils.timezone import now
+from tasks.functions import reconcile_counters
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        'Repair drift of task annotation/prediction counters and project annotation counters, '
+        'run it periodically (e.g. from cron) with --updated-since-minutes'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--project', dest='projects', type=int, action='append', help='project id')
+        parser.add_argument(
+            '--updated-since-minutes',
+            dest='updated_since_minutes',
+            type=int,
+            default=None,
+            help='Check only tasks updated in the last N minutes',
+        )
+
+    def handle(self, *args, **options):
+        updated_since = None
+        if options['updated_since_minutes'] is not None:
+            updated_since = now() - timedelta(minutes=options['updated_since_minutes'])
+
+        logger.debug(f'Start counters reconciliation for projects={options["projects"]} since {updated_since}')
+        reconcile_counters(project_ids=options['projects'], updated_since=updated_since)
+        logger.debug('Counters reconciliation finished')
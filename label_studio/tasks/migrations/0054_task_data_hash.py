@@ -0,0 +1,65 @@
+# Generated by Django 5.1.15 on 2026-10-18 19:39
+
+import logging
+
+from core.redis import start_job_async_or_sync
+from django.db import migrations, models
+
+logger = logging.getLogger(__name__)
+
+INDEX = models.Index(fields=['project', 'data_hash'], name='task_project_078f2c_idx')
+
+
+def async_index_creation():
+    from django.db import connection
+
+    create_index_sql = (
+        'CREATE INDEX CONCURRENTLY IF NOT EXISTS task_project_078f2c_idx ON task (project_id, data_hash);'
+    )
+    with connection.schema_editor(atomic=False) as schema_editor:
+        schema_editor.execute(create_index_sql)
+        logger.info('Index on data_hash created concurrently on task model')
+
+
+def forwards(apps, schema_editor):
+    database_vendor = schema_editor.connection.vendor
+    if database_vendor != 'postgresql':
+        # other databases don't support concurrent index creation, the index is created as usual
+        schema_editor.add_index(apps.get_model('tasks', 'Task'), INDEX)
+        return
+
+    # Schedule the index creation job asynchronously using RQ worker, task table is not locked
+    start_job_async_or_sync(async_index_creation)
+
+
+def backwards(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        schema_editor.remove_index(apps.get_model('tasks', 'Task'), INDEX)
+        return
+    schema_editor.execute('DROP INDEX CONCURRENTLY IF EXISTS task_project_078f2c_idx;')
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ("tasks", "0053_annotation_bulk_created"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="task",
+            name="data_hash",
+            field=models.CharField(
+                default=None,
+                help_text="SHA-256 of task data with sorted keys, it is used to find duplicated tasks",
+                max_length=64,
+                null=True,
+                verbose_name="data hash",
+            ),
+        ),
+        migrations.SeparateDatabaseAndState(
+            state_operations=[migrations.AddIndex(model_name="task", index=INDEX)],
+            database_operations=[migrations.RunPython(forwards, backwards)],
+        ),
+    ]
@@ -10,6 +10,23 @@ class TaskMixin:
     def update_is_labeled(self, *args, **kwargs) -> None:
         self.is_labeled = self._get_is_labeled_value()
 
+    @classmethod
+    def get_labeled_tasks(cls, tasks, skip_queue):
+        """Set-based _get_is_labeled_value(): labeled tasks of the tasks queryset, used by bulk is_labeled updates.
+        Override it together with _get_is_labeled_value(), so both paths give the same is_labeled
+        """
+        from core.utils.db import SQCount
+        from django.db.models import F, OuterRef
+        from projects.models import Project
+        from tasks.models import Annotation, Q_finished_annotations
+
+        # completed annotations follow Task.completed_annotations
+        completed_annotations = Annotation.objects.filter(task=OuterRef('id'))
+        if skip_queue != Project.SkipQueue.IGNORE_SKIPPED:
+            completed_annotations = completed_annotations.filter(Q_finished_annotations)
+        completed_count = SQCount(completed_annotations.values('id'))
+        return tasks.annotate(completed_count=completed_count).filter(completed_count__gte=F('overlap'))
+
     @classmethod
     def post_process_bulk_update_stats(cls, tasks) -> None:
         pass
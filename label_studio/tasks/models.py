@@ -2,6 +2,7 @@
 """
 import base64
 import datetime
+import hashlib
 import logging
 import numbers
 import os
@@ -12,7 +13,6 @@ from typing import Any, Mapping, Optional, Union, cast
 from urllib.parse import urljoin
 
 import ujson as json
-from core.bulk_update_utils import bulk_update
 from core.current_request import get_current_request
 from core.feature_flags import flag_set
 from core.label_config import SINGLE_VALUED_TAGS
@@ -40,12 +40,18 @@ from django.utils.translation import gettext_lazy as _
 from label_studio_sdk.label_interface.objects import PredictionValue
 from rest_framework.exceptions import ValidationError
 from tasks.choices import ActionType
+from tasks.locks import get_task_lock_backend
 
 logger = logging.getLogger(__name__)
 
 TaskMixin = load_func(settings.TASK_MIXIN)
 
 
+def get_task_data_hash(data) -> str:
+    """Hash of task data with sorted keys, equal data gives the same hash regardless of the key order"""
+    return hashlib.sha256(json.dumps(data, sort_keys=True, ensure_ascii=False).encode()).hexdigest()
+
+
 class Task(TaskMixin, models.Model):
     """Business tasks from project"""
 
@@ -115,6 +121,13 @@ class Task(TaskMixin, models.Model):
         null=True,
         help_text='Internal task ID in the project, starts with 1',
     )
+    data_hash = models.CharField(
+        _('data hash'),
+        max_length=64,
+        null=True,
+        default=None,
+        help_text='SHA-256 of task data with sorted keys, it is used to find duplicated tasks',
+    )
     updates = ['is_labeled']
     total_annotations = models.IntegerField(
         _('total_annotations'),
@@ -174,6 +187,7 @@ class Task(TaskMixin, models.Model):
             models.Index(fields=['id', 'overlap']),
             models.Index(fields=['overlap']),
             models.Index(fields=['project', 'id']),
+            models.Index(fields=['project', 'data_hash']),
         ]
 
     @property
@@ -195,18 +209,9 @@ class Task(TaskMixin, models.Model):
     @classmethod
     def get_locked_by(cls, user, project=None, tasks=None):
         """Retrieve the task locked by specified user. Returns None if the specified user didn't lock anything."""
-        lock = None
-        if project is not None:
-            lock = fast_first(TaskLock.objects.filter(user=user, expire_at__gt=now(), task__project=project))
-        elif tasks is not None:
-            locked_task = fast_first(tasks.filter(locks__user=user, locks__expire_at__gt=now()))
-            if locked_task:
-                return locked_task
-        else:
+        if project is None and tasks is None:
             raise Exception('Neither project or tasks passed to get_locked_by')
-
-        if lock:
-            return lock.task
+        return get_task_lock_backend().get_locked_by(user, project=project, tasks=tasks)
 
     def get_predictions_for_prelabeling(self):
         """This is called to return either new predictions from the
@@ -287,7 +292,7 @@ class Task(TaskMixin, models.Model):
                 f'Num takes={num} > overlap={self.overlap} for task={self.id}, '
                 f"skipped mode {self.project.skip_queue} - it's a bug",
                 extra=dict(
-                    lock_ttl=self.locks.values_list('user', 'expire_at'),
+                    lock_ttl=get_task_lock_backend().get_locks(self),
                     num_locks=num_locks,
                     num_annotations=num_annotations,
                 ),
@@ -308,7 +313,7 @@ class Task(TaskMixin, models.Model):
 
     @property
     def num_locks(self):
-        return self.locks.filter(expire_at__gt=now()).count()
+        return get_task_lock_backend().num_locks(self)
 
     def overlap_with_agreement_threshold(self, num, num_locks):
         # Limit to one extra annotator at a time when the task is under the threshold and meets the overlap criteria,
@@ -334,7 +339,10 @@ class Task(TaskMixin, models.Model):
         return self.overlap
 
     def num_locks_user(self, user):
-        return self.locks.filter(expire_at__gt=now()).exclude(user=user).count()
+        return get_task_lock_backend().num_locks(self, exclude_user=user)
+
+    def get_lock_id(self, user):
+        return get_task_lock_backend().get_lock_id(self, user)
 
     def get_storage_filename(self):
         for link_name in settings.IO_STORAGES_IMPORT_LINK_NAMES:
@@ -348,7 +356,7 @@ class Task(TaskMixin, models.Model):
         return mixin_has_permission and self.project.has_permission(user)
 
     def clear_expired_locks(self):
-        self.locks.filter(expire_at__lt=now()).delete()
+        get_task_lock_backend().clear_expired_locks(self)
 
     def set_lock(self, user):
         """Lock current task by specified user. Lock lifetime is set by `expire_in_secs`"""
@@ -363,13 +371,7 @@ class Task(TaskMixin, models.Model):
             ):
                 lock_ttl = self.project.custom_task_lock_ttl
             expire_at = now() + datetime.timedelta(seconds=lock_ttl)
-            try:
-                task_lock = TaskLock.objects.get(task=self, user=user)
-            except TaskLock.DoesNotExist:
-                TaskLock.objects.create(task=self, user=user, expire_at=expire_at)
-            else:
-                task_lock.expire_at = expire_at
-                task_lock.save()
+            get_task_lock_backend().set_lock(self, user, expire_at)
             logger.log(
                 get_next_task_logging_level(user),
                 f'User={user} acquires a lock for the task={self} ttl: {lock_ttl}',
@@ -386,10 +388,7 @@ class Task(TaskMixin, models.Model):
         If user specified, it checks whether lock is released by the user who previously has locked that task
         """
 
-        if user is not None:
-            self.locks.filter(user=user).delete()
-        else:
-            self.locks.all().delete()
+        get_task_lock_backend().release_lock(self, user)
         self.clear_expired_locks()
 
     def get_storage_link(self):
@@ -410,6 +409,7 @@ class Task(TaskMixin, models.Model):
 
     def resolve_storage_uri(self, url) -> Optional[Mapping[str, Any]]:
         from io_storages.functions import get_storage_by_url
+        from io_storages.presign_cache import get_presigned_url
 
         storage = self.storage
         project = self.project
@@ -419,9 +419,11 @@ class Task(TaskMixin, models.Model):
             storage = get_storage_by_url(url, storage_objects)
 
         if storage:
+            http_url, max_age = get_presigned_url(storage, url)
             return {
-                'url': storage.generate_http_url(url),
+                'url': http_url,
                 'presign_ttl': storage.presign_ttl,
+                'max_age': max_age,
             }
 
     def resolve_uri(self, task_data, project):
@@ -528,6 +530,11 @@ class Task(TaskMixin, models.Model):
             if update_fields is not None:
                 update_fields = {'inner_id'}.union(update_fields)
 
+        if update_fields is None or 'data' in update_fields:
+            self.data_hash = get_task_data_hash(self.data)
+            if update_fields is not None:
+                update_fields = {'data_hash'}.union(update_fields)
+
         super().save(*args, update_fields=update_fields, **kwargs)
 
     @staticmethod
@@ -536,12 +543,16 @@ class Task(TaskMixin, models.Model):
         Delete Tasks queryset with switched off signals
         :param queryset: Tasks queryset
         """
+        from projects.functions.project_counters import mark_project_counters_stale
+
         signals = [
             (post_delete, update_all_task_states_after_deleting_task, Task),
             (pre_delete, remove_data_columns, Task),
         ]
+        project_ids = list(queryset.values_list('project_id', flat=True).distinct())
         with temporary_disconnect_list_signal(signals):
             queryset.delete()
+        mark_project_counters_stale(project_ids)
 
     @staticmethod
     def delete_tasks_without_signals_from_task_ids(task_ids):
@@ -774,20 +785,25 @@ class Annotation(AnnotationMixin, models.Model):
         return result
 
     def on_delete_update_counters(self):
+        from projects.functions.project_counters import mark_project_counters_stale
+
         task = self.task
         logger.debug(f'Start updating counters for task {task.id}.')
-        if self.was_cancelled:
-            cancelled = task.annotations.all().filter(was_cancelled=True).count()
-            Task.objects.filter(id=task.id).update(cancelled_annotations=cancelled)
-            logger.debug(f'On delete updated cancelled_annotations for task {task.id}')
-        else:
-            total = task.annotations.all().filter(was_cancelled=False).count()
-            Task.objects.filter(id=task.id).update(total_annotations=total)
-            logger.debug(f'On delete updated total_annotations for task {task.id}')
+        counter = 'cancelled_annotations' if self.was_cancelled else 'total_annotations'
+        Task.objects.filter(id=task.id).update(**{counter: F(counter) - 1})
+        update_project_annotation_count(task.project_id, -1)
+        mark_project_counters_stale([task.project_id])
+        task.refresh_from_db(fields=['total_annotations', 'cancelled_annotations'])
+        logger.debug(f'On delete updated {counter} for task {task.id}')
 
         logger.debug(f'Update task stats for task={task}')
         task.update_is_labeled()
         Task.objects.filter(id=task.id).update(is_labeled=task.is_labeled)
+        if not task.is_labeled:
+            from projects.functions.next_task_queue import invalidate_next_task_queue
+
+            # task goes back to the label stream
+            invalidate_next_task_queue(task.project_id)
 
         # remove annotation counters in project summary followed by deleting an annotation
         logger.debug('Remove annotation counters in project summary followed by deleting an annotation')
@@ -1259,6 +1275,54 @@ def update_project_summary_data_columns(sender, instance, created, update_fields
     instance.increase_project_summary_counters()
 
 
+@receiver(post_save, sender=Task)
+def update_project_counters_after_task_creation(sender, instance, created, **kwargs):
+    from projects.functions.project_counters import update_project_counters
+
+    if created:
+        update_project_counters(
+            instance.project_id, task_number=1, finished_task_number=int(bool(instance.is_labeled))
+        )
+
+
+@receiver(post_bulk_create, sender=Annotation)
+def mark_project_counters_stale_after_annotations_bulk_create(sender, objs, **kwargs):
+    from projects.functions.project_counters import mark_project_counters_stale
+
+    mark_project_counters_stale({annotation.project_id for annotation in objs})
+
+
+def update_project_counters_after_annotation_save(annotation, created, finished_tasks_delta):
+    from projects.functions.project_counters import update_project_counters
+
+    if not settings.PROJECT_COUNTERS_CACHE_ENABLED:
+        return
+    deltas = {'finished_task_number': finished_tasks_delta}
+    if created:
+        useful = not annotation.was_cancelled and not annotation.ground_truth and annotation.result is not None
+        deltas.update(
+            total_annotations_number=int(not annotation.was_cancelled),
+            skipped_annotations_number=int(annotation.was_cancelled),
+            ground_truth_number=int(annotation.ground_truth),
+            useful_annotation_number=int(useful),
+        )
+        if useful:
+            has_other_useful = (
+                Annotation.objects.filter(task_id=annotation.task_id, ground_truth=False)
+                .filter(Q_finished_annotations)
+                .exclude(id=annotation.id)
+                .exists()
+            )
+            deltas['num_tasks_with_annotations'] = int(not has_other_useful)
+    update_project_counters(annotation.project_id, **deltas)
+
+
+def update_project_annotation_count(project_id, delta):
+    from projects.models import Project
+
+    Project.objects.filter(id=project_id).update(annotation_count=F('annotation_count') + delta)
+
+
 @receiver(pre_save, sender=Annotation)
 def delete_project_summary_annotations_before_updating_annotation(sender, instance, **kwargs):
     """Before updating annotation fields - ensure previous info removed from project.summary"""
@@ -1269,54 +1333,71 @@ def delete_project_summary_annotations_before_updating_annotation(sender, instan
         return
     old_annotation.decrease_project_summary_counters()
 
+    if (old_annotation.was_cancelled, old_annotation.ground_truth, old_annotation.result is None) != (
+        instance.was_cancelled,
+        instance.ground_truth,
+        instance.result is None,
+    ):
+        # counters are rebuilt after the annotation is saved
+        instance._project_counters_stale = True
+
     # update task counters if annotation changes it's was_cancelled status
-    task = instance.task
     if old_annotation.was_cancelled != instance.was_cancelled:
-        if instance.was_cancelled:
-            task.cancelled_annotations = task.cancelled_annotations + 1
-            task.total_annotations = task.total_annotations - 1
-        else:
-            task.cancelled_annotations = task.cancelled_annotations - 1
-            task.total_annotations = task.total_annotations + 1
-        task.update_is_labeled()
-
-        Task.objects.filter(id=instance.task.id).update(
-            is_labeled=task.is_labeled,
-            total_annotations=task.total_annotations,
-            cancelled_annotations=task.cancelled_annotations,
+        delta = 1 if instance.was_cancelled else -1
+        Task.objects.filter(id=instance.task_id).update(
+            cancelled_annotations=F('cancelled_annotations') + delta,
+            total_annotations=F('total_annotations') - delta,
         )
 
 
 @receiver(post_save, sender=Annotation)
 def update_project_summary_annotations_and_is_labeled(sender, instance, created, **kwargs):
     """Update annotation counters in project summary"""
+    from projects.functions.project_counters import mark_project_counters_stale
+
     instance.increase_project_summary_counters()
 
+    # counters are changed atomically in the db, so concurrent saves don't need to recount annotations;
+    # was_cancelled changes of existing annotations are handled in the pre_save signal
+    task = instance.task
+    if created:
+        counter = 'cancelled_annotations' if instance.was_cancelled else 'total_annotations'
+        Task.objects.filter(id=task.id).update(**{counter: F(counter) + 1})
+        update_project_annotation_count(task.project_id, 1)
+
     # If annotation is changed, update task.is_labeled state
-    logger.debug(f'Update task stats for task={instance.task}')
-    if instance.was_cancelled:
-        instance.task.cancelled_annotations = instance.task.annotations.all().filter(was_cancelled=True).count()
-    else:
-        instance.task.total_annotations = instance.task.annotations.all().filter(was_cancelled=False).count()
-    instance.task.update_is_labeled()
-    instance.task.save(update_fields=['is_labeled', 'total_annotations', 'cancelled_annotations'])
-    logger.debug(f'Updated total_annotations and cancelled_annotations for {instance.task.id}.')
+    logger.debug(f'Update task stats for task={task}')
+    task.refresh_from_db(fields=['total_annotations', 'cancelled_annotations', 'is_labeled'])
+    was_labeled = task.is_labeled
+    task.update_is_labeled()
+    Task.objects.filter(id=task.id).update(is_labeled=task.is_labeled)
+    update_project_counters_after_annotation_save(instance, created, int(task.is_labeled) - int(was_labeled))
+    if getattr(instance, '_project_counters_stale', False):
+        mark_project_counters_stale([instance.project_id])
+        instance._project_counters_stale = False
+    logger.debug(f'Updated total_annotations and cancelled_annotations for {task.id}.')
 
 
 @receiver(pre_delete, sender=Prediction)
 def remove_predictions_from_project(sender, instance, **kwargs):
     """Remove predictions counters"""
-    instance.task.total_predictions = instance.task.predictions.all().count() - 1
-    instance.task.save(update_fields=['total_predictions'])
-    logger.debug(f'Updated total_predictions for {instance.task.id}.')
+    from projects.functions.project_counters import update_project_counters
+
+    Task.objects.filter(id=instance.task_id).update(total_predictions=F('total_predictions') - 1)
+    update_project_counters(instance.project_id, total_predictions_number=-1)
+    logger.debug(f'Updated total_predictions for {instance.task_id}.')
 
 
 @receiver(post_save, sender=Prediction)
-def save_predictions_to_project(sender, instance, **kwargs):
+def save_predictions_to_project(sender, instance, created, **kwargs):
     """Add predictions counters"""
-    instance.task.total_predictions = instance.task.predictions.all().count()
-    instance.task.save(update_fields=['total_predictions'])
-    logger.debug(f'Updated total_predictions for {instance.task.id}.')
+    from projects.functions.project_counters import update_project_counters
+
+    if not created:
+        return
+    Task.objects.filter(id=instance.task_id).update(total_predictions=F('total_predictions') + 1)
+    update_project_counters(instance.project_id, total_predictions_number=1)
+    logger.debug(f'Updated total_predictions for {instance.task_id}.')
 
 
 # =========== END OF PROJECT SUMMARY UPDATES ===========
@@ -1340,14 +1421,15 @@ def delete_draft(sender, instance, **kwargs):
 
 
 @receiver(post_save, sender=Annotation)
-def update_ml_backend(sender, instance, **kwargs):
-    if instance.ground_truth:
+def update_ml_backend(sender, instance, created, **kwargs):
+    if instance.ground_truth or not created:
         return
 
     project = instance.project
 
     if hasattr(project, 'ml_backends') and project.min_annotations_to_start_training:
-        annotation_count = Annotation.objects.filter(project=project).count()
+        # the counter is incremented by update_project_summary_annotations_and_is_labeled
+        annotation_count = type(project).objects.values_list('annotation_count', flat=True).get(id=project.id)
 
         # start training every N annotation
         if annotation_count % project.min_annotations_to_start_training == 0:
@@ -1355,6 +1437,14 @@ def update_ml_backend(sender, instance, **kwargs):
                 ml_backend.train()
 
 
+@receiver(post_save, sender=Annotation)
+def remove_labeled_task_from_next_task_queue(sender, instance, **kwargs):
+    from projects.functions.next_task_queue import remove_task_from_next_task_queue
+
+    if instance.task.is_labeled:
+        remove_task_from_next_task_queue(instance.task.project_id, instance.task_id)
+
+
 def update_task_stats(task, stats=('is_labeled',), save=True):
     """Update single task statistics:
         accuracy
@@ -1371,15 +1461,18 @@ def update_task_stats(task, stats=('is_labeled',), save=True):
         task.save()
 
 
-def bulk_update_stats_project_tasks(tasks, project=None):
+def bulk_update_stats_project_tasks(tasks, project=None, mark_counters_stale=True):
     """bulk Task update accuracy
        ex: after change settings
        apply several update queries size of batch
        on updated Task objects
        in single transaction as execute sql
     :param tasks:
+    :param mark_counters_stale: False if the caller has already marked cached project counters stale
     :return:
     """
+    from projects.functions.project_counters import mark_project_counters_stale
+
     # recalc accuracy
     if not tasks:
         # break if tasks is empty
@@ -1406,22 +1499,54 @@ def bulk_update_stats_project_tasks(tasks, project=None):
             tasks.update(is_labeled=Q(id__in=finished_tasks_ids))
 
         else:
-            # update objects without saving if we can't use overlap
-            for task in tasks:
-                update_task_stats(task, save=False)
             try:
-                # start update query batches
-                bulk_update(tasks, update_fields=['is_labeled'], batch_size=settings.BATCH_SIZE)
+                update_is_labeled_by_batches(tasks, project.skip_queue)
             except OperationalError:
                 logger.error('Operational error while updating tasks: {exc}', exc_info=True)
                 # try to update query batches one more time
                 start_job_async_or_sync(
-                    bulk_update,
+                    update_is_labeled_by_batches,
                     tasks,
+                    project.skip_queue,
                     in_seconds=settings.BATCH_JOB_RETRY_TIMEOUT,
-                    update_fields=['is_labeled'],
-                    batch_size=settings.BATCH_SIZE,
                 )
+    if mark_counters_stale:
+        mark_project_counters_stale([project.id])
+
+
+def update_is_labeled_by_batches(tasks, skip_queue, batch_size=None):
+    """Set is_labeled with one UPDATE per batch of task ids, only ids are loaded.
+    Labeled tasks are selected by Task.get_labeled_tasks(), the set-based rule of TaskMixin
+    """
+    batch_size = batch_size or settings.BATCH_SIZE
+
+    # keyset pagination over existing ids, sparse ids don't produce empty updates
+    task_ids = tasks.order_by('id').values_list('id', flat=True)
+    last_id = 0
+    while batch_ids := list(task_ids.filter(id__gt=last_id)[:batch_size]):
+        batch = Task.objects.filter(id__in=batch_ids)
+        finished_ids = Task.get_labeled_tasks(batch, skip_queue)
+        batch.update(is_labeled=Q(id__in=finished_ids.values('id')))
+        last_id = batch_ids[-1]
+
+
+def bulk_update_tasks_data(tasks, batch_size=1000):
+    """Save changed task.data of many tasks, bulk_update bypasses Task.save(), so data_hash is updated here"""
+    for task in tasks:
+        task.data_hash = get_task_data_hash(task.data)
+    Task.objects.bulk_update(tasks, fields=['data', 'data_hash'], batch_size=batch_size)
+
+
+def fill_tasks_data_hash(tasks, batch_size=None):
+    """Calculate data_hash of tasks created before the field was added, tasks are loaded by batches"""
+    batch_size = batch_size or settings.BATCH_SIZE
+    tasks = tasks.filter(data_hash__isnull=True).order_by('id')
+    last_id = 0
+    while batch := list(tasks.filter(id__gt=last_id).values_list('id', 'data')[:batch_size]):
+        Task.objects.bulk_update(
+            [Task(id=task_id, data_hash=get_task_data_hash(data)) for task_id, data in batch], ['data_hash']
+        )
+        last_id = batch[-1][0]
 
 
 Q_finished_annotations = Q(was_cancelled=False) & Q(result__isnull=False)
@@ -6,11 +6,11 @@ import ujson as json
 from core.feature_flags import flag_set
 from core.label_config import replace_task_data_undefined_with_config_field
 from core.utils.common import load_func, retry_database_locked
-from core.utils.db import fast_first
+from core.utils.db import copy_bulk_create, fast_first
 from django.conf import settings
 from django.db import IntegrityError, transaction
 from drf_yasg import openapi
-from projects.models import Project
+from projects.models import Project, ProjectImport
 from rest_flex_fields import FlexFieldsModelSerializer
 from rest_framework import generics, serializers
 from rest_framework.exceptions import ValidationError
@@ -18,8 +18,16 @@ from rest_framework.fields import SkipField
 from rest_framework.serializers import ModelSerializer
 from rest_framework.settings import api_settings
 from tasks.exceptions import AnnotationDuplicateError
-from tasks.models import Annotation, AnnotationDraft, Prediction, Task
-from tasks.validation import TaskValidator
+from tasks.models import (
+    Annotation,
+    AnnotationDraft,
+    Prediction,
+    Task,
+    bulk_update_stats_project_tasks,
+    fill_tasks_data_hash,
+    get_task_data_hash,
+)
+from tasks.validation import TaskValidator, get_task_data_validator
 from users.models import User
 from users.serializers import UserSerializer
 
@@ -138,6 +146,30 @@ class AnnotationSerializer(FlexFieldsModelSerializer):
         expandable_fields = {'completed_by': (CompletedByDMSerializer,)}
 
 
+class AnnotationBulkItemSerializer(serializers.Serializer):
+    task = serializers.IntegerField(help_text='Task ID')
+    result = AnnotationResultField(help_text='Labeling result in JSON format')
+    was_cancelled = serializers.BooleanField(default=False, help_text='User skipped the task')
+    lead_time = serializers.FloatField(required=False, allow_null=True, help_text='Time in seconds to annotate')
+
+    def validate_result(self, value):
+        if not isinstance(value, list):
+            raise ValidationError('annotation "result" field in annotation must be list')
+        return value
+
+
+class AnnotationBulkCreateSerializer(serializers.Serializer):
+    project = serializers.IntegerField(help_text='Project ID, all tasks must belong to this project')
+    annotations = AnnotationBulkItemSerializer(many=True, allow_empty=False)
+
+    def validate_annotations(self, value):
+        if len(value) > settings.ANNOTATIONS_BULK_CREATE_MAX_SIZE:
+            raise ValidationError(
+                f'Too many annotations: {len(value)}, maximum is {settings.ANNOTATIONS_BULK_CREATE_MAX_SIZE}'
+            )
+        return value
+
+
 class TaskSimpleSerializer(ModelSerializer):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -203,6 +235,9 @@ class BaseTaskSerializerBulk(serializers.ListSerializer):
     annotations = AnnotationSerializer(many=True, default=[], read_only=True)
     predictions = PredictionSerializer(many=True, default=[], read_only=True)
 
+    # tasks with these fields are validated by the child serializer one by one
+    NESTED_TASK_FIELDS = frozenset(['annotations', 'predictions', 'drafts'])
+
     @property
     def project(self):
         return self.context.get('project')
@@ -230,8 +265,11 @@ class BaseTaskSerializerBulk(serializers.ListSerializer):
                 raise SkipField()
             raise ValidationError({api_settings.NON_FIELD_ERRORS_KEY: 'empty'}, code='empty')
 
-        ret, errors = [], []
         self.annotation_count, self.prediction_count = 0, 0
+        if self._is_plain_data(data):
+            return self._validate_plain_data(data)
+
+        ret, errors = [], []
         for i, item in enumerate(data):
             try:
                 validated = self.child.validate(item)
@@ -257,6 +295,44 @@ class BaseTaskSerializerBulk(serializers.ListSerializer):
 
         return ret
 
+    def _is_plain_data(self, data):
+        """All items are {"data": {...}, "meta": ...} tasks without annotations and predictions,
+        and the child serializer validation is not customized
+        """
+        return (
+            self.project is not None
+            and type(self.child).validate is BaseTaskSerializer.validate
+            and all(
+                isinstance(item, dict)
+                and isinstance(item.get('data'), dict)
+                and isinstance(item.get('meta', {}), (dict, list))
+                and not self.NESTED_TASK_FIELDS.intersection(item)
+                for item in data
+            )
+        )
+
+    def _validate_plain_data(self, data):
+        """Fast path: check task data of the whole list with the compiled validator of the project,
+        errors are the same as TaskValidator.validate() produces
+        """
+        invalid = get_task_data_validator(self.project).check_batch([item['data'] for item in data])
+        if not invalid:
+            return data
+
+        errors = []
+        for i, item in enumerate(data):
+            if i not in invalid:
+                errors.append({})
+                continue
+            detail = ValidationError(invalid[i].detail[0] + ' [assume: item["data"] = task root with values]').detail
+            errors.append(self.format_error(i, detail, item))
+            # do not print to user too many errors
+            if len(errors) >= 100:
+                errors[99] = '...'
+                break
+        logger.warning("Can't deserialize tasks due to " + str(errors))
+        raise ValidationError(errors)
+
     @staticmethod
     def _insert_valid_completed_by(annotations, members_email_to_id, members_ids, default_user):
         """Insert the correct id for completed_by by email in annotations"""
@@ -349,6 +425,9 @@ class BaseTaskSerializerBulk(serializers.ListSerializer):
         user = self.context.get('user', None)
         default_user = user or self.project.created_by
         ff_user = self.project.organization.created_by
+        import_reviews_drafts = flag_set(
+            'fflag_feat_back_lsdv_5307_import_reviews_drafts_29062023_short', user=ff_user
+        )
 
         # get members from project, we need them to restore annotation.completed_by etc
         organization = self.project.organization
@@ -358,6 +437,7 @@ class BaseTaskSerializerBulk(serializers.ListSerializer):
 
         # to be sure we add tasks with annotations at the same time
         with transaction.atomic():
+            validated_tasks = self._apply_duplicates_mode(validated_tasks)
 
             # extract annotations, predictions, drafts, reviews, etc
             # all these lists will be grouped by tasks, e.g.:
@@ -367,14 +447,15 @@ class BaseTaskSerializerBulk(serializers.ListSerializer):
             for task in validated_tasks:
                 # extract annotations from snapshot
                 annotations = task.pop('annotations', [])
-                self._insert_valid_completed_by(annotations, members_email_to_id, members_ids, default_user)
+                if annotations:
+                    self._insert_valid_completed_by(annotations, members_email_to_id, members_ids, default_user)
                 task_annotations.append(annotations)
 
                 # extract predictions from snapshot
                 predictions = task.pop('predictions', [])
                 task_predictions.append(predictions)
 
-                if flag_set('fflag_feat_back_lsdv_5307_import_reviews_drafts_29062023_short', user=ff_user):
+                if import_reviews_drafts:
                     # extract drafts from snapshot
                     drafts = task.pop('drafts', [])
                     self._insert_valid_user_drafts(drafts, members_email_to_id, default_user)
@@ -389,12 +470,14 @@ class BaseTaskSerializerBulk(serializers.ListSerializer):
             db_tasks = self.add_tasks(task_annotations, task_predictions, validated_tasks)
             db_annotations = self.add_annotations(task_annotations, user)
             self.add_predictions(task_predictions)
+            if self.updated_tasks:
+                self.update_existing_tasks(self.updated_tasks)
 
         self.post_process_annotations(user, db_annotations, 'imported')
         self.post_process_tasks(self.project.id, [t.id for t in self.db_tasks])
         self.post_process_custom_callback(self.project.id, user)
 
-        if flag_set('fflag_feat_back_lsdv_5307_import_reviews_drafts_29062023_short', user=ff_user):
+        if import_reviews_drafts:
             with transaction.atomic():
                 # build mapping between new and old ids in annotations,
                 # we need it because annotation ids will be known only after saving to db
@@ -404,7 +487,46 @@ class BaseTaskSerializerBulk(serializers.ListSerializer):
                 self.add_drafts(task_drafts, db_tasks, annotation_mapping, self.project)
                 self.add_reviews(task_reviews, annotation_mapping, self.project)
 
-        return db_tasks
+        return self.created_tasks
+
+    def _apply_duplicates_mode(self, validated_tasks):
+        """Find existing project tasks with the same data by data_hash in one indexed query.
+        "skip" mode drops duplicated tasks, "update" mode makes add_tasks() reuse the existing tasks
+        """
+        for task in validated_tasks:
+            task['data_hash'] = get_task_data_hash(task['data'])
+        self.existing_tasks, self.skipped_count = {}, 0
+        self.duplicates = duplicates = self.context.get('duplicates') or ProjectImport.Duplicates.KEEP
+        if duplicates == ProjectImport.Duplicates.KEEP:
+            return validated_tasks
+
+        project_tasks = Task.objects.filter(project=self.project)
+        fill_tasks_data_hash(project_tasks)
+        hashes = {task['data_hash'] for task in validated_tasks}
+        for task in project_tasks.filter(data_hash__in=hashes).order_by('-id'):
+            self.existing_tasks[task.data_hash] = task
+        if duplicates == ProjectImport.Duplicates.UPDATE:
+            return validated_tasks
+
+        unique_tasks, seen = [], set(self.existing_tasks)
+        for task in validated_tasks:
+            if task['data_hash'] not in seen:
+                seen.add(task['data_hash'])
+                unique_tasks.append(task)
+        self.skipped_count = len(validated_tasks) - len(unique_tasks)
+        self.existing_tasks = {}
+        logger.info(f'{self.skipped_count} duplicated tasks are skipped in project {self.project.id}')
+        return unique_tasks
+
+    def update_existing_tasks(self, tasks):
+        """Save meta of updated tasks and recalculate their counters after new annotations and predictions"""
+        from tasks.functions import update_tasks_counters
+
+        Task.objects.bulk_update(tasks, ['meta'], batch_size=settings.BATCH_SIZE)
+        queryset = Task.objects.filter(id__in=[task.id for task in tasks])
+        update_tasks_counters(queryset)
+        bulk_update_stats_project_tasks(queryset, project=self.project)
+        logger.info(f'{len(tasks)} duplicated tasks are updated in project {self.project.id}')
 
     def add_predictions(self, task_predictions):
         """Save predictions to DB and set the latest model version in the project"""
@@ -441,7 +563,7 @@ class BaseTaskSerializerBulk(serializers.ListSerializer):
                 )
 
         # predictions: DB bulk create
-        self.db_predictions = Prediction.objects.bulk_create(db_predictions, batch_size=settings.BATCH_SIZE)
+        self.db_predictions = copy_bulk_create(Prediction, db_predictions, batch_size=settings.BATCH_SIZE)
         logging.info(f'Predictions serialization success, len = {len(self.db_predictions)}')
 
         # renew project model version if it's empty
@@ -512,7 +634,10 @@ class BaseTaskSerializerBulk(serializers.ListSerializer):
                 db_annotations.append(Annotation(**body))
 
         # annotations: DB bulk create
-        if settings.DJANGO_DB == settings.DJANGO_DB_SQLITE:
+        if not db_annotations:
+            # plain data tasks, no need to query the last annotation id
+            self.db_annotations = []
+        elif settings.DJANGO_DB == settings.DJANGO_DB_SQLITE:
             self.db_annotations = []
             try:
                 last_annotation = Annotation.objects.latest('id')
@@ -525,15 +650,20 @@ class BaseTaskSerializerBulk(serializers.ListSerializer):
                 current_id += 1
             self.db_annotations = Annotation.objects.bulk_create(db_annotations, batch_size=settings.BATCH_SIZE)
         else:
-            self.db_annotations = Annotation.objects.bulk_create(db_annotations, batch_size=settings.BATCH_SIZE)
+            self.db_annotations = copy_bulk_create(Annotation, db_annotations, batch_size=settings.BATCH_SIZE)
         logging.info(f'Annotations serialization success, len = {len(self.db_annotations)}')
 
         return self.db_annotations
 
     def add_tasks(self, task_annotations, task_predictions, validated_tasks):
-        """Extract tasks from validated_tasks and store them in DB"""
+        """Extract tasks from validated_tasks and store them in DB.
+        Tasks with data_hash found in self.existing_tasks are not created, the existing tasks are used instead
+        """
         db_tasks = []
         max_overlap = self.project.maximum_annotations
+        existing_tasks = getattr(self, 'existing_tasks', {})
+        merge_duplicates = getattr(self, 'duplicates', None) == ProjectImport.Duplicates.UPDATE
+        self.created_tasks, updated_tasks = [], {}
 
         # Acquire a lock on the project to ensure atomicity when calculating inner_id
         project = Project.objects.select_for_update().get(id=self.project.id)
@@ -543,6 +673,16 @@ class BaseTaskSerializerBulk(serializers.ListSerializer):
         max_inner_id = (prev_inner_id + 1) if prev_inner_id else 1
 
         for i, task in enumerate(validated_tasks):
+            data_hash = task.get('data_hash') or get_task_data_hash(task['data'])
+            existing_task = existing_tasks.get(data_hash)
+            if existing_task is not None:
+                if 'meta' in task:
+                    existing_task.meta = task['meta']
+                if existing_task.id is not None:
+                    updated_tasks[existing_task.id] = existing_task
+                db_tasks.append(existing_task)
+                continue
+
             cancelled_annotations = len([ann for ann in task_annotations[i] if ann.get('was_cancelled', False)])
             total_annotations = len(task_annotations[i]) - cancelled_annotations
             t = Task(
@@ -552,30 +692,36 @@ class BaseTaskSerializerBulk(serializers.ListSerializer):
                 overlap=max_overlap,
                 is_labeled=len(task_annotations[i]) >= max_overlap,
                 file_upload_id=task.get('file_upload_id'),
-                inner_id=None if prev_inner_id is None else max_inner_id + i,
+                inner_id=None if prev_inner_id is None else max_inner_id + len(self.created_tasks),
                 total_predictions=len(task_predictions[i]),
                 total_annotations=total_annotations,
                 cancelled_annotations=cancelled_annotations,
+                data_hash=data_hash,
             )
+            # in "update" mode the next tasks with the same data in this list update the created task
+            if merge_duplicates:
+                existing_tasks[data_hash] = t
             db_tasks.append(t)
+            self.created_tasks.append(t)
+        self.updated_tasks = list(updated_tasks.values())
 
         # get task ids
         if settings.DJANGO_DB == settings.DJANGO_DB_SQLITE:
-            self.db_tasks = []
             try:
                 last_task = Task.objects.latest('id')
                 current_id = last_task.id + 1
             except Task.DoesNotExist:
                 current_id = 1
 
-            for task in db_tasks:
+            for task in self.created_tasks:
                 task.id = current_id
                 current_id += 1
-            self.db_tasks = Task.objects.bulk_create(db_tasks, batch_size=settings.BATCH_SIZE)
+            Task.objects.bulk_create(self.created_tasks, batch_size=settings.BATCH_SIZE)
         else:
-            self.db_tasks = Task.objects.bulk_create(db_tasks, batch_size=settings.BATCH_SIZE)
+            copy_bulk_create(Task, self.created_tasks, batch_size=settings.BATCH_SIZE)
+        self.db_tasks = db_tasks
 
-        logging.info(f'Tasks serialization success, len = {len(self.db_tasks)}')
+        logging.info(f'Tasks serialization success, len = {len(self.created_tasks)}')
 
         return db_tasks
 
@@ -695,9 +841,7 @@ class NextTaskSerializer(TaskWithAnnotationsAndPredictionsAndDraftsSerializer):
 
     def get_unique_lock_id(self, task):
         user = self.context['request'].user
-        lock = task.locks.filter(user=user).first()
-        if lock:
-            return lock.unique_id
+        return task.get_lock_id(user)
 
     def get_predictions(self, task):
         predictions = task.get_predictions_for_prelabeling()
@@ -24,6 +24,7 @@ _api_urlpatterns = [
 ]
 
 _api_annotations_urlpatterns = [
+    path('bulk/', api.AnnotationBulkCreateAPI.as_view(), name='annotation-bulk-create'),
     path('<int:pk>/', api.AnnotationAPI.as_view(), name='annotation-detail'),
     path('<int:pk>/convert-to-draft', api.AnnotationConvertAPI.as_view(), name='annotation-convert-to-draft'),
 ]
@@ -6,7 +6,7 @@ from operator import getitem
 from urllib.parse import urlparse
 
 import ujson as json
-from core.label_config import replace_task_data_undefined_with_config_field
+from django.conf import settings
 from rest_framework.exceptions import ValidationError
 
 
@@ -37,35 +37,44 @@ _DATA_TYPES = {
     'Taxonomy': [str, list, type(None)],
     'Ranker': [list, str],
 }
-logger = logging.getLogger(__name__)
 
 
-class TaskValidator:
-    """Task Validator with project scheme configs validation. It is equal to TaskSerializer from django backend."""
+def get_data_type_classes(data_type):
+    """Python types accepted in task data by the object tag"""
+    return tuple(_DATA_TYPES.get(data_type, (str,)))
 
-    def __init__(self, project, instance=None):
-        self.project = project
-        self.instance = instance
-        self.annotation_count = 0
-        self.prediction_count = 0
 
-    @staticmethod
-    def check_data(project, data):
-        """Validate data from task['data']"""
-        if data is None:
-            raise ValidationError('Task is empty (None)')
+logger = logging.getLogger(__name__)
 
-        replace_task_data_undefined_with_config_field(data, project)
 
-        # iterate over data types from project
-        for data_key, data_type in project.data_types.items():
+class TaskDataValidator:
+    """Project data types compiled once into the list of key lookups and type checks"""
 
+    def __init__(self, data_types, label_config_hash=None):
+        self.label_config_hash = label_config_hash
+        self.data_types = tuple(data_types.items())
+        self.first_key = next(iter(data_types), None)
+        self.checks = []
+        for data_key, data_type in data_types.items():
             # get array name in case of Repeater tag
             is_array = '[' in data_key
             data_key = data_key.split('[')[0]
+            keys = tuple(data_key.split('.')) if '.' in data_key else None
+            expected_types = (list,) if is_array else get_data_type_classes(data_type)
+            self.checks.append((data_key, keys, data_type, expected_types))
+
+    def check(self, data):
+        """Validate data from task['data'], $undefined$ key is renamed to the first key of the config"""
+        if data is None:
+            raise ValidationError('Task is empty (None)')
+
+        undefined = settings.DATA_UNDEFINED_NAME
+        if self.first_key is not None and undefined in data:
+            data[self.first_key] = data[undefined]
+            del data[undefined]
 
-            if '.' in data_key:
-                keys = data_key.split('.')
+        for data_key, keys, data_type, expected_types in self.checks:
+            if keys is not None:
                 try:
                     data_item = reduce(getitem, keys, data)
                 except KeyError:
@@ -75,12 +84,7 @@ class TaskValidator:
                     raise ValidationError('"{data_key}" key is expected in task data'.format(data_key=data_key))
                 data_item = data[data_key]
 
-            if is_array:
-                expected_types = (list,)
-            else:
-                expected_types = _DATA_TYPES.get(data_type, (str,))
-
-            if not isinstance(data_item, tuple(expected_types)):
+            if not isinstance(data_item, expected_types):
                 raise ValidationError(
                     "data['{data_key}']={data_value} is of type '{type}', "
                     'but the object tag {data_type} expects the following types: {expected_types}'.format(
@@ -94,6 +98,46 @@ class TaskValidator:
 
         return data
 
+    def check_batch(self, data_items):
+        """Validate the list of task data, return {item index: ValidationError} for invalid items"""
+        errors = {}
+        for i, data in enumerate(data_items):
+            try:
+                self.check(data)
+            except ValidationError as exc:
+                errors[i] = exc
+        return errors
+
+
+def get_task_data_validator(project):
+    """Compiled validator is cached on the project instance until the label config is changed.
+    label_config_hash covers control tags only, so data types of object tags are compared too
+    """
+    validator = getattr(project, '_task_data_validator', None)
+    if (
+        validator is None
+        or validator.label_config_hash != project.label_config_hash
+        or validator.data_types != tuple(project.data_types.items())
+    ):
+        validator = TaskDataValidator(project.data_types, project.label_config_hash)
+        project._task_data_validator = validator
+    return validator
+
+
+class TaskValidator:
+    """Task Validator with project scheme configs validation. It is equal to TaskSerializer from django backend."""
+
+    def __init__(self, project, instance=None):
+        self.project = project
+        self.instance = instance
+        self.annotation_count = 0
+        self.prediction_count = 0
+
+    @staticmethod
+    def check_data(project, data):
+        """Validate data from task['data']"""
+        return get_task_data_validator(project).check(data)
+
     @staticmethod
     def check_data_and_root(project, data, dict_is_root=False):
         """Check data consistent and data is dict with task or dict['task'] is task
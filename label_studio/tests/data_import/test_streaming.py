@@ -0,0 +1,240 @@
+import io
+import json
+from datetime import timedelta
+from unittest import mock
+
+import pytest
+from data_import.functions import async_import_background
+from data_import.models import FileUpload
+from data_import.streaming import iter_batches, iter_csv, iter_json, iter_jsonl
+from data_import.uploader import create_file_upload
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import override_settings
+from django.utils.timezone import now
+from projects.models import ProjectImport
+from rest_framework.exceptions import ValidationError
+from tests.utils import make_project
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.mark.parametrize('chunk_size', [1, 3, 7, 1024])
+@pytest.mark.parametrize(
+    'value',
+    [
+        [],
+        [{'data': {'text': 'a , ] [ " \\" ü'}}, {'text': 'b', 'n': [1, 2.5e3, None, True]}],
+        [123456, -7.25, 'str', False, {'nested': {'deep': [[], {}]}}],
+        {'data': {'text': 'single task'}},
+    ],
+)
+def test_iter_json(value, chunk_size):
+    content = '﻿ ' + json.dumps(value, ensure_ascii=False, indent=1) + '\n'
+    result = list(iter_json(io.BytesIO(content.encode()), chunk_size=chunk_size))
+    assert result == (value if isinstance(value, list) else [value])
+
+
+@pytest.mark.parametrize('content', ['[{"a": 1} {"b": 2}]', '[{"a": 1},', '[1] 2', '{"a": 1}}'])
+def test_iter_json_errors(content):
+    with pytest.raises(ValueError):
+        list(iter_json(io.BytesIO(content.encode()), chunk_size=2))
+
+
+def test_iter_json_error_is_raised_without_reading_file():
+    file = io.BytesIO(('[{"a": 1}, {"a" 2}' + ', {"b": 1}' * 10000 + ']').encode())
+    with mock.patch.object(file, 'read', wraps=file.read) as read:
+        with pytest.raises(ValueError, match="Expecting ':' delimiter"):
+            list(iter_json(file, chunk_size=16))
+    assert read.call_count < 10
+
+
+def test_iter_jsonl_and_batches():
+    content = b'{"text": "a"}\n\n{"text": "b"}\r\n{"text": "c"}'
+    tasks = iter_jsonl(io.BytesIO(content), chunk_size=4)
+    assert list(iter_batches(tasks, 2)) == [[{'text': 'a'}, {'text': 'b'}], [{'text': 'c'}]]
+
+    with pytest.raises(ValueError, match='Line 2'):
+        list(iter_jsonl(io.BytesIO(b'{"text": "a"}\n{"text"\n')))
+
+
+@pytest.mark.parametrize('chunk_size', [1, 5, 1024])
+def test_iter_csv(chunk_size):
+    content = (
+        '\ufeffid,text,score,flag,,text\r\n'
+        '1,"multi\nline, ""quoted""",2.5,True,x,dup\r\n'
+        '\r\n'
+        '007,NaN,1e3,no\n'
+        '1_000,plain,-3,false,,last'
+    )
+    rows = list(iter_csv(io.BytesIO(content.encode()), chunk_size=chunk_size, converters={'flag': str}))
+    assert rows == [
+        {'id': '1', 'text': 'multi\nline, "quoted"', 'score': 2.5, 'flag': 'True', 'Unnamed: 4': 'x', 'text.1': 'dup'},
+        {'id': '007', 'text': '', 'score': 1000.0, 'flag': 'no', 'Unnamed: 4': '', 'text.1': ''},
+        {'id': '1_000', 'text': 'plain', 'score': -3.0, 'flag': 'false', 'Unnamed: 4': '', 'text.1': 'last'},
+    ]
+
+    with pytest.raises(ValueError, match='Expected 2 fields in line 3'):
+        list(iter_csv(io.BytesIO(b'a\tb\n1\t2\n1\t2\t3\n'), sep='\t'))
+    with pytest.raises(ValueError, match='No columns'):
+        list(iter_csv(io.BytesIO(b'\n\n')))
+
+
+def test_iter_csv_infers_types_by_columns():
+    content = 'zip,code,count,ratio,flag,mixed\n02134,02134,1,1,true,1\nSW1A 1AA,10001,,2.5,False,yes\n'
+    rows = list(iter_csv(io.BytesIO(content.encode()), chunk_size=4))
+    # like in pandas: a column with a non-numeric cell is kept as strings, numeric columns are numbers
+    assert rows == [
+        {'zip': '02134', 'code': 2134, 'count': 1, 'ratio': 1.0, 'flag': True, 'mixed': '1'},
+        {'zip': 'SW1A 1AA', 'code': 10001, 'count': '', 'ratio': 2.5, 'flag': False, 'mixed': 'yes'},
+    ]
+
+    # not seekable files are converted cell by cell
+    file = io.BytesIO(content.encode())
+    with mock.patch.object(file, 'seekable', return_value=False):
+        assert next(iter_csv(file))['zip'] == 2134
+
+
+def test_csv_columns_typed_by_label_config(business_client):
+    user = business_client.user
+    label_config = '<View><HyperText name="html" value="$html"/><Text name="text" value="$text"/></View>'
+    project = make_project({'label_config': label_config}, user, use_ml_backend=False)
+    content = 'html,text,other\n12,34,5.5\n'
+    file_upload = create_file_upload(user, project, SimpleUploadedFile('tasks.csv', content.encode()))
+
+    assert file_upload.read_tasks() == [{'data': {'html': '12', 'text': 34, 'other': 5.5}}]
+
+
+@override_settings(IMPORT_PARSE_PROCESSES=3)
+def test_load_tasks_from_files_in_process_pool(business_client):
+    user = business_client.user
+    project = make_project({}, user, use_ml_backend=False)
+    contents = [
+        ('a.json', json.dumps([{'text': 'a1'}, {'text': 'a2'}])),
+        ('b.csv', 'text\nb1\n'),
+        ('c.jsonl', json.dumps({'text': 'c1'})),
+        ('d.tsv', 'text\tn\nd1\t1\nd2\t2'),
+    ]
+    file_uploads = [
+        create_file_upload(user, project, SimpleUploadedFile(name, content.encode())) for name, content in contents
+    ]
+
+    tasks, formats, data_keys = FileUpload.load_tasks_from_uploaded_files(project, [f.id for f in file_uploads])
+    assert [(task['data'], task['file_upload_id']) for task in tasks] == [
+        ({'text': 'a1'}, file_uploads[0].id),
+        ({'text': 'a2'}, file_uploads[0].id),
+        ({'text': 'b1'}, file_uploads[1].id),
+        ({'text': 'c1'}, file_uploads[2].id),
+        ({'text': 'd1', 'n': 1}, file_uploads[3].id),
+        ({'text': 'd2', 'n': 2}, file_uploads[3].id),
+    ]
+    assert formats == {'.json': 1, '.csv': 1, '.jsonl': 1, '.tsv': 1}
+    assert data_keys == {'text'}
+
+    broken = create_file_upload(user, project, SimpleUploadedFile('broken.json', b'[{"text": '))
+    with pytest.raises(ValidationError, match='broken.json: Expecting value'):
+        FileUpload.load_tasks_from_uploaded_files(project, [file_uploads[0].id, broken.id])
+
+
+@override_settings(IMPORT_BATCH_SIZE=2, IMPORT_STREAMING_CHUNK_SIZE=16)
+def test_async_import_from_jsonl_by_batches(business_client):
+    user = business_client.user
+    configured_project = make_project({}, user, use_ml_backend=False)
+    tasks_before = configured_project.tasks.count()
+    content = '\n'.join(json.dumps({'data': {'text': f'text {i}'}}) for i in range(5))
+    file_upload = create_file_upload(user, configured_project, SimpleUploadedFile('tasks.jsonl', content.encode()))
+    project_import = ProjectImport.objects.create(
+        project=configured_project, file_upload_ids=[file_upload.id], commit_to_project=True, return_task_ids=True
+    )
+
+    async_import_background(project_import.id, user.id)
+
+    project_import.refresh_from_db()
+    assert project_import.status == ProjectImport.Status.COMPLETED
+    assert project_import.task_count == 5
+    assert project_import.found_formats == {'.jsonl': 1}
+    assert project_import.data_columns == ['text']
+    assert len(project_import.task_ids) == 5
+    assert configured_project.tasks.count() == tasks_before + 5
+    assert sorted(
+        configured_project.tasks.filter(id__in=project_import.task_ids).values_list('data__text', flat=True)
+    ) == [f'text {i}' for i in range(5)]
+
+
+@override_settings(IMPORT_BATCH_SIZE=2)
+def test_async_import_resumes_after_failure(business_client):
+    user = business_client.user
+    project = make_project({}, user, use_ml_backend=False)
+    content = json.dumps([{'data': {'text': f'text {i}'}} for i in range(5)])
+    file_upload = create_file_upload(user, project, SimpleUploadedFile('tasks.json', content.encode()))
+    project_import = ProjectImport.objects.create(
+        project=project, file_upload_ids=[file_upload.id], commit_to_project=True, return_task_ids=True
+    )
+
+    # worker dies after the second batch: committed batches are saved with the import progress
+    with mock.patch(
+        'data_import.functions.emit_webhooks_for_instance', side_effect=[None, Exception('worker is killed')]
+    ):
+        with pytest.raises(Exception, match='worker is killed'):
+            async_import_background(project_import.id, user.id)
+    project_import.refresh_from_db()
+    assert (project_import.processed_count, project_import.task_count) == (4, 4)
+    assert len(project_import.task_ids) == 4
+    ProjectImport.objects.filter(id=project_import.id).update(status=ProjectImport.Status.FAILED)
+
+    # only the rest of the file is imported
+    call_command('resume_import', '--import', str(project_import.id), '--user', str(user.id))
+    project_import.refresh_from_db()
+    assert project_import.status == ProjectImport.Status.COMPLETED
+    assert (project_import.processed_count, project_import.task_count) == (5, 5)
+    assert sorted(project.tasks.values_list('data__text', flat=True)) == [f'text {i}' for i in range(5)]
+    assert sorted(project_import.task_ids) == sorted(project.tasks.values_list('id', flat=True))
+
+
+@override_settings(IMPORT_BATCH_SIZE=2, TASKS_MAX_NUMBER=4)
+def test_async_import_checks_max_task_number_before_first_batch(business_client):
+    user = business_client.user
+    project = make_project({}, user, use_ml_backend=False)
+    content = '\n'.join(json.dumps({'text': f'text {i}'}) for i in range(5))
+    file_upload = create_file_upload(user, project, SimpleUploadedFile('tasks.jsonl', content.encode()))
+    project_import = ProjectImport.objects.create(
+        project=project, file_upload_ids=[file_upload.id], commit_to_project=True
+    )
+
+    with pytest.raises(ValidationError, match='Maximum task number is 4'):
+        async_import_background(project_import.id, user.id)
+    assert project.tasks.count() == 0
+
+
+def test_resume_import_skips_running_imports(business_client):
+    user = business_client.user
+    project = make_project({}, user, use_ml_backend=False)
+    content = json.dumps([{'data': {'text': f'text {i}'}} for i in range(3)])
+    file_upload = create_file_upload(user, project, SimpleUploadedFile('tasks.json', content.encode()))
+    project_import = ProjectImport.objects.create(
+        project=project,
+        file_upload_ids=[file_upload.id],
+        commit_to_project=True,
+        status=ProjectImport.Status.IN_PROGRESS,
+    )
+
+    # recently updated import can be still running on a worker
+    call_command('resume_import')
+    project_import.refresh_from_db()
+    assert project_import.status == ProjectImport.Status.IN_PROGRESS
+    assert project.tasks.count() == 0
+
+    # import with a queued or running job is skipped even if it's stale
+    ProjectImport.objects.filter(id=project_import.id).update(updated_at=now() - timedelta(hours=1))
+    with mock.patch(
+        'data_import.management.commands.resume_import.is_import_job_alive', return_value=True
+    ) as is_import_job_alive:
+        call_command('resume_import')
+    is_import_job_alive.assert_called_once_with(project_import.id)
+    assert project.tasks.count() == 0
+
+    # interrupted import is resumed
+    call_command('resume_import', '--stale-minutes', '30')
+    project_import.refresh_from_db()
+    assert project_import.status == ProjectImport.Status.COMPLETED
+    assert project.tasks.count() == 3
@@ -1,3 +1,4 @@
+import io
 from unittest import mock
 from unittest.mock import Mock
 
@@ -132,3 +133,23 @@ class TestTasksFileChecks:
             check_tasks_max_file_size(value)
 
         assert f'Maximum total size of all files is {settings.TASKS_MAX_FILE_SIZE} bytes' in str(e.value)
+
+
+def test_upload_files_in_batch(business_client, configured_project, settings):
+    from data_import.models import FileUpload
+
+    settings.TASKS_MAX_FILE_SIZE = 100
+    url = f'/api/projects/{configured_project.id}/file-uploads'
+    task_count = configured_project.tasks.count()
+
+    r = business_client.post(url, {'a.json': io.BytesIO(b'[{"text": "a"}]'), 'b.csv': io.BytesIO(b'text\nb\n')})
+    assert r.status_code == 201, r.content
+    assert r.json()['could_be_tasks_list'] is True
+    file_uploads = FileUpload.objects.filter(id__in=r.json()['file_upload_ids'], project=configured_project)
+    assert sorted(file_upload.format for file_upload in file_uploads) == ['.csv', '.json']
+    assert configured_project.tasks.count() == task_count
+
+    # too large upload is rejected while the request body is received
+    r = business_client.post(url, {'c.json': io.BytesIO(b'[' + b'{"text": "c"},' * 10 + b'{"text": "c"}]')})
+    assert r.status_code == 400
+    assert 'Maximum total size of all files is 100 bytes' in str(r.content)
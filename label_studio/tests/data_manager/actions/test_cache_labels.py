@@ -4,7 +4,7 @@ import pytest
 from data_manager.actions.cache_labels import cache_labels_job
 from django.contrib.auth import get_user_model
 from projects.models import Project
-from tasks.models import Annotation, Prediction, Task
+from tasks.models import Annotation, Prediction, Task, get_task_data_hash
 
 
 @pytest.mark.django_db
@@ -64,6 +64,8 @@ def test_cache_labels_job(source, control_tag, with_counters, expected_cache_col
         assert cache_column in task.data
         cached_labels = task.data[cache_column]
         assert cached_labels is not None
+        # data_hash follows the changed data, so duplicates are found by the actual data
+        assert task.data_hash == get_task_data_hash(task.data)
 
         # Verify the contents of the cached labels
         if use_predictions:
@@ -17,6 +17,7 @@ from io_storages.localfiles.models import (
 from io_storages.redis.models import RedisImportStorage, RedisImportStorageLink
 from io_storages.s3.models import S3ImportStorage, S3ImportStorageLink
 from projects.models import Project
+from tasks.models import Task
 
 from ..utils import make_annotation, make_prediction, make_task, project_id  # noqa
 
@@ -210,6 +211,25 @@ def test_action_remove_duplicates_with_annotations(business_client, project_id):
     assert task2.annotations.filter(was_cancelled=True).count() == 1, 'was_cancelled counter wrong'
 
 
+@pytest.mark.django_db
+def test_action_remove_duplicates_by_data_hash(business_client, project_id):
+    project = Project.objects.get(pk=project_id)
+    task1 = make_task({'data': {'image': 'a.jpg', 'text': 'a'}}, project)
+    make_task({'data': {'text': 'a', 'image': 'a.jpg'}}, project)
+    task3 = make_task({'data': {'image': 'b.jpg', 'text': 'a'}}, project)
+    # tasks created before data_hash was added
+    Task.objects.filter(project=project).exclude(id=task1.id).update(data_hash=None)
+
+    status = business_client.post(
+        f'/api/dm/actions?project={project_id}&id=remove_duplicates',
+        json={'selectedItems': {'all': True, 'excluded': []}},
+    )
+
+    assert status.status_code == 200
+    assert list(project.tasks.order_by('id').values_list('id', flat=True)) == [task1.id, task3.id]
+    assert not project.tasks.filter(data_hash__isnull=True).exists()
+
+
 @pytest.mark.django_db
 def test_action_cache_labels(business_client, project_id):
     """This test checks that the "cache_labels" action works correctly
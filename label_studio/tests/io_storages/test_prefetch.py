@@ -0,0 +1,60 @@
+import threading
+import time
+
+import pytest
+from io_storages.utils import iter_prefetched
+
+
+def test_iter_prefetched_keeps_keys_order():
+    def fetch(key):
+        return key.upper(), 1
+
+    keys = [f'key{i}' for i in range(20)]
+    assert list(iter_prefetched(keys, fetch, concurrency=4, max_inflight_bytes=100)) == [
+        (key, key.upper()) for key in keys
+    ]
+    assert list(iter_prefetched(keys, fetch, concurrency=1, max_inflight_bytes=100)) == [
+        (key, key.upper()) for key in keys
+    ]
+
+
+@pytest.mark.parametrize('max_inflight_bytes, fetched_count', [(30, 8), (1000, 9)])
+def test_iter_prefetched_limits_inflight_bytes(max_inflight_bytes, fetched_count):
+    fetched = []
+    lock = threading.Lock()
+    release = threading.Event()
+
+    def fetch(key):
+        if key:
+            release.wait()
+        with lock:
+            fetched.append(key)
+        return key, 10
+
+    items = iter_prefetched(range(100), fetch, concurrency=4, max_inflight_bytes=max_inflight_bytes)
+    assert next(items) == (0, 0)
+    # 2 * concurrency keys are read ahead at first
+    release.set()
+    for _ in range(100):
+        if len(fetched) == 8:
+            break
+        time.sleep(0.01)
+    assert len(fetched) == 8
+
+    # fetched objects take more bytes than the limit, so no new keys are read
+    assert next(items) == (1, 1)
+    time.sleep(0.05)
+    assert len(fetched) == fetched_count
+    items.close()
+
+
+def test_iter_prefetched_raises_errors_in_order():
+    def fetch(key):
+        if key == 3:
+            raise ValueError(f'Error loading {key}')
+        return key, 1
+
+    items = iter_prefetched(range(10), fetch, concurrency=4, max_inflight_bytes=100)
+    assert [next(items) for _ in range(3)] == [(0, 0), (1, 1), (2, 2)]
+    with pytest.raises(ValueError, match='Error loading 3'):
+        next(items)
@@ -1,13 +1,15 @@
 """This file and its contents are licensed under the Apache License 2.0. Please see the included NOTICE for copyright information and LICENSE for a copy of the license.
 """
 import json
+from unittest import mock
 
 import pytest
 import requests_mock
 from django.apps import apps
+from django.core.management import call_command
 from django.urls import reverse
 from projects.models import Project
-from tasks.models import Annotation, Task
+from tasks.models import Annotation, AnnotationDraft, Task, update_is_labeled_by_batches
 
 from .utils import _client_is_annotator, invite_client_to_project
 
@@ -271,3 +273,142 @@ def test_accuracy_on_delete(business_client, project_with_max_annotations_2, ann
 #     if apps.is_installed('businesses'):
 #         assert task.accuracy is None
 #     assert not task.is_labeled
+
+
+@pytest.mark.django_db
+def test_annotation_counters_and_reconciliation(business_client, configured_project, annotations):
+    task_id = next(iter(annotations.values()))['task']
+    for annotation in annotations.values():
+        r = business_client.post(reverse('tasks:api:task-annotations', kwargs={'pk': task_id}), data=annotation)
+        assert r.status_code == 201
+
+    annotation = Annotation.objects.filter(task_id=task_id).first()
+    annotation.was_cancelled = True
+    annotation.save()
+
+    task = Task.objects.get(id=task_id)
+    assert (task.total_annotations, task.cancelled_annotations) == (len(annotations) - 1, 1)
+    configured_project.refresh_from_db()
+    assert configured_project.annotation_count == len(annotations)
+
+    annotation.delete()
+    task.refresh_from_db()
+    assert (task.total_annotations, task.cancelled_annotations) == (len(annotations) - 1, 0)
+
+    # counters drift is repaired by the reconciliation job
+    Task.objects.filter(id=task_id).update(total_annotations=100, total_predictions=5)
+    Project.objects.filter(id=configured_project.id).update(annotation_count=0)
+    call_command('reconcile_counters', '--project', str(configured_project.id))
+    task.refresh_from_db()
+    assert (task.total_annotations, task.cancelled_annotations, task.total_predictions) == (
+        len(annotations) - 1,
+        0,
+        task.predictions.count(),
+    )
+    configured_project.refresh_from_db()
+    assert configured_project.annotation_count == len(annotations) - 1
+
+
+@pytest.mark.django_db
+def test_bulk_create_annotations(business_client, configured_project):
+    task_ids = list(configured_project.tasks.order_by('id').values_list('id', flat=True))
+    result = [{'from_name': 'text_class', 'to_name': 'text', 'type': 'choices', 'value': {'choices': ['class_A']}}]
+    user = business_client.user
+    # task without annotations keeps its draft
+    other_task = Task.objects.create(project=configured_project, data={'text': 'text C'})
+    drafts = [
+        AnnotationDraft.objects.create(task_id=task_id, user=user, result=result)
+        for task_id in task_ids[:2] + [other_task.id]
+    ]
+    payload = {
+        'project': configured_project.id,
+        'annotations': [
+            {'task': task_ids[0], 'result': result, 'lead_time': 1.5},
+            {'task': task_ids[0], 'result': [], 'was_cancelled': True},
+            {'task': task_ids[1], 'result': result},
+        ],
+    }
+    r = business_client.post(
+        reverse('tasks:api-annotations:annotation-bulk-create'),
+        data=json.dumps(payload),
+        content_type='application/json',
+    )
+    assert r.status_code == 201, r.content
+    assert r.json()['count'] == 3
+    assert Annotation.objects.filter(id__in=r.json()['annotation_ids'], completed_by=business_client.user).count() == 3
+
+    tasks = {task.id: task for task in Task.objects.filter(id__in=task_ids)}
+    assert (tasks[task_ids[0]].total_annotations, tasks[task_ids[0]].cancelled_annotations) == (1, 1)
+    assert (tasks[task_ids[1]].total_annotations, tasks[task_ids[1]].cancelled_annotations) == (1, 0)
+    assert all(task.is_labeled for task in tasks.values())
+    configured_project.refresh_from_db()
+    assert configured_project.annotation_count == 3
+    configured_project.summary.fold_deltas()
+    assert configured_project.summary.created_labels == {'text_class': {'class_A': 2}}
+    # drafts of the user are removed from annotated tasks only
+    assert list(AnnotationDraft.objects.filter(user=user).values_list('id', flat=True)) == [drafts[2].id]
+
+    # tasks from other projects are rejected
+    payload['annotations'] = [{'task': 0, 'result': result}]
+    r = business_client.post(
+        reverse('tasks:api-annotations:annotation-bulk-create'),
+        data=json.dumps(payload),
+        content_type='application/json',
+    )
+    assert r.status_code == 400
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    'skip_queue, expected_labeled',
+    [
+        (Project.SkipQueue.REQUEUE_FOR_ME, [False, True, False]),
+        (Project.SkipQueue.REQUEUE_FOR_OTHERS, [False, True, False]),
+        (Project.SkipQueue.IGNORE_SKIPPED, [True, True, False]),
+    ],
+)
+def test_update_is_labeled_by_batches(
+    business_client, configured_project, skip_queue, expected_labeled, django_assert_max_num_queries
+):
+    tasks = [Task.objects.create(project=configured_project, data={'text': 'text'}) for _ in range(3)]
+    # sparse ids don't produce updates of empty id ranges
+    tasks.append(Task.objects.create(id=tasks[-1].id + 1000, project=configured_project, data={'text': 'text'}))
+    expected_labeled = expected_labeled + [False]
+    result = [{'from_name': 'text_class', 'to_name': 'text', 'type': 'choices', 'value': {'choices': ['class_A']}}]
+    user = business_client.user
+    Annotation.objects.create(task=tasks[0], project=configured_project, completed_by=user, was_cancelled=True)
+    Annotation.objects.create(task=tasks[1], project=configured_project, completed_by=user, result=result)
+    Task.objects.filter(id=tasks[2].id).update(overlap=2)
+    Annotation.objects.create(task=tasks[2], project=configured_project, completed_by=user, result=result)
+    # stale values are overwritten
+    Task.objects.filter(id=tasks[0].id).update(is_labeled=not expected_labeled[0])
+    Task.objects.filter(id=tasks[1].id).update(is_labeled=False)
+    Task.objects.filter(id=tasks[2].id).update(is_labeled=True)
+
+    # select of ids and update per task, one select to stop
+    with django_assert_max_num_queries(2 * len(tasks) + 1):
+        update_is_labeled_by_batches(Task.objects.filter(project=configured_project), skip_queue, batch_size=1)
+    assert [Task.objects.get(id=t.id).is_labeled for t in tasks] == expected_labeled
+
+    # the per task rule of TaskMixin gives the same values
+    configured_project.skip_queue = skip_queue
+    labeled = []
+    for task in tasks:
+        task.project = configured_project
+        task.update_is_labeled()
+        labeled.append(task.is_labeled)
+    assert labeled == expected_labeled
+
+
+@pytest.mark.django_db
+def test_update_is_labeled_by_batches_uses_task_mixin_rule(configured_project):
+    task_ids = list(configured_project.tasks.order_by('id').values_list('id', flat=True))
+
+    # TASK_MIXIN overrides the set-based rule
+    def get_labeled_tasks(cls, tasks, skip_queue):
+        return tasks.filter(id=task_ids[0])
+
+    with mock.patch.object(Task, 'get_labeled_tasks', classmethod(get_labeled_tasks)):
+        update_is_labeled_by_batches(configured_project.tasks.all(), Project.SkipQueue.REQUEUE_FOR_OTHERS)
+    labeled = list(configured_project.tasks.order_by('id').values_list('is_labeled', flat=True))
+    assert labeled == [True] + [False] * (len(task_ids) - 1)
@@ -40,3 +40,68 @@ def test_has_lock(business_client):
     task.refresh_from_db()
 
     assert task.is_labeled is True
+
+
+@pytest.mark.parametrize('backend', ['tasks.locks.DatabaseTaskLockBackend', 'tasks.locks.RedisTaskLockBackend'])
+@pytest.mark.django_db
+def test_task_lock_backends(business_client, backend):
+    from django.test import override_settings
+    from fakeredis import FakeRedis
+    from mock import patch
+    from projects.functions.next_task import _get_first_unlocked
+    from tasks.locks import get_task_lock_backend
+    from tasks.models import Task
+    from users.models import User
+
+    project = make_project({'maximum_annotations': 2}, business_client.user, use_ml_backend=False)
+    task = Task.objects.create(project=project, data={'text': 'text A'}, overlap=2)
+    other_task = Task.objects.create(project=project, data={'text': 'text B'}, overlap=2)
+    user = business_client.user
+    other = User.objects.create(email='other@testtasklockbackends.com')
+
+    with override_settings(TASK_LOCK_BACKEND=backend), patch('tasks.locks.get_redis_client', return_value=FakeRedis()):
+        # one backend per process, redis isn't pinged for every lock operation
+        assert get_task_lock_backend() is get_task_lock_backend()
+        task.set_lock(user)
+        task.set_lock(other)
+        assert task.num_locks == 2
+        assert task.num_locks_user(user) == 1
+        assert task.get_lock_id(user) is not None
+        assert task.get_lock_id(user) != task.get_lock_id(other)
+        assert {user_id for user_id, _ in get_task_lock_backend().get_locks(task)} == {user.id, other.id}
+        assert Task.get_locked_by(user, project=project) == task
+        assert Task.get_locked_by(user, tasks=project.tasks.exclude(id=task.id)) is None
+        assert not task.has_lock(user)
+
+        # both overlap slots are taken
+        third = User.objects.create(email='third@testtasklockbackends.com')
+        assert task.has_lock(third)
+        assert _get_first_unlocked(project.tasks.all(), third) == other_task
+
+        task.release_lock(user)
+        assert task.num_locks == 1
+        assert task.get_lock_id(user) is None
+        assert Task.get_locked_by(user, project=project) is None
+
+        task.release_lock()
+        assert task.num_locks == 0
+        assert Task.get_locked_by(other, project=project) is None
+
+
+@pytest.mark.django_db
+def test_task_lock_backend_unavailable(business_client):
+    from core.utils.exceptions import LabelStudioError
+    from django.test import override_settings
+    from mock import patch
+    from tasks.models import Task
+
+    project = make_project({}, business_client.user, use_ml_backend=False)
+    task = Task.objects.create(project=project, data={'text': 'text A'})
+
+    # locks aren't silently moved to the database when redis is down
+    with override_settings(TASK_LOCK_BACKEND='tasks.locks.RedisTaskLockBackend'), patch(
+        'tasks.locks.get_redis_client', return_value=None
+    ):
+        with pytest.raises(LabelStudioError, match='not available'):
+            task.set_lock(business_client.user)
+    assert not task.locks.exists()
@@ -1,4 +1,7 @@
 import json
+import os
+import time
+from unittest import mock
 
 import pytest
 from tests.utils import make_project
@@ -30,3 +33,206 @@ def test_gcs_storage_credentials_validation(business_client):
         'Google Application Credentials must be valid JSON string.'
         in r.json()['validation_errors']['non_field_errors'][0]
     )
+
+
+@pytest.mark.django_db
+def test_local_storage_sync_by_pages(settings, tmp_path, configured_project):
+    from io_storages.localfiles.models import LocalFilesImportStorage, LocalFilesImportStorageLink
+    from tasks.models import Annotation, Prediction
+
+    settings.STORAGE_SYNC_BATCH_SIZE = 2
+    settings.WEBHOOK_BATCH_SIZE = 3
+    settings.STORAGE_SYNC_INCREMENTAL = False
+    project = configured_project
+    result = [{'from_name': 'text_class', 'to_name': 'text', 'type': 'choices', 'value': {'choices': ['class_A']}}]
+    for i in range(5):
+        (tmp_path / f'{i}.json').write_text(json.dumps({'text': f'text {i}', 'meta_info': 'storage'}))
+    (tmp_path / '5.json').write_text(
+        json.dumps(
+            {
+                'data': {'text': 'text 5', 'meta_info': 'storage'},
+                'predictions': [{'result': result, 'score': 0.5}],
+                'annotations': [{'result': result}],
+            }
+        )
+    )
+
+    storage = LocalFilesImportStorage.objects.create(project=project, path=str(tmp_path))
+    # the task of the first file was synced before
+    existing_task = project.tasks.first()
+    LocalFilesImportStorageLink.objects.create(task=existing_task, key=str(tmp_path / '0.json'), storage=storage)
+
+    text_columns = project.summary.all_data_columns.get('text', 0)
+    storage.info_set_queued()
+    with mock.patch('io_storages.base_models.emit_webhooks_for_instance') as emit_webhooks:
+        storage.scan_and_create_links()
+
+    storage.refresh_from_db()
+    assert storage.status == storage.Status.COMPLETED
+    assert storage.last_sync_count == 5
+    assert storage.meta['tasks_existed'] == 1
+    # webhooks are sent by WEBHOOK_BATCH_SIZE tasks as before
+    assert [len(call.args[3]) for call in emit_webhooks.call_args_list] == [3, 2]
+
+    links = LocalFilesImportStorageLink.objects.filter(storage=storage).exclude(task=existing_task)
+    tasks = project.tasks.filter(id__in=links.values('task_id')).order_by('inner_id')
+    assert [task.data['text'] for task in tasks] == [f'text {i}' for i in range(1, 6)]
+    inner_ids = [task.inner_id for task in tasks]
+    assert inner_ids == list(range(inner_ids[0], inner_ids[0] + 5))
+    assert all(task.data_hash for task in tasks)
+
+    task = tasks.last()
+    assert Prediction.objects.get(task=task).score == 0.5
+    annotation = Annotation.objects.get(task=task)
+    assert annotation.result_count == 1
+    assert task.total_predictions == 1 and task.total_annotations == 1 and task.is_labeled
+    project.summary.fold_deltas()
+    project.summary.refresh_from_db()
+    assert project.summary.all_data_columns['text'] == text_columns + 5
+    assert project.summary.created_annotations == {'text_class|text|choices': 1}
+
+    # the second sync finds all keys
+    storage.info_set_queued()
+    storage.scan_and_create_links()
+    storage.refresh_from_db()
+    assert storage.last_sync_count == 0
+    assert storage.meta['tasks_existed'] == 6
+
+
+@pytest.mark.django_db
+def test_local_storage_incremental_sync(settings, tmp_path, configured_project):
+    from io_storages.localfiles.models import LocalFilesImportStorage
+
+    settings.STORAGE_SYNC_INCREMENTAL = True
+    for i, folder in enumerate(['a', 'b']):
+        (tmp_path / folder).mkdir()
+        (tmp_path / folder / f'{i}.json').write_text(json.dumps({'text': f'text {i}'}))
+
+    storage = LocalFilesImportStorage.objects.create(project=configured_project, path=str(tmp_path))
+    storage.sync()
+    storage.refresh_from_db()
+    assert storage.last_sync_count == 2
+    assert storage.sync_checkpoint['listing'] == [str(tmp_path), None]
+
+    assert storage.sync_checkpoint['dirs'] == ['.', 'a', 'b']
+
+    # folders weren't modified since the previous sync, except the folder with a new file
+    listed_at = time.time() + 60
+    storage.sync_checkpoint['listed_at'] = listed_at
+    storage.save(update_fields=['sync_checkpoint'])
+    (tmp_path / 'b' / '2.json').write_text(json.dumps({'text': 'text 2'}))
+    os.utime(tmp_path / 'b', (listed_at + 1, listed_at + 1))
+    # folder moved into the storage keeps old times of its subfolders, they are unknown to the previous sync
+    moved = tmp_path.parent / f'{tmp_path.name}-moved'
+    (moved / 'nested').mkdir(parents=True)
+    (moved / 'nested' / '3.json').write_text(json.dumps({'text': 'text 3'}))
+    os.utime(moved / 'nested', (0, 0))
+    moved.rename(tmp_path / 'c')
+    storage.sync()
+    storage.refresh_from_db()
+    assert storage.last_sync_count == 2
+    assert storage.meta['tasks_existed'] == 1
+    assert storage.sync_checkpoint['dirs'] == ['.', 'a', 'b', 'c', 'c/nested']
+
+    # full rescan lists all files
+    storage.sync(full_rescan=True)
+    storage.refresh_from_db()
+    assert storage.last_sync_count == 0
+    assert storage.meta['tasks_existed'] == 4
+
+
+@pytest.mark.django_db
+def test_gcs_storage_incremental_sync(settings, configured_project):
+    from io_storages.gcs.models import GCSImportStorage
+
+    settings.STORAGE_SYNC_INCREMENTAL = True
+    storage = GCSImportStorage.objects.create(project=configured_project, bucket='test-bucket', use_blob_urls=True)
+    storage.sync()
+    storage.refresh_from_db()
+    assert storage.last_sync_count == 3
+    assert storage.sync_checkpoint['last_key'] == 'ghi'
+
+    # only keys after the last synced key are listed
+    storage.sync()
+    storage.refresh_from_db()
+    assert storage.last_sync_count == 0
+    assert storage.meta['tasks_existed'] == 0
+
+    # the checkpoint is ignored when listing parameters are changed
+    storage.regex_filter = '.*'
+    storage.save()
+    storage.sync()
+    storage.refresh_from_db()
+    assert storage.meta['tasks_existed'] == 3
+
+
+@pytest.mark.django_db
+def test_local_storage_events_ingestion(settings, tmp_path, configured_project):
+    from fakeredis import FakeRedis
+    from io_storages.events import consume_storage_events, get_storage_event_source, publish_storage_events
+    from io_storages.localfiles.models import LocalFilesImportStorage, LocalFilesImportStorageLink
+
+    settings.STORAGE_EVENTS_IDLE_TIMEOUT = 0.1
+    for i in range(3):
+        (tmp_path / f'{i}.json').write_text(json.dumps({'text': f'text {i}'}))
+    (tmp_path / 'skipped.txt').write_text('text')
+    (tmp_path / 'broken.json').write_text('[')
+    storage = LocalFilesImportStorage.objects.create(
+        project=configured_project, path=str(tmp_path), regex_filter=r'.*\.json'
+    )
+
+    keys = [str(tmp_path / f'{i}.json') for i in range(3)]
+    with mock.patch('io_storages.events.get_redis_client', return_value=FakeRedis()), mock.patch(
+        'io_storages.events.start_events_consumer'
+    ) as start_events_consumer, mock.patch.object(
+        configured_project.__class__, 'update_tasks_states'
+    ) as update_tasks_states:
+        # keys not matching the storage filter and repeated events are skipped,
+        # a broken object is logged and acknowledged, so it doesn't block other events
+        broken = str(tmp_path / 'broken.json')
+        publish_storage_events(storage, [broken] + keys + [str(tmp_path / 'skipped.txt'), keys[0], '/other/3.json'])
+        start_events_consumer.assert_called_once_with(storage)
+
+        assert consume_storage_events(storage) == 3
+        assert get_storage_event_source().count(storage) == 0
+        # task states are updated once when the consumer stops, not per batch
+        update_tasks_states.assert_called_once()
+
+    links = LocalFilesImportStorageLink.objects.filter(storage=storage)
+    assert sorted(links.values_list('key', flat=True)) == keys
+    tasks = configured_project.tasks.filter(id__in=links.values('task_id'))
+    assert sorted(task.data['text'] for task in tasks) == [f'text {i}' for i in range(3)]
+
+
+@pytest.mark.django_db
+def test_local_storage_sync_api_full_rescan(settings, tmp_path, business_client, configured_project):
+    from io_storages.localfiles.models import LocalFilesImportStorage
+
+    settings.STORAGE_SYNC_INCREMENTAL = True
+    settings.LOCAL_FILES_SERVING_ENABLED = True
+    settings.LOCAL_FILES_DOCUMENT_ROOT = str(tmp_path)
+    files = tmp_path / 'files'
+    files.mkdir()
+    for i in range(2):
+        (files / f'{i}.json').write_text(json.dumps({'text': f'text {i}'}))
+    storage = LocalFilesImportStorage.objects.create(project=configured_project, path=str(files))
+
+    def sync(**data):
+        r = business_client.post(
+            f'/api/storages/localfiles/{storage.id}/sync', data=json.dumps(data), content_type='application/json'
+        )
+        assert r.status_code == 200, r.content
+        storage.refresh_from_db()
+
+    sync()
+    assert storage.last_sync_count == 2
+
+    # the folder isn't modified since the previous sync, so no files are listed
+    os.utime(files, (0, 0))
+    sync()
+    assert storage.last_sync_count == 0
+    assert storage.meta['tasks_existed'] == 0
+
+    sync(full_rescan=True)
+    assert storage.last_sync_count == 0
+    assert storage.meta['tasks_existed'] == 2
@@ -849,7 +849,7 @@ def test_breadth_first_with_label_race(configured_project, business_client):
 
 @pytest.mark.skipif(not redis_healthcheck(), reason='Multi user locks only supported with redis enabled')
 @pytest.mark.django_db
-def test_label_race_with_overlap(configured_project, business_client):
+def test_label_race_with_overlap(configured_project, business_client, django_capture_on_commit_callbacks):
     """
     2 annotators takes and finish annotations one by one
     depending on project settings overlap
@@ -896,12 +896,13 @@ def test_label_race_with_overlap(configured_project, business_client):
     )
     assert r.status_code == 201
 
-    # set overlap
-    r = business_client.patch(
-        f'/api/projects/{project.id}/',
-        data=json.dumps({'maximum_annotations': 2, 'overlap_cohort_percentage': 50, 'show_overlap_first': True}),
-        content_type='application/json',
-    )
+    # set overlap, tasks overlap is rearranged after the commit
+    with django_capture_on_commit_callbacks(execute=True):
+        r = business_client.patch(
+            f'/api/projects/{project.id}/',
+            data=json.dumps({'maximum_annotations': 2, 'overlap_cohort_percentage': 50, 'show_overlap_first': True}),
+            content_type='application/json',
+        )
     assert r.status_code == 200
 
     t = Task.objects.filter(project=project.id).filter(overlap=2)
@@ -948,7 +949,7 @@ def test_label_race_with_overlap(configured_project, business_client):
 
 @pytest.mark.skipif(not redis_healthcheck(), reason='Multi user locks only supported with redis enabled')
 @pytest.mark.django_db
-def test_label_w_drafts_race_with_overlap(configured_project, business_client):
+def test_label_w_drafts_race_with_overlap(configured_project, business_client, django_capture_on_commit_callbacks):
     """
     2 annotators takes and leaves with draft annotations one by one
     depending on project settings overlap
@@ -996,12 +997,13 @@ def test_label_w_drafts_race_with_overlap(configured_project, business_client):
     )
     assert r.status_code == 201
 
-    # set overlap
-    r = business_client.patch(
-        f'/api/projects/{project.id}/',
-        data=json.dumps({'maximum_annotations': 2, 'overlap_cohort_percentage': 50, 'show_overlap_first': True}),
-        content_type='application/json',
-    )
+    # set overlap, tasks overlap is rearranged after the commit
+    with django_capture_on_commit_callbacks(execute=True):
+        r = business_client.patch(
+            f'/api/projects/{project.id}/',
+            data=json.dumps({'maximum_annotations': 2, 'overlap_cohort_percentage': 50, 'show_overlap_first': True}),
+            content_type='application/json',
+        )
     assert r.status_code == 200
 
     t = Task.objects.filter(project=project.id).filter(overlap=2)
@@ -1243,7 +1245,7 @@ def test_with_bad_annotation_result(business_client):
 @pytest.mark.parametrize('setup_before_upload', (False, True))
 @pytest.mark.parametrize('show_overlap_first', (False, True))
 @pytest.mark.django_db
-def test_overlap_first(business_client, setup_before_upload, show_overlap_first):
+def test_overlap_first(business_client, setup_before_upload, show_overlap_first, django_capture_on_commit_callbacks):
     c = business_client
     config = dict(
         title='test_overlap_first',
@@ -1270,33 +1272,35 @@ def test_overlap_first(business_client, setup_before_upload, show_overlap_first)
     num_tasks = 1000
     overlap_cohort_percentage = 1
 
-    # set up tasks overlap
-    setup_after_upload = True
-    if setup_before_upload:
-        r = c.patch(
-            f'/api/projects/{project.id}/',
-            data=json.dumps({'maximum_annotations': 2, 'overlap_cohort_percentage': overlap_cohort_percentage}),
-            content_type='application/json',
+    # overlap is rearranged after the commit of each request
+    with django_capture_on_commit_callbacks(execute=True):
+        # set up tasks overlap
+        setup_after_upload = True
+        if setup_before_upload:
+            r = c.patch(
+                f'/api/projects/{project.id}/',
+                data=json.dumps({'maximum_annotations': 2, 'overlap_cohort_percentage': overlap_cohort_percentage}),
+                content_type='application/json',
+            )
+            assert r.status_code == 200
+            setup_after_upload = False
+
+        # create tasks
+        tasks = []
+        for i in range(num_tasks):
+            tasks.append({'data': {'text': f'this is {str(i)}'}})
+        r = business_client.post(
+            f'/api/projects/{project.id}/tasks/bulk/', data=json.dumps(tasks), content_type='application/json'
         )
-        assert r.status_code == 200
-        setup_after_upload = False
+        assert r.status_code == 201
 
-    # create tasks
-    tasks = []
-    for i in range(num_tasks):
-        tasks.append({'data': {'text': f'this is {str(i)}'}})
-    r = business_client.post(
-        f'/api/projects/{project.id}/tasks/bulk/', data=json.dumps(tasks), content_type='application/json'
-    )
-    assert r.status_code == 201
-
-    if setup_after_upload:
-        r = c.patch(
-            f'/api/projects/{project.id}/',
-            data=json.dumps({'maximum_annotations': 2, 'overlap_cohort_percentage': overlap_cohort_percentage}),
-            content_type='application/json',
-        )
-        assert r.status_code == 200
+        if setup_after_upload:
+            r = c.patch(
+                f'/api/projects/{project.id}/',
+                data=json.dumps({'maximum_annotations': 2, 'overlap_cohort_percentage': overlap_cohort_percentage}),
+                content_type='application/json',
+            )
+            assert r.status_code == 200
 
     expected_tasks_with_overlap = int(overlap_cohort_percentage / 100.0 * num_tasks)
 
@@ -1327,3 +1331,38 @@ def test_overlap_first(business_client, setup_before_upload, show_overlap_first)
     else:
         assert not all_tasks_with_overlap_are_labeled
         assert not all_tasks_without_overlap_are_not_labeled
+
+
+@pytest.mark.django_db
+def test_get_first_unlocked_checks_candidates_in_batches(business_client, django_assert_max_num_queries):
+    from projects.functions.next_task import _get_first_unlocked
+    from users.models import User
+
+    config = dict(
+        title='test_get_first_unlocked',
+        is_published=True,
+        label_config="""
+            <View>
+              <Text name="text" value="$text"></Text>
+              <Choices name="text_class" choice="single" toName="text">
+                <Choice value="class_A"></Choice>
+                <Choice value="class_B"></Choice>
+              </Choices>
+            </View>""",
+    )
+    project = make_project(config, business_client.user)
+    tasks = [make_task({'data': {'text': str(i)}}, project) for i in range(5)]
+    other = User.objects.create(email='other@testgetfirstunlocked.com')
+
+    # first tasks are taken by a collaborator: locked or already annotated
+    tasks[0].set_lock(other)
+    tasks[1].set_lock(other)
+    make_annotation({'result': [{'r': 1}], 'completed_by': other}, tasks[2].id)
+
+    with django_assert_max_num_queries(6):
+        next_task = _get_first_unlocked(project.tasks.all(), business_client.user)
+    assert next_task.id == tasks[3].id
+
+    # own lock doesn't prevent taking the task
+    tasks[3].set_lock(business_client.user)
+    assert _get_first_unlocked(project.tasks.all(), business_client.user).id == tasks[3].id
@@ -0,0 +1,73 @@
+"""This file and its contents are licensed under the Apache License 2.0. Please see the included NOTICE for copyright information and LICENSE for a copy of the license.
+"""
+import json
+from unittest import mock
+
+import pytest
+from django.test import override_settings
+from fakeredis import FakeRedis
+from projects.functions.next_task_queue import NEXT_TASK_QUEUE_KEY
+from projects.models import Project
+
+from .utils import make_annotator, make_project, make_task
+
+
+@pytest.fixture
+def next_task_queue_redis():
+    redis = FakeRedis()
+    with mock.patch('projects.functions.next_task_queue.get_redis_client', return_value=redis), mock.patch(
+        'projects.functions.next_task_queue.start_job_async_or_sync',
+        side_effect=lambda job, *args, **kwargs: job(*args),
+    ), override_settings(NEXT_TASK_QUEUE_ENABLED=True):
+        yield redis
+
+
+@pytest.mark.django_db
+def test_next_task_from_precomputed_queue(business_client, next_task_queue_redis):
+    config = dict(
+        title='test_next_task_queue',
+        is_published=True,
+        label_config="""
+            <View>
+              <Text name="text" value="$text"></Text>
+              <Choices name="text_class" choice="single" toName="text">
+                <Choice value="class_A"></Choice>
+                <Choice value="class_B"></Choice>
+              </Choices>
+            </View>""",
+    )
+    annotation_result = json.dumps(
+        [{'from_name': 'text_class', 'to_name': 'text', 'type': 'choices', 'value': {'choices': ['class_A']}}]
+    )
+    project = make_project(config, business_client.user)
+    project.sampling = Project.SEQUENCE
+    project.save()
+    id1 = make_task({'data': {'text': 'aaa'}}, project).id
+    id2 = make_task({'data': {'text': 'bbb'}}, project).id
+    ann1 = make_annotator({'email': 'ann1@testnexttaskqueue.com'}, project, True)
+    key = NEXT_TASK_QUEUE_KEY.format(project_id=project.id, sampling=project.sampling)
+
+    # queue is empty: it's scheduled for rebuilding and the regular query path is used
+    r = ann1.get(f'/api/projects/{project.id}/next')
+    assert r.status_code == 200
+    assert json.loads(r.content)['id'] == id1
+    assert 'Precomputed queue' not in json.loads(r.content)['queue']
+    assert [int(i) for i in next_task_queue_redis.lrange(key, 0, -1)] == [id1, id2]
+
+    # locked task is taken by the same user again
+    r = ann1.get(f'/api/projects/{project.id}/next')
+    assert json.loads(r.content)['id'] == id1
+
+    # labeled task leaves the queue
+    r = ann1.post(f'/api/tasks/{id1}/annotations/', data={'task': id1, 'result': annotation_result})
+    assert r.status_code == 201
+    assert [int(i) for i in next_task_queue_redis.lrange(key, 0, -1)] == [id2]
+
+    r = ann1.get(f'/api/projects/{project.id}/next')
+    assert r.status_code == 200
+    assert json.loads(r.content)['id'] == id2
+    assert 'Precomputed queue' in json.loads(r.content)['queue']
+
+    # project settings change invalidates the queue
+    project.save()
+    assert not next_task_queue_redis.exists(key)
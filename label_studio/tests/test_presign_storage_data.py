@@ -199,6 +199,30 @@ class TestTaskPresignStorageData:
         assert response.status_code == status.HTTP_303_SEE_OTHER
         assert response.url == 'https://presigned-url.com/fileuri'
 
+    def test_cacheable_response(self, view, task, project, user, monkeypatch):
+        task.resolve_storage_uri.return_value = dict(
+            url='https://presigned-url.com/fileuri',
+            presign_ttl=60,
+            max_age=1200,
+        )
+        task.has_permission.return_value = True
+        task.project = project
+
+        obj = MagicMock()
+        obj.get = MagicMock(return_value=task)
+        monkeypatch.setattr('tasks.models.Task.objects', obj)
+
+        request = APIRequestFactory().get(
+            reverse('data_import:task-storage-data-presign', kwargs={'task_id': 1}) + '?fileuri=fileuri'
+        )
+        request.user = user
+        force_authenticate(request, user)
+
+        response = view(request, task_id=1)
+
+        assert response.status_code == status.HTTP_303_SEE_OTHER
+        assert response.headers['Cache-Control'] == 'private, max-age=1200'
+
 
 @pytest.mark.django_db
 class TestProjectPresignStorageData:
@@ -380,3 +404,37 @@ class TestProjectPresignStorageData:
         # And that the response is correct
         assert response.status_code == status.HTTP_303_SEE_OTHER
         assert response.url == 'https://presigned-url.com/fileuri'
+
+
+def test_presigned_url_cache(settings):
+    from io_storages.presign_cache import get_presigned_url, presigned_url_cache
+    from io_storages.s3.models import S3ImportStorage
+
+    settings.PRESIGN_CACHE_REDIS = False
+    presigned_url_cache.clear()
+    storage = S3ImportStorage(pk=1, bucket='bucket', presign=True, presign_ttl=10)
+    storage.generate_http_url = MagicMock(side_effect=lambda uri: uri.replace('s3://', 'https://signed/'))
+
+    assert get_presigned_url(storage, 's3://bucket/1.jpg') == ('https://signed/bucket/1.jpg', 300)
+    url, max_age = get_presigned_url(storage, 's3://bucket/1.jpg')
+    assert url == 'https://signed/bucket/1.jpg' and 0 < max_age <= 300
+    assert storage.generate_http_url.call_count == 1
+
+    # urls of other storages are signed separately
+    other_storage = S3ImportStorage(pk=2, bucket='bucket', presign=True, presign_ttl=10)
+    other_storage.generate_http_url = MagicMock(return_value='https://signed/other')
+    assert get_presigned_url(other_storage, 's3://bucket/1.jpg') == ('https://signed/other', 300)
+
+    # urls signed with previous storage settings aren't reused after the storage is edited
+    storage.aws_access_key_id = 'new-key'
+    assert get_presigned_url(storage, 's3://bucket/1.jpg') == ('https://signed/bucket/1.jpg', 300)
+    assert storage.generate_http_url.call_count == 2
+    # sync state changes don't invalidate urls
+    storage.last_sync_count = 10
+    get_presigned_url(storage, 's3://bucket/1.jpg')
+    assert storage.generate_http_url.call_count == 2
+
+    # not presigned urls aren't cached
+    storage.presign = False
+    assert get_presigned_url(storage, 's3://bucket/1.jpg') == ('https://signed/bucket/1.jpg', 0)
+    assert storage.generate_http_url.call_count == 3
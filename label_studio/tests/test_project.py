@@ -1,8 +1,18 @@
 import json
 
 import pytest
+from django.core.management import call_command
 from django.db.models.query import QuerySet
-from tests.utils import make_project
+from django.test import override_settings
+from projects.functions.project_counters import mark_project_counters_stale
+from projects.functions.stream_history import (
+    add_stream_history,
+    fill_history_annotations,
+    get_label_stream_history,
+)
+from projects.models import LabelStreamHistoryItem, ProjectCounters, ProjectOverlapRearrange
+from tasks.models import Task
+from tests.utils import make_annotation, make_prediction, make_project, make_task
 from users.models import User
 
 
@@ -40,3 +50,138 @@ def test_project_all_members(business_client):
 
     assert isinstance(members, QuerySet)
     assert isinstance(members.first(), User)
+
+
+@pytest.mark.django_db
+@override_settings(PROJECT_COUNTERS_CACHE_ENABLED=True)
+def test_project_counters_cache(business_client):
+    project = make_project({}, business_client.user, use_ml_backend=False)
+    tasks = [make_task({'data': {'text': 'text A'}}, project), make_task({'data': {'text': 'text B'}}, project)]
+
+    def counts():
+        r = business_client.get(f'/api/projects/counts/?ids={project.id}')
+        assert r.status_code == 200
+        return r.json()['results'][0]
+
+    # counters are not built yet: live subqueries are used
+    assert counts()['task_number'] == 2
+    call_command('rebuild_project_counters', '--project', str(project.id))
+    counters = ProjectCounters.objects.get(project=project)
+    assert not counters.is_stale
+    assert (counters.task_number, counters.total_annotations_number) == (2, 0)
+
+    # counters are incremented by signals
+    make_task({'data': {'text': 'text C'}}, project)
+    make_annotation({'result': [{'r': 1}]}, tasks[0].id)
+    make_annotation({'result': [{'r': 2}], 'ground_truth': True}, tasks[0].id)
+    make_annotation({'result': [], 'was_cancelled': True}, tasks[1].id)
+    make_prediction({'result': []}, tasks[1].id)
+    counters.refresh_from_db()
+    expected = {
+        'task_number': 3,
+        'finished_task_number': 1,
+        'total_predictions_number': 1,
+        'total_annotations_number': 2,
+        'num_tasks_with_annotations': 1,
+        'useful_annotation_number': 1,
+        'ground_truth_number': 1,
+        'skipped_annotations_number': 1,
+    }
+    assert {field: getattr(counters, field) for field in expected} == expected
+    assert {field: counts()[field] for field in expected} == expected
+
+    # cached values are read in one join
+    ProjectCounters.objects.filter(project=project).update(task_number=100)
+    assert counts()['task_number'] == 100
+
+    # stale counters fall back to live subqueries, they match the incremental values
+    mark_project_counters_stale([project.id])
+    assert {field: counts()[field] for field in expected} == expected
+
+
+
+@pytest.mark.django_db
+@override_settings(PROJECT_COUNTERS_CACHE_ENABLED=True)
+def test_project_counters_rebuilt_after_bulk_delete(business_client, django_capture_on_commit_callbacks):
+    project = make_project({}, business_client.user, use_ml_backend=False)
+    tasks = [make_task({'data': {'text': f'text {i}'}}, project) for i in range(3)]
+    call_command('rebuild_project_counters', '--project', str(project.id))
+
+    # tasks without annotations are deleted, the rebuild must see the deleted rows
+    with django_capture_on_commit_callbacks(execute=True) as callbacks:
+        Task.delete_tasks_without_signals(Task.objects.filter(id__in=[tasks[0].id, tasks[1].id]))
+    assert callbacks
+    counters = ProjectCounters.objects.get(project=project)
+    assert not counters.is_stale
+    assert counters.task_number == 1
+
+
+@pytest.mark.django_db
+@override_settings(BATCH_SIZE=2, PROJECT_COUNTERS_CACHE_ENABLED=True)
+def test_rearrange_overlap_cohort_by_chunks(business_client, django_capture_on_commit_callbacks):
+    project = make_project({}, business_client.user, use_ml_backend=False)
+    tasks = [make_task({'data': {'text': f'text {i}'}}, project) for i in range(5)]
+    make_annotation({'result': [{'r': 1}]}, tasks[3].id)
+    make_annotation({'result': [{'r': 1}]}, tasks[3].id)
+    make_annotation({'result': [{'r': 1}]}, tasks[4].id)
+
+    def overlaps():
+        return list(project.tasks.order_by('id').values_list('overlap', flat=True))
+
+    call_command('rebuild_project_counters', '--project', str(project.id))
+    assert ProjectCounters.objects.get(project=project).finished_task_number == 2
+
+    # the job is started after the settings are committed
+    project.maximum_annotations = 2
+    project.overlap_cohort_percentage = 60
+    with django_capture_on_commit_callbacks(execute=True):
+        project.save()
+
+    # finished task first, then by annotations count and id
+    assert overlaps() == [2, 1, 1, 2, 2]
+    state = ProjectOverlapRearrange.objects.get(project=project)
+    assert (state.status, state.processed_count, state.progress) == (state.Status.COMPLETED, 5, 1.0)
+    assert list(project.tasks.order_by('id').values_list('is_labeled', flat=True)) == [False] * 3 + [True, False]
+    # cached counters are rebuilt after the last chunk
+    counters = ProjectCounters.objects.get(project=project)
+    assert (counters.is_stale, counters.finished_task_number) == (False, 1)
+
+    # interrupted job continues from the last processed task
+    project.tasks.update(overlap=5)
+    state.status = state.Status.IN_PROGRESS
+    state.last_task_id = tasks[1].id
+    state.save()
+    with django_capture_on_commit_callbacks(execute=True):
+        call_command('resume_overlap_rearrange', '--project', str(project.id))
+    assert overlaps() == [5, 5, 1, 2, 2]
+    state.refresh_from_db()
+    assert state.status == state.Status.COMPLETED
+
+
+@pytest.mark.django_db
+def test_label_stream_history_items(business_client, django_assert_num_queries):
+    project = make_project({}, business_client.user, use_ml_backend=False)
+    tasks = [make_task({'data': {'text': f'text {i}'}}, project) for i in range(4)]
+    user = business_client.user
+
+    with override_settings(LABEL_STREAM_HISTORY_LIMIT=2):
+        for task in tasks[:3] + [tasks[2]]:
+            # insert and trim, doesn't depend on history length
+            with django_assert_num_queries(2):
+                add_stream_history(task, user, project)
+        annotation = make_annotation({'result': [{'r': 1}]}, tasks[2].id)
+        fill_history_annotations(user, project, [annotation])
+
+    r = business_client.get(f'/api/projects/{project.id}/label-stream-history/')
+    assert r.status_code == 200
+    assert r.json() == [
+        {'taskId': tasks[1].id, 'annotationId': None},
+        {'taskId': tasks[2].id, 'annotationId': annotation.id},
+    ]
+
+    annotation.delete()
+    tasks[1].delete()
+    assert get_label_stream_history(user, project) == [{'taskId': tasks[2].id, 'annotationId': None}]
+    assert list(LabelStreamHistoryItem.objects.filter(user=user).values_list('task_id', 'annotation_id')) == [
+        (tasks[2].id, None)
+    ]
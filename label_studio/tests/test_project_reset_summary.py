@@ -1,6 +1,7 @@
 import json
 
 import pytest
+from django.test import override_settings
 from tasks.models import Task
 from tests.conftest import project_choices
 from tests.utils import make_project
@@ -146,3 +147,61 @@ def test_logged_out_user_cannot_reset_summary(business_client):
     assert r.status_code == 401
     assert 'detail' in (r_json := r.json())
     assert r_json['detail'] == 'Authentication credentials were not provided.'
+
+
+def test_summary_counters_are_folded_from_deltas(business_client):
+    project = make_project(project_choices(), business_client.user, use_ml_backend=False)
+    r = business_client.post(
+        f'/api/projects/{project.id}/import',
+        data=json.dumps([{'data': {'image': f'{name}.jpg'}} for name in ['kittens', 'puppies', 'ducklings']]),
+        content_type='application/json',
+    )
+    assert r.status_code == 201
+
+    annotation_ids = []
+    for task, label in zip(Task.objects.filter(project=project).order_by('id'), ['Opossum', 'Mouse', 'Mouse']):
+        r = business_client.post(
+            f'/api/tasks/{task.id}/annotations',
+            data=json.dumps(
+                {'result': [{'from_name': 'some', 'to_name': 'x', 'type': 'none', 'value': {'none': [label]}}]}
+            ),
+            content_type='application/json',
+        )
+        assert r.status_code == 201
+        annotation_ids.append(r.json()['id'])
+
+    # annotation saves don't touch the summary row
+    s = project.summary
+    s.refresh_from_db()
+    assert s.created_annotations == {}
+    assert project.summary_deltas.count() == 3
+
+    r = business_client.get(f'/api/projects/{project.id}/summary/')
+    assert r.status_code == 200
+    assert r.json()['created_annotations'] == {'some|x|none': 3}
+    assert r.json()['created_labels'] == {'some': {'Opossum': 1, 'Mouse': 2}}
+    assert project.summary_deltas.count() == 0
+
+    r = business_client.delete(f'/api/annotations/{annotation_ids[1]}')
+    assert r.status_code == 204
+    r = business_client.get(f'/api/projects/{project.id}/summary/')
+    assert r.json()['created_annotations'] == {'some|x|none': 2}
+    assert r.json()['created_labels'] == {'some': {'Opossum': 1, 'Mouse': 1}}
+
+
+@override_settings(PROJECT_SUMMARY_DELTAS_FOLD_INTERVAL=2)
+def test_summary_deltas_are_folded_by_project_delta_count(business_client):
+    project = make_project(project_choices(), business_client.user, use_ml_backend=False)
+    other_project = make_project(project_choices(), business_client.user, use_ml_backend=False)
+
+    # deltas of other projects don't trigger the fold
+    project.summary._append_delta(created_annotations={'some|x|none': 1})
+    other_project.summary._append_delta(created_annotations={'some|x|none': 1})
+    assert project.summary_deltas.count() == 1
+
+    # the second unfolded delta of the project starts the fold job
+    project.summary._append_delta(created_annotations={'some|x|none': 1})
+    assert project.summary_deltas.count() == 0
+    project.summary.refresh_from_db()
+    assert project.summary.created_annotations == {'some|x|none': 2}
+    assert other_project.summary_deltas.count() == 1
@@ -7,6 +7,7 @@ import zipfile
 import pytest
 import requests_mock
 import ujson as json
+from django.db import connection
 from projects.models import Project
 from rest_framework.authtoken.models import Token
 from tasks.models import Annotation, Prediction, Task
@@ -306,3 +307,245 @@ def test_upload_with_token(setup_project_for_token, tasks, status_code, task_cou
     # tasks
     tasks = Task.objects.filter(project=project.id)
     assert tasks.count() == task_count
+
+
+@pytest.mark.django_db
+def test_task_data_validator_is_cached_by_label_config_hash(business_client):
+    from tasks.validation import TaskValidator, get_task_data_validator
+    from tests.utils import make_project
+
+    project = make_project(
+        {'label_config': '<View><Text name="text" value="$text"/><HyperText name="html" value="$meta.html"/></View>'},
+        business_client.user,
+        use_ml_backend=False,
+    )
+    validator = get_task_data_validator(project)
+    assert get_task_data_validator(project) is validator
+
+    data = {'$undefined$': 'some', 'meta': {'html': '<p/>'}}
+    assert TaskValidator.check_data(project, data) == {'meta': {'html': '<p/>'}, 'text': 'some'}
+    errors = validator.check_batch(
+        [{'text': 1, 'meta': {'html': '<p/>'}}, {'text': 1}, {'text': 1, 'meta': {'html': 2}}]
+    )
+    assert list(errors) == [1, 2]
+    assert str(errors[1].detail[0]) == '"meta.html" key is expected in task data'
+    assert str(errors[2].detail[0]) == (
+        "data['meta.html']=2 is of type 'int', but the object tag HyperText expects the following types: ['str']"
+    )
+
+    project.label_config = '<View><Image name="image" value="$image"/></View>'
+    project.save()
+    assert get_task_data_validator(project) is not validator
+    with pytest.raises(Exception, match='"image" key is expected'):
+        TaskValidator.check_data(project, {'text': 'some'})
+
+
+@pytest.mark.django_db
+def test_plain_data_tasks_bulk_validation(business_client):
+    from unittest import mock
+
+    from data_import.serializers import ImportApiSerializer
+    from tests.utils import make_project
+
+    project = make_project(
+        {'label_config': '<View><Text name="text" value="$text"/></View>'}, business_client.user, use_ml_backend=False
+    )
+    context = {'project': project, 'user': business_client.user}
+    tasks = [{'data': {'text': 'a'}, 'meta': {'m': 1}}, {'data': {'$undefined$': 'b'}}]
+
+    with mock.patch('tasks.serializers.BaseTaskSerializer.validate') as child_validate:
+        serializer = ImportApiSerializer(data=tasks, many=True, context=context)
+        assert serializer.is_valid(), serializer.errors
+        child_validate.assert_not_called()
+    db_tasks = serializer.save()
+    assert [task.data for task in db_tasks] == [{'text': 'a'}, {'text': 'b'}]
+    assert (len(serializer.db_annotations), len(serializer.db_predictions)) == (0, 0)
+
+    # errors of the fast path are the same as errors of the per task validation
+    invalid = [{'data': {'text': 'a'}}, {'data': {'other': 'b'}}]
+    fast = ImportApiSerializer(data=invalid, many=True, context=context)
+    assert not fast.is_valid()
+    slow = ImportApiSerializer(data=invalid + [{'data': {'text': 'c'}, 'predictions': []}], many=True, context=context)
+    assert not slow.is_valid()
+    assert fast.errors == slow.errors[:2]
+    assert fast.errors[1].startswith('Error at item 1: "text" key is expected in task data [assume: item["data"]')
+
+
+def test_copy_text_value_escaping():
+    from core.utils.db import _copy_text_value
+
+    assert _copy_text_value(Task._meta.get_field('data'), {'text': 'a\tb\\n\nc'}) == r'{"text": "a\\tb\\\\n\\nc"}'
+    assert _copy_text_value(Task._meta.get_field('meta'), None) == '\\N'
+    assert _copy_text_value(Task._meta.get_field('is_labeled'), False) == 'False'
+    assert _copy_text_value(Prediction._meta.get_field('model_version'), 'v\t1\\') == 'v\\t1\\\\'
+
+
+@pytest.mark.skipif(connection.vendor != 'postgresql', reason='COPY FROM STDIN is supported by PostgreSQL only')
+@pytest.mark.django_db
+def test_import_with_copy_bulk_create(business_client):
+    from data_import.serializers import ImportApiSerializer
+    from django.test import override_settings
+    from tests.utils import make_project
+
+    project = make_project(
+        {'label_config': '<View><Text name="text" value="$text"/></View>'}, business_client.user, use_ml_backend=False
+    )
+    tasks = [
+        {
+            'data': {'text': f'line\n{i}\t"tab" \\ slash'},
+            'annotations': [{'result': [{'value': {'text': 'ü'}}]}],
+            'predictions': [{'result': [], 'score': 0.5}],
+        }
+        for i in range(3)
+    ]
+    with override_settings(BULK_CREATE_COPY_ENABLED=True, BATCH_SIZE=2):
+        serializer = ImportApiSerializer(data=tasks, many=True, context={'project': project})
+        assert serializer.is_valid(), serializer.errors
+        db_tasks = serializer.save()
+
+    assert sorted(project.tasks.values_list('data__text', flat=True)) == [
+        f'line\n{i}\t"tab" \\ slash' for i in range(3)
+    ]
+    assert set(project.tasks.values_list('id', flat=True)) == {task.id for task in db_tasks}
+    assert Annotation.objects.filter(task__in=db_tasks, result__0__value__text='ü').count() == 3
+    assert Prediction.objects.filter(task__in=db_tasks, score=0.5).count() == 3
+
+
+@pytest.mark.django_db
+def test_import_duplicates_skip_and_update(business_client):
+    from tests.utils import make_project
+
+    project = make_project(
+        {'label_config': '<View><Text name="text" value="$text"/></View>'}, business_client.user, use_ml_backend=False
+    )
+    existing = Task.objects.create(project=project, data={'text': 'a', 'n': 1})
+
+    def post(duplicates, tasks):
+        return business_client.post(
+            f'/api/projects/{project.id}/import?duplicates={duplicates}&return_task_ids=true',
+            data=json.dumps(tasks),
+            content_type='application/json',
+        )
+
+    # the same data with another key order, and the duplicate inside the request
+    r = post('skip', [{'n': 1, 'text': 'a'}, {'text': 'b'}, {'text': 'b'}])
+    assert r.status_code == 201, r.content
+    assert r.json()['task_count'] == 1
+    assert sorted(project.tasks.values_list('data__text', flat=True)) == ['a', 'b']
+
+    r = post('update', [{'data': {'text': 'a', 'n': 1}, 'meta': {'m': 1}, 'predictions': [{'result': []}]}])
+    assert r.status_code == 201, r.content
+    assert r.json()['task_count'] == 0
+    existing.refresh_from_db()
+    assert existing.meta == {'m': 1}
+    assert (existing.total_predictions, project.tasks.count()) == (1, 2)
+
+    assert post('wrong', [{'text': 'c'}]).status_code == 400
+    r = post('keep', [{'text': 'b'}])
+    assert r.json()['task_count'] == 1
+    assert project.tasks.filter(data__text='b').count() == 2
+
+
+@pytest.mark.django_db
+def test_reimport_diff(business_client):
+    from data_import.models import FileUpload
+    from django.test import override_settings
+    from projects.models import ProjectReimport, ProjectSummary
+    from rest_framework.exceptions import ValidationError
+    from tests.utils import make_project
+
+    project = make_project(
+        {'label_config': '<View><Text name="text" value="$text"/></View>'}, business_client.user, use_ml_backend=False
+    )
+    r = business_client.post(
+        f'/api/projects/{project.id}/import?commit_to_project=false',
+        data={'file.csv': io.StringIO('key,text\n1,a\n2,b\n3,c\n')},
+    )
+    assert r.status_code == 201, r.content
+    file_upload_ids = r.json()['file_upload_ids']
+
+    def reimport(**params):
+        return business_client.post(
+            f'/api/projects/{project.id}/reimport',
+            data=json.dumps({'file_upload_ids': file_upload_ids, 'files_as_tasks_list': True, **params}),
+            content_type='application/json',
+        )
+
+    assert reimport().status_code == 201
+    tasks = {task.data['key']: task for task in project.tasks.all()}
+    Annotation.objects.create(task_id=tasks[1].id, project_id=project.id, result=[], completed_by=business_client.user)
+    with open(FileUpload.objects.get(id=file_upload_ids[0]).file.path, 'w') as f:
+        f.write('key,text\n1,a2\n2,b\n4,d\n')
+
+    r = reimport(diff=True, diff_key='key')
+    assert r.status_code == 201, r.content
+    project_reimport = ProjectReimport.objects.get(id=r.json()['reimport'])
+    assert project_reimport.status == ProjectReimport.Status.COMPLETED
+    assert (project_reimport.task_count, project_reimport.updated_count, project_reimport.deleted_count) == (1, 1, 1)
+
+    # annotated task is updated in place, unchanged task is untouched
+    assert sorted(project.tasks.values_list('data__text', flat=True)) == ['a2', 'b', 'd']
+    assert Task.objects.get(id=tasks[1].id).annotations.count() == 1
+    assert Task.objects.get(id=tasks[2].id).data['text'] == 'b'
+    assert not Task.objects.filter(id=tasks[3].id).exists()
+    assert ProjectSummary.objects.get(project=project).all_data_columns == {'key': 3, 'text': 3}
+
+    # without a key rows are compared by the whole data, so the changed row is recreated
+    with open(FileUpload.objects.get(id=file_upload_ids[0]).file.path, 'w') as f:
+        f.write('key,text\n1,a3\n2,b\n4,d\n')
+    r = reimport(diff=True)
+    project_reimport = ProjectReimport.objects.get(id=r.json()['reimport'])
+    assert (project_reimport.task_count, project_reimport.updated_count, project_reimport.deleted_count) == (1, 0, 1)
+    assert sorted(project.tasks.values_list('data__text', flat=True)) == ['a3', 'b', 'd']
+
+    # too many rows fail the reimport before the first batch is applied
+    with open(FileUpload.objects.get(id=file_upload_ids[0]).file.path, 'w') as f:
+        f.write('key,text\n1,a4\n2,b\n4,d\n5,e\n')
+    with override_settings(IMPORT_BATCH_SIZE=1, TASKS_MAX_NUMBER=3):
+        with pytest.raises(ValidationError, match='Maximum task number is 3'):
+            reimport(diff=True, diff_key='key')
+    assert sorted(project.tasks.values_list('data__text', flat=True)) == ['a3', 'b', 'd']
+
+
+@pytest.mark.django_db
+def test_reimport_diff_txt_and_missing_diff_key(business_client):
+    from data_import.models import FileUpload
+    from projects.models import ProjectReimport
+    from tests.utils import make_project
+
+    project = make_project(
+        {'label_config': '<View><Text name="text" value="$text"/></View>'}, business_client.user, use_ml_backend=False
+    )
+    r = business_client.post(
+        f'/api/projects/{project.id}/import?commit_to_project=false',
+        data={'file.txt': io.StringIO('a\nb\n')},
+    )
+    assert r.status_code == 201, r.content
+    file_upload_ids = r.json()['file_upload_ids']
+    file_path = FileUpload.objects.get(id=file_upload_ids[0]).file.path
+
+    def reimport(**params):
+        r = business_client.post(
+            f'/api/projects/{project.id}/reimport',
+            data=json.dumps({'file_upload_ids': file_upload_ids, 'files_as_tasks_list': True, **params}),
+            content_type='application/json',
+        )
+        assert r.status_code == 201, r.content
+        project_reimport = ProjectReimport.objects.get(id=r.json()['reimport'])
+        return project_reimport.task_count, project_reimport.updated_count, project_reimport.deleted_count
+
+    reimport()
+    task_a = project.tasks.get(data__text='a')
+    Annotation.objects.create(task=task_a, project=project, result=[], completed_by=business_client.user)
+
+    # $undefined$ key of txt lines is renamed before rows are matched with stored tasks by the whole data
+    with open(file_path, 'w') as f:
+        f.write('a\nc\n')
+    assert reimport(diff=True) == (1, 0, 1)
+    assert sorted(project.tasks.values_list('data__text', flat=True)) == ['a', 'c']
+    assert Task.objects.get(id=task_a.id).annotations.count() == 1
+
+    # rows and tasks without diff_key are never matched with each other
+    assert reimport(diff=True, diff_key='key') == (2, 0, 2)
+    assert not Task.objects.filter(id=task_a.id).exists()
+    assert sorted(project.tasks.values_list('data__text', flat=True)) == ['a', 'c']
@@ -4,6 +4,7 @@ import io
 
 import pytest
 from data_import.models import FileUpload
+from data_import.svg import sanitize_svg
 from django.conf import settings
 
 
@@ -26,7 +27,7 @@ def test_svg_upload_sanitize(setup_project_dialog):
 
     assert r.status_code == 201
 
-    expected = """<svg version="1.1" baseprofile="full" xmlns="http://www.w3.org/2000/svg">
+    expected = """<svg xmlns="http://www.w3.org/2000/svg" version="1.1" baseProfile="full">
     <polygon id="triangle" points="0,0 0,50 50,0" fill="#009900" stroke="#004400"></polygon>\n
     </svg>\n"""
 
@@ -53,7 +54,7 @@ def test_svg_upload_invalid_format(setup_project_dialog):
     assert r.status_code == 201
 
     expected = """
-    <svgversion="1.1"baseprofile="full"xmlns="http://www.w3.org/2000/svg">gibberish</svg>
+    <svgxmlns="http://www.w3.org/2000/svg"version="1.1"baseProfile="full">gibberish</svg>
     """
 
     actual = FileUpload.objects.filter(id=r.data['file_upload_ids'][0]).last().file.read()
@@ -83,3 +84,19 @@ def test_svg_upload_do_not_sanitize(setup_project_dialog):
     actual = FileUpload.objects.filter(id=r.data['file_upload_ids'][0]).last().file.read()
 
     assert ''.join(xml_dirty.split()) == ''.join(actual.decode('UTF-8').replace('\n', '').split())
+
+
+def test_sanitize_svg_by_chunks():
+    """Disallowed tags, attributes and entities are removed from the file parsed by small chunks"""
+    svg = b"""<?xml version="1.0"?>
+        <!DOCTYPE svg [<!ENTITY secret SYSTEM "file:///etc/passwd">]>
+        <svg xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink" viewBox="0 0 10 10">
+        <!-- comment --><g><rect onclick="alert(1)" style="fill: red" width="1" xlink:href="javascript:alert(1)"/>
+        <text>&secret;</text></g><foreignObject><div>html</div></foreignObject>
+        <script>alert(document.cookie);</script><path d="M 0 0"/>"""
+    output = io.BytesIO()
+    sanitize_svg(io.BytesIO(svg), output, chunk_size=7)
+
+    expected = """<svg xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink" viewBox="0 0 10 10">
+        <rect width="1"></rect><path d="M 0 0"></path></svg>"""
+    assert ''.join(output.getvalue().decode().split()) == ''.join(expected.split())